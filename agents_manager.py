@@ -147,10 +147,15 @@ class WebSearchAgent(Agent):
             else:
                 search_results = await self.web_searcher.search_web(query, max_results, search_type)
             
+            # سجل البحث يحفظ ما كتبه المستخدم، والبحث الرائج لا يحمل استعلاماً منه
+            if search_type != "trending":
+                self.web_searcher.record_search(query, search_type, search_results)
+            
             if not search_results:
                 return {"status": "success", "message": "لم يتم العثور على نتائج", "results": []}
             
-            # معالجة النتائج باستخدام Gemini
+            # تحميل محتوى أول النتائج ثم معالجتها باستخدام Gemini
+            search_results = await self.web_searcher.fetch_result_pages(search_results)
             processed_results = await self.gemini_client.process_search_results(query, search_results)
             
             return processed_results
@@ -438,7 +443,7 @@ class AgentsManager:
         
         # إنشاء معالجات الملفات والبحث
         self.file_processor = FileProcessor()
-        self.web_searcher = WebSearcher()
+        self.web_searcher = WebSearcher(database_manager)
         
         # تهيئة الوكلاء
         self._initialize_agents()
@@ -529,7 +534,12 @@ class AgentsManager:
                     break
             
             if not available_agent:
-                return {"status": "error", "error": f"جميع الوكلاء من النوع {agent_type} مشغولة"}
+                # الوكلاء لا يحتفظون بحالة بين المهام، والتزامن الفعلي محدود بمجمع طلبات Gemini
+                # لذلك تُشارك المهمة وكيلاً مشغولاً بدلاً من رفضها
+                available_agent = next((agent for agent in agents if agent.status == "active"), None)
+            
+            if not available_agent:
+                return {"status": "error", "error": f"لا توجد وكلاء نشطة من النوع {agent_type}"}
             
             # تنفيذ المهمة
             result = await available_agent.execute_task(task_data)
@@ -562,14 +572,21 @@ class AgentsManager:
             if plan["status"] == "error":
                 return plan
             
+            # خطوات الخطة المنظمة، أو استخراجها من نص الخطة إذا لم تتوفر
+            steps = plan.get("steps") or [
+                {"description": line.split(':', 1)[1].strip(), "agent": ""}
+                for line in plan["execution_plan"].split('\n')
+                if line.strip() and ':' in line
+            ]
+            
             # تنفيذ الخطة
             execution_results = []
-            for step in plan["execution_plan"].split('\n'):
-                if step.strip() and ':' in step:
-                    step_description = step.split(':', 1)[1].strip()
-                    
-                    # تحديد الوكيل المناسب
-                    agent = self._find_best_agent_for_task(step_description, available_agents)
+            for step in steps:
+                step_description = step["description"]
+                if step_description:
+                    # تحديد الوكيل المناسب: الوكيل المقترح في الخطة أولاً ثم حسب القدرات
+                    agent = (self._find_agent_by_name(step.get("agent"), available_agents)
+                             or self._find_best_agent_for_task(step_description, available_agents))
                     
                     if agent:
                         step_result = await agent.execute_task({
@@ -596,6 +613,16 @@ class AgentsManager:
             logging.error(f"خطأ في تنفيذ المهمة المعقدة: {e}")
             return {"status": "error", "error": str(e)}
     
+    def _find_agent_by_name(self, agent_name: Optional[str], available_agents: List[Agent]) -> Optional[Agent]:
+        """العثور على وكيل متاح بالاسم المقترح في الخطة"""
+        if not agent_name:
+            return None
+        agent_name = agent_name.strip()
+        for agent in available_agents:
+            if agent.status == "active" and (agent.agent_name == agent_name or agent.agent_type == agent_name):
+                return agent
+        return None
+    
     def _find_best_agent_for_task(self, task_description: str, available_agents: List[Agent]) -> Optional[Agent]:
         """العثور على أفضل وكيل للمهمة"""
         try:
@@ -639,12 +666,23 @@ class AgentsManager:
                     "busy": len([a for a in agents if a.is_busy])
                 }
             
+            # حالة قواطع الدائرة للخدمات الخارجية، القاطع غير المغلق يعني أن الخدمة متدهورة
+            circuit_breakers = {
+                "gemini": self.gemini_client.breaker.get_status(),
+                "web_search": self.web_searcher.breaker.get_status()
+            }
+            services_healthy = all(breaker["state"] == "closed" for breaker in circuit_breakers.values())
+            
             return {
                 "total_agents": total_agents,
                 "active_agents": active_agents,
                 "busy_agents": busy_agents,
                 "agents_by_type": agents_status,
-                "system_health": "healthy" if active_agents > 0 else "degraded"
+                "circuit_breakers": circuit_breakers,
+                "search_cache": self.web_searcher.search_cache.get_stats() if self.web_searcher.search_cache else {},
+                "search_scheduler": self.web_searcher.scheduler.get_status(),
+                "search_backends": self.web_searcher.get_backend_stats(),
+                "system_health": "healthy" if active_agents > 0 and services_healthy else "degraded"
             }
             
         except Exception as e:
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قياس أداء دوال GeminiClient بدون شبكة باستخدام الواجهة المحلية أو الردود المسجلة
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+# إضافة المجلد الحالي لمسار Python
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import config
+
+def parse_args():
+    """قراءة خيارات القياس"""
+    parser = argparse.ArgumentParser(description="قياس أداء البوت بدون استهلاك حصة Gemini")
+    parser.add_argument("--backend", choices=["stub", "replay"], default="stub")
+    parser.add_argument("--requests", type=int, default=20, help="عدد الطلبات لكل دالة")
+    parser.add_argument("--concurrency", type=int, default=10, help="عدد الطلبات المتزامنة")
+    parser.add_argument("--latency", type=float, default=config.LLM_STUB_LATENCY_MEAN)
+    parser.add_argument("--error-rate", type=float, default=config.LLM_STUB_ERROR_RATE)
+    parser.add_argument("--rpm", type=int, default=config.GEMINI_REQUESTS_PER_MINUTE, help="حد الطلبات في الدقيقة")
+    parser.add_argument("--cache", action="store_true", help="تفعيل التخزين المؤقت أثناء القياس")
+    return parser.parse_args()
+
+def build_cases(index: int):
+    """الحالات المقاسة، كل طلب بنص مختلف حتى لا يخدمه التخزين المؤقت"""
+    document = "\n\n".join(f"فقرة {i} من المستند رقم {index}. " * 20 for i in range(60))
+    return {
+        "generate_response": lambda client: client.generate_response(f"سؤال رقم {index}: ما هي فوائد القراءة؟"),
+        "analyze_text": lambda client: client.analyze_text(document),
+        "summarize_content": lambda client: client.summarize_content(f"محتوى رقم {index}. " * 50),
+        "translate_text": lambda client: client.translate_text(f"Sentence number {index}.", "العربية"),
+        "generate_code_analysis": lambda client: client.generate_code_analysis(f"def f{index}(x):\n    return x * {index}\n"),
+        "generate_task_plan": lambda client: client.generate_task_plan(f"مهمة رقم {index}", ["web_searcher"]),
+        "generate_report": lambda client: client.generate_report({"index": index, "values": list(range(100))})
+    }
+
+async def run_case(client, name: str, requests: int, concurrency: int):
+    """تنفيذ حالة واحدة وإرجاع أزمنة الطلبات"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    
+    async def one(index: int):
+        async with semaphore:
+            started_at = time.perf_counter()
+            await build_cases(index)[name](client)
+            latencies.append(time.perf_counter() - started_at)
+    
+    started_at = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    return latencies, time.perf_counter() - started_at
+
+async def main():
+    """الدالة الرئيسية"""
+    args = parse_args()
+    
+    # الإعدادات تُضبط قبل استيراد العميل لأن القيم الافتراضية تُقرأ عند الاستيراد
+    config.LLM_STUB_LATENCY_MEAN = args.latency
+    config.LLM_STUB_ERROR_RATE = args.error_rate
+    config.GEMINI_REQUESTS_PER_MINUTE = args.rpm
+    config.GEMINI_CACHE_ENABLED = args.cache
+    config.GEMINI_SEMANTIC_CACHE_ENABLED = args.cache
+    
+    from llm_backends import StubBackend, RecordReplayBackend
+    from gemini_client import GeminiClient
+    from usage_tracker import UsageTracker
+    
+    backend = StubBackend(latency_mean=args.latency, error_rate=args.error_rate) if args.backend == "stub" \
+        else RecordReplayBackend()
+    # استهلاك القياس في الذاكرة فقط حتى لا يختلط بالاستهلاك الفعلي في قاعدة البيانات
+    client = GeminiClient(backend=backend, usage_tracker=UsageTracker(db_path=None))
+    
+    print(f"{'الدالة':<24}{'طلبات/ث':>10}{'p50':>10}{'p95':>10}{'max':>10}")
+    for name in build_cases(0):
+        latencies, elapsed = await run_case(client, name, args.requests, args.concurrency)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{name:<24}{len(latencies) / elapsed:>10.2f}{statistics.median(latencies):>10.3f}"
+              f"{p95:>10.3f}{latencies[-1]:>10.3f}")
+    
+    status = client.get_queue_status()
+    print(f"\nإعادة المحاولة: {status['retries']} | الفئات: {status['model_tiers']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
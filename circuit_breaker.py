@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+قاطع الدائرة: رفض الطلبات فوراً عندما تتدهور خدمة خارجية بدلاً من انتظار المهلة كاملة في كل طلب
+"""
+
+import time
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Callable, Optional
+import config
+
+class CircuitOpenError(Exception):
+    """الطلب مرفوض لأن القاطع مفتوح"""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"الخدمة {name} متوقفة مؤقتاً، إعادة المحاولة بعد {retry_after:.0f} ثانية")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """قاطع بثلاث حالات: مغلق (الطلبات تمر)، مفتوح (رفض فوري)، نصف مفتوح (طلبات اختبار محدودة)
+    
+    يُفتح القاطع عندما تتجاوز نسبة الأخطاء أو نسبة الطلبات البطيئة الحد في آخر الطلبات،
+    وبعد مدة الفتح يسمح بعدد محدود من طلبات الاختبار: نجاحها يغلقه وفشل أي منها يعيد فتحه.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, slow_call_threshold: float,
+                 window_size: int = config.BREAKER_WINDOW_SIZE,
+                 min_calls: int = config.BREAKER_MIN_CALLS,
+                 failure_rate_threshold: float = config.BREAKER_FAILURE_RATE,
+                 slow_call_rate_threshold: float = config.BREAKER_SLOW_CALL_RATE,
+                 open_duration: float = config.BREAKER_OPEN_DURATION,
+                 half_open_probes: int = config.BREAKER_HALF_OPEN_PROBES,
+                 is_failure: Optional[Callable[[Exception], bool]] = None):
+        self.name = name
+        self.slow_call_threshold = slow_call_threshold
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+        self.is_failure = is_failure or (lambda error: True)
+        
+        # نتائج آخر الطلبات: (فشل، بطيء)
+        self._outcomes = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.stats = {"calls": 0, "rejected": 0, "opened": 0}
+    
+    @property
+    def state(self) -> str:
+        """الحالة الحالية، والقاطع المفتوح يصبح نصف مفتوح بعد انتهاء مدة الفتح"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            logging.info(f"قاطع {self.name} نصف مفتوح، بدء طلبات الاختبار")
+        return self._state
+    
+    def retry_after(self) -> float:
+        """الوقت المتبقي حتى يسمح القاطع بطلبات الاختبار"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_duration - (time.monotonic() - self._opened_at))
+    
+    def check(self):
+        """رفض فوري إذا كان القاطع مفتوحاً بدون حجز طلب، قبل الانتظار في طوابير المعدل والمجمع"""
+        if self.state == self.OPEN:
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.name, self.retry_after() or self.open_duration)
+    
+    def begin(self) -> bool:
+        """السماح بالطلب أو رفضه، ويرجع True إذا كان الطلب طلب اختبار (يُنهى بـ finish أو abandon)"""
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probes_in_flight >= self.half_open_probes):
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.name, self.retry_after() or self.open_duration)
+        
+        self.stats["calls"] += 1
+        if state == self.HALF_OPEN:
+            self._probes_in_flight += 1
+            return True
+        return False
+    
+    def finish(self, probe: bool, elapsed: float, error: Optional[Exception] = None):
+        """تسجيل نتيجة طلب بدأ بـ begin وزمنه"""
+        self._record(error is not None and self.is_failure(error), elapsed > self.slow_call_threshold, probe)
+    
+    def abandon(self, probe: bool):
+        """طلب أُلغي أو توقف مستهلكه: لا يُحسب نجاحاً ولا فشلاً لكن يحرر مكان طلب الاختبار"""
+        if probe:
+            self._probes_in_flight -= 1
+    
+    def _record(self, failed: bool, slow: bool, probe: bool):
+        """تسجيل نتيجة طلب وتحديث الحالة"""
+        if probe:
+            self._probes_in_flight -= 1
+            if self._state != self.HALF_OPEN:
+                return
+            if failed or slow:
+                self._trip()
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._close()
+            return
+        
+        # نتائج الطلبات التي بدأت قبل فتح القاطع لا تؤثر على حالته
+        if self._state != self.CLOSED:
+            return
+        self._outcomes.append((failed, slow))
+        if len(self._outcomes) >= self.min_calls:
+            failure_rate, slow_rate = self._rates()
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._trip()
+    
+    def _rates(self):
+        """نسبة الأخطاء ونسبة الطلبات البطيئة في النافذة"""
+        if not self._outcomes:
+            return 0.0, 0.0
+        total = len(self._outcomes)
+        return (sum(1 for failed, _ in self._outcomes if failed) / total,
+                sum(1 for _, slow in self._outcomes if slow) / total)
+    
+    def _trip(self):
+        """فتح القاطع"""
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.stats["opened"] += 1
+        logging.warning(f"تم فتح قاطع {self.name} لمدة {self.open_duration} ثانية بسبب تدهور الخدمة")
+    
+    def _close(self):
+        """إغلاق القاطع بعد نجاح طلبات الاختبار"""
+        self._state = self.CLOSED
+        self._outcomes.clear()
+        logging.info(f"تم إغلاق قاطع {self.name} بعد نجاح طلبات الاختبار")
+    
+    @asynccontextmanager
+    async def guard(self):
+        """تنفيذ كتلة ضمن القاطع: ترفع CircuitOpenError فوراً إذا كان مفتوحاً وتسجل النتيجة وزمنها"""
+        probe = self.begin()
+        started_at = time.monotonic()
+        recorded = False
+        try:
+            yield
+            self.finish(probe, time.monotonic() - started_at)
+            recorded = True
+        except Exception as e:
+            self.finish(probe, time.monotonic() - started_at, e)
+            recorded = True
+            raise
+        finally:
+            if not recorded:
+                self.abandon(probe)
+    
+    async def call(self, operation: Callable[[], Any]) -> Any:
+        """تنفيذ عملية غير متزامنة ضمن القاطع"""
+        async with self.guard():
+            return await operation()
+    
+    def get_status(self) -> Dict[str, Any]:
+        """الحصول على حالة القاطع"""
+        failure_rate, slow_rate = self._rates()
+        return {
+            "state": self.state,
+            "failure_rate": round(failure_rate, 3),
+            "slow_call_rate": round(slow_rate, 3),
+            "window_calls": len(self._outcomes),
+            "retry_after": round(self.retry_after(), 1),
+            **self.stats
+        }
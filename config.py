@@ -17,10 +17,102 @@ ADMIN_USER_ID = 6572227539
 GEMINI_MODEL = "Gemini-2.0-flash"
 GEMINI_MAX_TOKENS = 8192
 GEMINI_TEMPERATURE = 0.7
+GEMINI_MAX_CONCURRENT_REQUESTS = 4  # الحد الأقصى للطلبات المتزامنة، الطلبات الزائدة تنتظر دورها
+
+# ميزانية رموز الإدخال لكل دالة في عميل Gemini
+GEMINI_MAX_INPUT_TOKENS = 30000  # الحد الافتراضي للدوال غير المذكورة
+GEMINI_INPUT_BUDGETS = {
+    "generate_response": 30000,
+    "analyze_text": 200000,  # مجموع أجزاء المستند، الزائد يُؤخذ منه عينة
+    "summarize_content": 200000,
+    "generate_file_content": 4000,
+    "process_search_results": 4000,
+    "generate_code_analysis": 24000,
+    "generate_task_plan": 4000,
+    "translate_text": 8000,  # النص الأطول يُترجم على أجزاء
+    "generate_report": 12000
+}
+
+# واجهة النموذج: gemini للخدمة الحقيقية، stub لبديل محلي بدون شبكة لاختبارات الحمل،
+# record لتسجيل ردود Gemini في ملف، replay لتقديم الردود المسجلة بدون شبكة
+LLM_BACKEND = "gemini"
+LLM_STUB_LATENCY_MEAN = 0.8  # متوسط زمن الاستجابة بالثواني للفئة القياسية
+LLM_STUB_LATENCY_STDDEV = 0.4
+LLM_STUB_ERROR_RATE = 0.0  # نسبة الطلبات التي تفشل بخطأ 503
+LLM_STUB_RESPONSE_CHARS = 800
+LLM_STUB_SEED = 42  # None لنتائج مختلفة في كل تشغيل
+LLM_RECORDING_PATH = "llm_recordings.jsonl"
+
+# ترجمة عدة نصوص في طلب واحد
+GEMINI_TRANSLATE_BATCH_TOKENS = 2500  # حجم الدفعة، الترجمة قد تكون أطول من الأصل فيجب أن تتسع لها حدود الإخراج
+GEMINI_TRANSLATE_BATCH_SEGMENTS = 40
+GEMINI_TRANSLATE_CONCURRENCY = 3
+
+# فئات نماذج Gemini: الطلب يذهب للفئة المناسبة لنوع المهمة وحجمها، وعند البطء أو الخطأ ينتقل للفئة التالية في السلسلة
+GEMINI_MODEL_TIERS = {
+    "light": "gemini-2.0-flash-lite",
+    "standard": GEMINI_MODEL,
+    "heavy": "gemini-1.5-pro"
+}
+GEMINI_METHOD_TIERS = {  # الدوال غير المذكورة تستخدم الفئة القياسية
+    "translate_text": "light",
+    "generate_file_content": "light",
+    "process_search_results": "light",
+    "generate_code_analysis": "heavy",
+    "generate_task_plan": "heavy",
+    "update_conversation_summary": "light"
+}
+GEMINI_TIER_FALLBACKS = {
+    "light": ["standard"],
+    "standard": ["light", "heavy"],
+    "heavy": ["standard"]
+}
+GEMINI_LIGHT_MAX_TOKENS = 2000  # المدخلات الأكبر لا تُرسل للفئة الخفيفة
+GEMINI_HEAVY_MIN_TOKENS = 16000  # المدخلات الأكبر ترفع الفئة درجة
+GEMINI_TIER_TIMEOUTS = {"light": 20, "standard": 45, "heavy": 90}  # ثوانٍ قبل الانتقال للفئة التالية
+GEMINI_TIER_FAILURE_THRESHOLD = 3  # أخطاء متتالية قبل إيقاف الفئة مؤقتاً
+GEMINI_TIER_COOLDOWN = 60  # مدة الإيقاف المؤقت بالثواني
+
+# إعدادات تحليل المستندات الكبيرة على أجزاء (map-reduce)
+GEMINI_CHUNK_SIZE = 12000  # أقصى عدد أحرف في الجزء الواحد
+GEMINI_CHUNK_CONCURRENCY = 3  # عدد الأجزاء التي تُحلل في نفس الوقت
+GEMINI_REDUCE_FANIN = 5  # عدد النتائج الجزئية التي تُدمج في كل خطوة
+
+# إعدادات البث التدريجي للردود في تيليجرام
+TELEGRAM_STREAM_EDIT_INTERVAL = 1.5  # أقل فترة بين تعديلين لنفس الرسالة بالثواني
+TELEGRAM_STREAM_MIN_CHARS = 40  # أقل عدد أحرف جديدة قبل تعديل الرسالة
+TELEGRAM_MESSAGE_LIMIT = 4096
 
 # إعدادات قاعدة البيانات
 DATABASE_PATH = "ai_agent_bot.db"
 
+# حدود حصة Gemini وإعادة المحاولة عند الأخطاء المؤقتة (429 و 5xx)
+GEMINI_REQUESTS_PER_MINUTE = 60
+GEMINI_TOKENS_PER_MINUTE = 1000000
+GEMINI_MAX_RETRIES = 4
+GEMINI_RETRY_BASE_DELAY = 1.0  # ثانية، تتضاعف مع كل محاولة
+GEMINI_RETRY_MAX_DELAY = 30.0
+
+# إعدادات التخزين المؤقت لردود Gemini
+GEMINI_CACHE_ENABLED = True
+GEMINI_CACHE_MAX_ENTRIES = 1000  # عدد الردود في ذاكرة LRU
+GEMINI_CACHE_TTL = 24 * 3600  # مدة صلاحية الرد بالثواني
+GEMINI_CACHE_DB_PATH = DATABASE_PATH  # None لتعطيل الطبقة الدائمة
+GEMINI_CACHE_DB_MAX_ENTRIES = 20000
+
+# التخزين المؤقت الدلالي: إعادة الرد المخزن لسؤال قريب في المعنى (الأسئلة القصيرة بدون سياق محادثة فقط)
+GEMINI_SEMANTIC_CACHE_ENABLED = True
+GEMINI_SEMANTIC_CACHE_THRESHOLD = 0.92  # أقل تشابه جيب تمام لاعتبار السؤالين متطابقين
+GEMINI_SEMANTIC_CACHE_MAX_ENTRIES = 2000
+GEMINI_SEMANTIC_CACHE_MAX_PROMPT_CHARS = 500
+GEMINI_SEMANTIC_CACHE_EMBEDDING = "gemini"  # gemini لنموذج التضمين في واجهة النموذج، local لتضمين المقاطع المحلي (لا يلتقط إعادة الصياغة أو اختلاف اللغة)
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+
+# محاسبة استهلاك Gemini لكل طلب (تُكتب في جدول gemini_usage على دفعات)
+USAGE_FLUSH_BATCH_SIZE = 50
+USAGE_FLUSH_INTERVAL = 30  # ثوانٍ كحد أقصى قبل كتابة الدفعة
+USAGE_MAX_TRACKED_USERS = 10000  # المستخدمون الأحدث نشاطاً في مجاميع الذاكرة، والبقية في قاعدة البيانات فقط
+
 # إعدادات الملفات
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
@@ -36,6 +128,100 @@ SUPPORTED_FORMATS = {
 # إعدادات البحث
 DUCKDUCKGO_MAX_RESULTS = 10
 SEARCH_TIMEOUT = 30
+SEARCH_MAX_CONCURRENT = 4  # طلبات DuckDuckGo المتزامنة، الزيادة تعرض لحظر المعدل
+SEARCH_PAGE_SIZE = 10  # عدد النتائج المقروءة في كل دفعة عند تصفح النتائج تدريجياً
+SEARCH_FETCH_BUDGET = 100  # الحد الأقصى للنتائج المقروءة في البحث مع الفلاتر
+
+# جدولة طلبات DuckDuckGo لتفادي حظر المعدل
+SEARCH_REQUESTS_PER_MINUTE = 30
+SEARCH_MIN_INTERVAL = 1.0  # ثوانٍ بين طلبين متتاليين
+SEARCH_BACKOFF_BASE = 5  # ثوانٍ، فترة التوقف بعد أول رفض وتتضاعف مع كل رفض متتالٍ
+SEARCH_BACKOFF_MAX = 120
+SEARCH_RATELIMIT_RETRIES = 1  # إعادة المحاولة بعد فترة التوقف عند رفض الطلب بسبب المعدل
+SEARCH_MAX_QUEUE_WAIT = 10  # ثوانٍ، طلب المستخدم الذي سينتظر أكثر منها يُخدم من النتائج المحفوظة
+SEARCH_BREAKER_SLOW_CALL = 10.0  # ثوانٍ، البحث الأبطأ يُحسب بطيئاً في قاطع الدائرة
+
+# واجهات البحث: الأولى أساسية، والتالية تُرسل لها نفس الطلب إذا تأخرت الأساسية (ddg أو ddg_html أو ddg_lite أو fake)
+SEARCH_BACKENDS = ["ddg", "ddg_html"]
+SEARCH_HEDGE_ENABLED = True
+SEARCH_HEDGE_PERCENTILE = 95  # الطلب الثاني يُرسل بعد هذا المئين من أزمنة استجابة الواجهة الأساسية
+SEARCH_HEDGE_MIN_SAMPLES = 20  # قبل هذا العدد من الطلبات يُستخدم SEARCH_HEDGE_INITIAL_DELAY
+SEARCH_HEDGE_INITIAL_DELAY = 2.0  # ثوانٍ
+SEARCH_HEDGE_MIN_DELAY = 0.5
+SEARCH_HEDGE_MAX_DELAY = 5.0
+
+# واجهة البحث المحلية للاختبارات (fake)
+SEARCH_FAKE_LATENCY_MEAN = 0.3  # ثوانٍ
+SEARCH_FAKE_LATENCY_STDDEV = 0.3
+SEARCH_FAKE_ERROR_RATE = 0.0
+SEARCH_FAKE_SEED = 42
+
+# ترتيب نتائج البحث محلياً (BM25)
+SEARCH_BM25_K1 = 1.2
+SEARCH_BM25_B = 0.75
+SEARCH_FIELD_WEIGHTS = {"title": 2.0, "snippet": 1.0, "content": 0.5}
+SEARCH_RANK_OVERFETCH = 3  # مضاعف عدد النتائج المجلوبة قبل الإبقاء على الأفضل
+SEARCH_ACADEMIC_DOMAINS = {  # معامل تعزيز درجة النتائج من النطاقات الأكاديمية
+    ".edu": 1.5,
+    ".ac": 1.5,
+    "arxiv.org": 1.6,
+    "ncbi.nlm.nih.gov": 1.6,
+    "scholar.google.com": 1.5,
+    "researchgate.net": 1.3,
+    "springer.com": 1.4,
+    "sciencedirect.com": 1.4,
+    "ieee.org": 1.4,
+    "wikipedia.org": 1.1
+}
+
+# إزالة النتائج المكررة
+SEARCH_DEDUP_NUM_PERM = 64  # عدد دوال MinHash، الأكثر أدق والأبطأ
+SEARCH_DEDUP_SHINGLE_SIZE = 3  # عدد الكلمات في كل مقطع
+SEARCH_DEDUP_THRESHOLD = 0.7  # تشابه جاكار المقدر الذي تُعتبر عنده النتيجتان نسختين
+SEARCH_DEDUP_SEED = 1
+
+# تحميل صفحات نتائج البحث
+PAGE_FETCH_ENABLED = True
+PAGE_FETCH_TOP_N = 5  # عدد النتائج الأولى التي تُحمل صفحاتها
+PAGE_FETCH_MAX_CONCURRENT = 8
+PAGE_FETCH_PER_HOST = 2  # الطلبات المتزامنة لنفس الموقع
+PAGE_FETCH_TIMEOUT = 10  # ثوانٍ
+PAGE_FETCH_MAX_BYTES = 2 * 1024 * 1024  # الصفحة الأكبر تُقطع عند هذا الحد
+PAGE_FETCH_MAX_REDIRECTS = 5  # كل تحويل يُتحقق من عنوانه قبل اتباعه
+PAGE_FETCH_ALLOW_PRIVATE_HOSTS = False  # السماح بالعناوين الداخلية وlocalhost، للاختبارات والشبكات الخاصة فقط
+PAGE_FETCH_MAX_TEXT_CHARS = 20000
+PAGE_FETCH_USER_AGENT = "Mozilla/5.0 (compatible; AIAgentBot/1.0)"
+PAGE_PARSE_WORKERS = 2
+PAGE_CACHE_FOLDER = "page_cache"  # None لتعطيل حفظ الصفحات على القرص
+PAGE_CACHE_TTL = 86400
+PAGE_CACHE_MAX_FILES = 2000  # الملفات الأقدم تُحذف عند تجاوز الحد
+
+# التخزين المؤقت لنتائج البحث
+SEARCH_CACHE_ENABLED = True
+SEARCH_CACHE_TTLS = {  # ثوانٍ، الأخبار تتغير بسرعة بخلاف نتائج الويب
+    "web": 86400,
+    "news": 900,
+    "images": 86400,
+    "videos": 43200
+}
+SEARCH_CACHE_STALE_RATIO = 1.0  # النتيجة الأقدم من الصلاحية بهذه النسبة منها تُعرض مع تحديثها في الخلفية
+SEARCH_CACHE_MAX_ENTRIES = 500  # عدد عمليات البحث في الذاكرة
+SEARCH_CACHE_DB_RETENTION_RATIO = 7  # النتائج تبقى في قاعدة البيانات حتى هذا المضاعف من صلاحيتها لاستخدامها عند توقف البحث
+SEARCH_CACHE_DB_MAX_ENTRIES = 5000  # الحد الأقصى لعمليات البحث المحفوظة في قاعدة البيانات
+
+# اقتراحات البحث
+SEARCH_SUGGEST_HALF_LIFE = 7 * 86400  # ثوانٍ، البحث الأقدم بهذه المدة يساوي نصف وزن بحث اليوم
+SEARCH_SUGGEST_TOP_K = 10  # عدد الاقتراحات المحفوظة لكل بادئة
+SEARCH_SUGGEST_MAX_LOAD = 50000  # عدد الاستعلامات المحملة من قاعدة البيانات عند التشغيل
+
+# قواطع الدائرة حول Gemini و DuckDuckGo: عند تدهور الخدمة تُرفض الطلبات فوراً بدلاً من انتظار المهلة
+BREAKER_WINDOW_SIZE = 20  # عدد آخر الطلبات المحسوبة
+BREAKER_MIN_CALLS = 10  # أقل عدد طلبات قبل تقييم النسب
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_SLOW_CALL_RATE = 0.8
+BREAKER_OPEN_DURATION = 30  # ثوانٍ قبل طلبات الاختبار
+BREAKER_HALF_OPEN_PROBES = 2
+GEMINI_BREAKER_SLOW_CALL = 30.0
 
 # إعدادات الجدولة
 SCHEDULER_INTERVAL = 60  # ثانية
@@ -44,6 +230,11 @@ SCHEDULER_INTERVAL = 60  # ثانية
 ENCRYPTION_KEY = "your-secret-encryption-key-here"
 SESSION_TIMEOUT = 3600  # ساعة
 
+# إعدادات جلسات المحادثة
+SESSION_MAX_ACTIVE = 1000  # عدد الجلسات في الذاكرة، الأقل استخداماً تُحذف أولاً
+SESSION_MAX_CONTEXT_TOKENS = 2000  # عند تجاوزها تُلخص الرسائل الأقدم
+SESSION_KEEP_RECENT_TURNS = 3  # عدد التبادلات الأخيرة التي تبقى بدون تلخيص
+
 # إعدادات اللغات المدعومة
 SUPPORTED_LANGUAGES = ['ar', 'en', 'fr', 'es', 'de', 'zh', 'ja', 'ko', 'ru']
 
@@ -6,8 +6,9 @@
 import sqlite3
 import json
 import logging
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable
 from pathlib import Path
 import config
 
@@ -16,6 +17,8 @@ class DatabaseManager:
     
     def __init__(self, db_path: str = config.DATABASE_PATH):
         self.db_path = db_path
+        # دوال تُستدعى عند تسجيل كل بحث جديد: (الاستعلام، الوقت)
+        self._search_listeners: List[Callable[[Optional[int], str, float], None]] = []
         self.init_database()
     
     def init_database(self):
@@ -102,6 +105,19 @@ class DatabaseManager:
                     )
                 ''')
                 
+                # نتائج البحث المحفوظة مؤقتاً: جدول منفصل عن سجل بحث المستخدمين، صف واحد لكل مفتاح
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS search_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        query TEXT,
+                        search_type TEXT DEFAULT 'web',
+                        results TEXT,
+                        metadata TEXT DEFAULT '{}',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_search_cache_query ON search_cache (query, search_type, created_at)')
+                
                 # جدول الجدولة
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS schedules (
@@ -302,22 +318,123 @@ class DatabaseManager:
             logging.error(f"خطأ في الحصول على المهام المعلقة: {e}")
             return []
     
-    def add_search(self, search_id: str, user_id: int, query: str, results: List[Dict], search_type: str = 'web') -> bool:
+    def add_search(self, search_id: str, user_id: int, query: str, results: List[Dict], search_type: str = 'web',
+                   metadata: Dict = None) -> bool:
         """إضافة بحث جديد"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 results_str = json.dumps(results)
+                metadata_str = json.dumps(metadata or {})
                 cursor.execute('''
-                    INSERT INTO searches (search_id, user_id, query, results, search_type)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (search_id, user_id, query, results_str, search_type))
+                    INSERT INTO searches (search_id, user_id, query, results, search_type, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (search_id, user_id, query, results_str, search_type, metadata_str))
                 conn.commit()
-                return True
+            
+            created_at = time.time()
+            for listener in self._search_listeners:
+                try:
+                    listener(user_id, query, created_at)
+                except Exception as e:
+                    logging.warning(f"خطأ في معالجة البحث الجديد: {e}")
+            return True
         except Exception as e:
             logging.error(f"خطأ في إضافة البحث: {e}")
             return False
     
+    def add_search_listener(self, listener: Callable[[Optional[int], str, float], None]):
+        """تسجيل دالة تُستدعى عند إضافة كل بحث جديد (المستخدم، الاستعلام، الوقت)"""
+        self._search_listeners.append(listener)
+    
+    def get_search_queries(self, limit: int = 50000) -> List[tuple]:
+        """أحدث الاستعلامات المسجلة مع المستخدم ووقت كل منها بالثواني منذ 1970"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT user_id, query, CAST(strftime('%s', created_at) AS REAL)
+                    FROM searches
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                ''', (limit,))
+                return cursor.fetchall()
+        except Exception as e:
+            logging.error(f"خطأ في الحصول على الاستعلامات السابقة: {e}")
+            return []
+    
+    def set_cached_search(self, cache_key: str, query: str, search_type: str, results: List[Dict],
+                          metadata: Dict = None) -> bool:
+        """حفظ نتائج بحث في جدول التخزين المؤقت، مستبدلة النتائج السابقة لنفس المفتاح"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO search_cache (cache_key, query, search_type, results, metadata, created_at)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (cache_key, query, search_type, json.dumps(results), json.dumps(metadata or {})))
+                conn.commit()
+                return True
+        except Exception as e:
+            logging.error(f"خطأ في حفظ نتائج البحث المؤقتة: {e}")
+            return False
+    
+    def prune_search_cache(self, max_ages: Dict[str, float], max_entries: int) -> int:
+        """حذف نتائج البحث الأقدم من مدة الاحتفاظ بنوعها (والأنواع غير المذكورة بمدة web)،
+        ثم الأقدم الزائدة عن الحد، ويرجع عدد الصفوف المحذوفة"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                deleted = 0
+                for search_type, max_age in max_ages.items():
+                    cursor.execute('''
+                        DELETE FROM search_cache WHERE search_type = ? AND created_at < datetime('now', ?)
+                    ''', (search_type, f"-{int(max_age)} seconds"))
+                    deleted += cursor.rowcount
+                if "web" in max_ages:
+                    placeholders = ", ".join("?" * len(max_ages))
+                    cursor.execute(f'''
+                        DELETE FROM search_cache WHERE search_type NOT IN ({placeholders}) AND created_at < datetime('now', ?)
+                    ''', (*max_ages, f"-{int(max_ages['web'])} seconds"))
+                    deleted += cursor.rowcount
+                cursor.execute('''
+                    DELETE FROM search_cache WHERE cache_key IN (
+                        SELECT cache_key FROM search_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (max_entries,))
+                deleted += cursor.rowcount
+                conn.commit()
+                return deleted
+        except Exception as e:
+            logging.error(f"خطأ في تقليم نتائج البحث المؤقتة: {e}")
+            return 0
+    
+    def get_cached_searches(self, query: str, search_type: str = 'web', max_age: float = None, limit: int = 5) -> List[Dict]:
+        """أحدث نتائج محفوظة لاستعلام، مع عمر كل منها بالثواني"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT results, metadata, (julianday('now') - julianday(created_at)) * 86400 AS age
+                    FROM search_cache
+                    WHERE query = ? AND search_type = ?
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                ''', (query, search_type, limit))
+                searches = []
+                for results, metadata, age in cursor.fetchall():
+                    if max_age is not None and age > max_age:
+                        break
+                    searches.append({
+                        "results": json.loads(results),
+                        "metadata": json.loads(metadata or '{}'),
+                        "age": age
+                    })
+                return searches
+        except Exception as e:
+            logging.error(f"خطأ في الحصول على نتائج البحث المحفوظة: {e}")
+            return []
+    
     def add_notification(self, notification_id: str, user_id: int, title: str, message: str, notification_type: str, scheduled_for: str = None) -> bool:
         """إضافة إشعار جديد"""
         try:
@@ -4,50 +4,530 @@
 """
 
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import logging
 import json
-from typing import Dict, List, Optional, Any
+import asyncio
+import functools
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, AsyncIterator, Tuple, Callable, Union
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from text_chunker import TextChunker
+from token_budget import TokenBudget
+from rate_limiter import RateLimiter
+from single_flight import SingleFlight
+from model_router import ModelRouter
+from llm_backends import LLMBackend, create_backend
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from usage_tracker import UsageTracker, UsageRecord
 import config
 
+class ErrorResponse(str):
+    """رسالة خطأ تُعرض للمستخدم مكان الرد، ويميزها المستدعي حتى لا تُحفظ كرد فعلي"""
+    pass
+
 class GeminiClient:
     """عميل Gemini API الرئيسي"""
     
-    def __init__(self):
-        """تهيئة عميل Gemini"""
+    # رموز HTTP للأخطاء المؤقتة التي تستحق إعادة المحاولة
+    TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, backend: LLMBackend = None, usage_tracker: UsageTracker = None):
+        """تهيئة عميل Gemini (backend لاستبدال الخدمة الحقيقية بواجهة محلية في الاختبارات،
+        وusage_tracker لتسجيل الاستهلاك في غير قاعدة البيانات الرئيسية)"""
         try:
-            genai.configure(api_key=config.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel(config.GEMINI_MODEL)
+            self.backend = backend or create_backend()
+            self.router = ModelRouter()
             self.generation_config = genai.types.GenerationConfig(
                 temperature=config.GEMINI_TEMPERATURE,
                 max_output_tokens=config.GEMINI_MAX_TOKENS,
             )
+            
+            # مجمع التنفيذ: استدعاءات المكتبة متزامنة لذلك تُنفذ خارج حلقة الأحداث
+            self.max_concurrent_requests = config.GEMINI_MAX_CONCURRENT_REQUESTS
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_requests,
+                thread_name_prefix="gemini"
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._queued_requests = 0
+            self._active_requests = 0
+            
+            # التخزين المؤقت للردود المتكررة
+            self.cache = ResponseCache() if config.GEMINI_CACHE_ENABLED else None
+            
+            # التخزين المؤقت الدلالي للأسئلة المتقاربة في المعنى
+            self.semantic_cache = None
+            if config.GEMINI_SEMANTIC_CACHE_ENABLED:
+                use_gemini_embedding = config.GEMINI_SEMANTIC_CACHE_EMBEDDING == "gemini"
+                self.semantic_cache = SemanticCache(self.backend.embed if use_gemini_embedding else None)
+            
+            # تقسيم المستندات الكبيرة
+            self.chunker = TextChunker()
+            
+            # ميزانية رموز الإدخال لكل دالة
+            self.token_budget = TokenBudget()
+            self.budget_stats: Dict[str, Dict[str, int]] = {}
+            
+            # محدد المعدل لحصة الطلبات والرموز في الدقيقة مع إعادة المحاولة
+            self.rate_limiter = RateLimiter(config.GEMINI_REQUESTS_PER_MINUTE, config.GEMINI_TOKENS_PER_MINUTE)
+            self.max_retries = config.GEMINI_MAX_RETRIES
+            self.retry_count = 0
+            
+            # دمج الطلبات المتطابقة المتزامنة
+            self.single_flight = SingleFlight()
+            
+            # قاطع الدائرة: الأخطاء المؤقتة فقط تُحسب فشلاً، أخطاء الطلب نفسه لا تعني تدهور الخدمة
+            self.breaker = CircuitBreaker("gemini", config.GEMINI_BREAKER_SLOW_CALL, is_failure=self._is_transient_error)
+            
+            # محاسبة الاستهلاك لكل طلب
+            self.usage_tracker = usage_tracker or UsageTracker()
             logging.info("تم تهيئة عميل Gemini بنجاح")
         except Exception as e:
             logging.error(f"خطأ في تهيئة عميل Gemini: {e}")
             raise
     
-    async def generate_response(self, prompt: str, context: str = None, system_prompt: str = None) -> str:
-        """توليد رد من Gemini"""
+    async def generate_response(self, prompt: str, context: str = None, system_prompt: str = None,
+                                use_cache: bool = True, method: str = "generate_response",
+                                priority: str = None) -> str:
+        """توليد رد من Gemini (use_cache=False لتجاوز التخزين المؤقت، method و priority لاختيار فئة النموذج)"""
         try:
-            # بناء الرسالة الكاملة
-            full_prompt = ""
-            if system_prompt:
-                full_prompt += f"System: {system_prompt}\n\n"
-            if context:
-                full_prompt += f"Context: {context}\n\n"
-            full_prompt += f"User: {prompt}\n\nAssistant:"
+            # ضبط حجم المدخلات ثم بناء الرسالة الكاملة
+            prompt, context = self._fit_prompt(prompt, context, system_prompt)
             
-            # توليد الرد
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=self.generation_config
-            )
+            # البحث عن سؤال قريب في المعنى قبل بناء الرسالة
+            semantic_key = await self._semantic_key(prompt, context, method) if use_cache else None
+            if semantic_key is not None:
+                vector, guard = semantic_key
+                cached_response = self.semantic_cache.get(vector, system_prompt, guard=guard)
+                if cached_response is not None:
+                    self._record_cache_hit(method, prompt, cached_response)
+                    return cached_response
+            
+            full_prompt = self._build_prompt(prompt, context, system_prompt)
             
-            return response.text.strip()
+            # توليد الرد
+            try:
+                response_text = await self._complete(full_prompt, use_cache, method, priority)
+            except CircuitOpenError as e:
+                return self._circuit_open_response(e, semantic_key, system_prompt)
+            if semantic_key is not None and response_text:
+                self.semantic_cache.set(vector, response_text, system_prompt, guard=guard)
+            return response_text
             
         except Exception as e:
             logging.error(f"خطأ في توليد رد Gemini: {e}")
-            return f"عذراً، حدث خطأ في معالجة طلبك: {str(e)}"
+            if self._is_transient_error(e):
+                return ErrorResponse("عذراً، الخدمة مشغولة حالياً. يرجى المحاولة بعد قليل.")
+            return ErrorResponse(f"عذراً، حدث خطأ في معالجة طلبك: {str(e)}")
+    
+    def _record_cache_hit(self, method: str, prompt: str, response_text: str):
+        """تسجيل طلب خُدم من التخزين المؤقت الدلالي في محاسبة الاستهلاك"""
+        usage = UsageRecord(method, self.token_budget.estimator.estimate(prompt))
+        usage.response_tokens = self.token_budget.estimator.estimate(response_text)
+        self.usage_tracker.record(usage)
+    
+    def _circuit_open_response(self, error: CircuitOpenError, semantic_key=None, system_prompt: str = None) -> str:
+        """الرد عندما يكون قاطع Gemini مفتوحاً: أقرب رد مخزن إن وُجد وإلا رسالة فورية"""
+        logging.warning(f"تم رفض طلب Gemini فوراً: {error}")
+        if semantic_key is not None:
+            vector, guard = semantic_key
+            # نفس حد التشابه المعتاد: رد سؤال آخر أسوأ من رسالة توقف واضحة
+            cached_response = self.semantic_cache.get(vector, system_prompt, guard=guard)
+            if cached_response is not None:
+                return cached_response
+        return ErrorResponse(
+            f"عذراً، خدمة الذكاء الاصطناعي متوقفة مؤقتاً. يرجى المحاولة بعد {int(error.retry_after) + 1} ثانية."
+        )
+    
+    async def _semantic_key(self, prompt: str, context: str = None, method: str = "generate_response"):
+        """تضمين الرسالة وبصمة أرقامها وأدوات النفي فيها للتخزين الدلالي، ويرجع None للطلبات غير المناسبة له
+        (الرسائل الطويلة أو المرتبطة بسياق أو الصادرة من دوال أخرى مثل الترجمة)"""
+        if (not self.semantic_cache or context or method != "generate_response"
+                or len(prompt) > config.GEMINI_SEMANTIC_CACHE_MAX_PROMPT_CHARS):
+            return None
+        try:
+            if config.GEMINI_SEMANTIC_CACHE_EMBEDDING == "gemini":
+                # التضمين يشغل خيطاً من المجمع لذلك يحجز مكاناً فيه مثل طلبات التوليد
+                loop = asyncio.get_running_loop()
+                async with self._request_slot():
+                    vector = await loop.run_in_executor(self._executor, self.semantic_cache.embed, prompt)
+            else:
+                vector = self.semantic_cache.embed(prompt)
+            return vector, self.semantic_cache.guard(prompt)
+        except Exception as e:
+            logging.warning(f"تعذر تضمين الرسالة للتخزين الدلالي: {e}")
+            return None
+    
+    def _fit_prompt(self, prompt: str, context: str = None, system_prompt: str = None) -> Tuple[str, Optional[str]]:
+        """تقليم السياق ثم الرسالة إذا تجاوز المجموع ميزانية generate_response"""
+        estimator = self.token_budget.estimator
+        limit = self.token_budget.limit_for("generate_response")
+        fixed_tokens = estimator.estimate(system_prompt or "")
+        dropped = 0
+        
+        if context:
+            context, context_dropped = self.token_budget.fit_text(
+                context, max(limit - fixed_tokens - estimator.estimate(prompt), limit // 4))
+            dropped += context_dropped
+        
+        prompt, prompt_dropped = self.token_budget.fit_text(
+            prompt, max(limit - fixed_tokens - estimator.estimate(context or ""), limit // 4))
+        dropped += prompt_dropped
+        
+        self._record_budget("generate_response", dropped)
+        return prompt, context
+    
+    def _record_budget(self, method: str, dropped_tokens: int) -> Dict[str, int]:
+        """تسجيل ما تم حذفه لملاءمة الميزانية وإرجاع تقرير مختصر"""
+        limit = self.token_budget.limit_for(method)
+        if dropped_tokens > 0:
+            stats = self.budget_stats.setdefault(method, {"trimmed_calls": 0, "dropped_tokens": 0})
+            stats["trimmed_calls"] += 1
+            stats["dropped_tokens"] += dropped_tokens
+            logging.info(f"تم تقليص مدخلات {method} بمقدار {dropped_tokens} رمز تقريباً لتناسب الحد {limit}")
+        return {"limit_tokens": limit, "dropped_tokens": dropped_tokens}
+    
+    def get_budget_stats(self) -> Dict[str, Dict[str, int]]:
+        """الحصول على إحصائيات تقليص المدخلات لكل دالة"""
+        return {method: dict(stats) for method, stats in self.budget_stats.items()}
+    
+    def _build_prompt(self, prompt: str, context: str = None, system_prompt: str = None) -> str:
+        """بناء الرسالة الكاملة المرسلة للنموذج"""
+        full_prompt = ""
+        if system_prompt:
+            full_prompt += f"System: {system_prompt}\n\n"
+        if context:
+            full_prompt += f"Context: {context}\n\n"
+        full_prompt += f"User: {prompt}\n\nAssistant:"
+        return full_prompt
+    
+    async def _complete(self, full_prompt: str, use_cache: bool = True, method: str = "generate_response",
+                        priority: str = None) -> str:
+        """توليد رد للرسالة الكاملة عبر التخزين المؤقت (يرفع الاستثناءات بدلاً من إرجاع رسالة خطأ)"""
+        cache_key = ResponseCache.make_key(full_prompt, self.generation_config)
+        usage = UsageRecord(method, self.token_budget.estimator.estimate(full_prompt))
+        
+        async def generate_and_store() -> str:
+            tiers = self.router.route(method, usage.prompt_tokens, priority)
+            response_text = await self._generate(full_prompt, self.generation_config, tiers, usage)
+            
+            # الأخطاء لا تصل إلى هنا لذلك لا يتم تخزين رسائل الخطأ
+            if use_cache and self.cache and response_text:
+                self.cache.set(cache_key, response_text)
+            
+            return response_text
+        
+        try:
+            # البحث في التخزين المؤقت
+            response_text = await self.cache.get_async(cache_key) if use_cache and self.cache else None
+            if response_text is None:
+                # الطلبات المتطابقة التي تصل أثناء تنفيذ طلب سابق تنتظر نفس النتيجة
+                response_text = await self.single_flight.do(cache_key, generate_and_store)
+            usage.response_tokens = self.token_budget.estimator.estimate(response_text)
+            return response_text
+        except Exception:
+            usage.success = False
+            raise
+        finally:
+            self.usage_tracker.record(usage)
+    
+    async def generate_response_stream(self, prompt: str, context: str = None, system_prompt: str = None,
+                                       use_cache: bool = True, priority: str = None) -> AsyncIterator[str]:
+        """توليد رد من Gemini بشكل تدريجي، كل قيمة هي النص المتراكم حتى الآن"""
+        usage = None
+        try:
+            prompt, context = self._fit_prompt(prompt, context, system_prompt)
+            full_prompt = self._build_prompt(prompt, context, system_prompt)
+            usage = UsageRecord("generate_response", self.token_budget.estimator.estimate(full_prompt))
+            
+            semantic_key = await self._semantic_key(prompt, context) if use_cache else None
+            if semantic_key is not None:
+                vector, guard = semantic_key
+                cached_response = self.semantic_cache.get(vector, system_prompt, guard=guard)
+                if cached_response is not None:
+                    usage.response_tokens = self.token_budget.estimator.estimate(cached_response)
+                    yield cached_response
+                    return
+            
+            cache_key = None
+            if use_cache and self.cache:
+                cache_key = self.cache.make_key(full_prompt, self.generation_config)
+                cached_response = await self.cache.get_async(cache_key)
+                if cached_response is not None:
+                    usage.response_tokens = self.token_budget.estimator.estimate(cached_response)
+                    yield cached_response
+                    return
+            
+            tiers = self.router.route("generate_response", usage.prompt_tokens, priority)
+            response_text = ""
+            try:
+                async for chunk_text in self._generate_stream(full_prompt, self.generation_config, tiers, usage):
+                    response_text += chunk_text
+                    yield response_text
+            except CircuitOpenError as e:
+                usage.success = False
+                yield self._circuit_open_response(e, semantic_key, system_prompt)
+                return
+            
+            response_text = response_text.strip()
+            usage.response_tokens = self.token_budget.estimator.estimate(response_text)
+            if cache_key and response_text:
+                self.cache.set(cache_key, response_text)
+            if semantic_key is not None and response_text:
+                self.semantic_cache.set(vector, response_text, system_prompt, guard=guard)
+            
+        except Exception as e:
+            if usage:
+                usage.success = False
+            logging.error(f"خطأ في توليد رد Gemini التدريجي: {e}")
+            yield ErrorResponse(f"عذراً، حدث خطأ في معالجة طلبك: {str(e)}")
+        finally:
+            if usage:
+                self.usage_tracker.record(usage)
+    
+    async def _acquire_slot(self) -> float:
+        """حجز مكان في مجمع الطلبات، الطلبات الزائدة عن الحد تنتظر في الطابور بدلاً من الفشل (يرجع مدة الانتظار)"""
+        queued_at = time.monotonic()
+        self._queued_requests += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._queued_requests -= 1
+        self._active_requests += 1
+        return time.monotonic() - queued_at
+    
+    def _release_slot(self, _future=None):
+        """تحرير مكان في مجمع الطلبات"""
+        self._active_requests -= 1
+        self._semaphore.release()
+    
+    def _release_slot_when_done(self, future: asyncio.Future):
+        """تحرير المكان عند انتهاء الخيط فعلاً: انتهاء المهلة لا يوقف الخيط، فيبقى مكانه محجوزاً حتى
+        لا تنتظر الطلبات التالية في طابور المجمع خلف خيوط معلقة وتتجاوز حد الطلبات المتزامنة"""
+        if future.done():
+            self._release_slot()
+            return
+        # استرجاع خطأ الطلب المعلق حتى لا يُسجل كخطأ غير مسترجع
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        future.add_done_callback(self._release_slot)
+    
+    @asynccontextmanager
+    async def _request_slot(self):
+        """حجز مكان في مجمع الطلبات طوال الكتلة (يرجع مدة الانتظار)"""
+        slot_wait = await self._acquire_slot()
+        try:
+            yield slot_wait
+        finally:
+            self._release_slot()
+    
+    async def _generate(self, full_prompt: str, generation_config, tiers: List[str] = None,
+                        usage: UsageRecord = None) -> str:
+        """تنفيذ طلب التوليد في مجمع الخيوط ضمن حصة المعدل، مع الانتقال للفئة التالية عند الفشل
+        وإعادة المحاولة للأخطاء المؤقتة في آخر فئة"""
+        prompt_tokens = self.token_budget.estimator.estimate(full_prompt)
+        tiers = tiers or ["standard"]
+        
+        async def attempt(tier: str) -> str:
+            # القاطع المفتوح يرفض الطلب قبل الانتظار في الطوابير، ثم يُقاس استدعاء النموذج وحده
+            self.breaker.check()
+            
+            # انتظار الحصة قبل حجز مكان في المجمع حتى لا يُشغل المنتظر خيطاً
+            rate_limit_wait = await self.rate_limiter.acquire(prompt_tokens)
+            slot_wait = await self._acquire_slot()
+            loop = asyncio.get_running_loop()
+            started_at = time.monotonic()
+            future = None
+            try:
+                async with self.breaker.guard():
+                    future = loop.run_in_executor(
+                        self._executor,
+                        functools.partial(self.backend.generate, tier, full_prompt, generation_config)
+                    )
+                    # المهلة تبدأ بعد حجز المكان فلا تُحسب منها مدة الانتظار في الطابور
+                    response = await asyncio.wait_for(asyncio.shield(future),
+                                                      timeout=config.GEMINI_TIER_TIMEOUTS.get(tier))
+                response_text = response.strip()
+            except Exception as e:
+                # أخطاء الطلب نفسه (رد محجوب أو غير صالح) لا تعني أن الفئة متعطلة
+                if self._is_transient_error(e):
+                    self.router.record_failure(tier, time.monotonic() - started_at)
+                raise
+            finally:
+                if future is None:
+                    self._release_slot()
+                else:
+                    self._release_slot_when_done(future)
+                if usage and future is not None:
+                    usage.model_calls += 1
+                    usage.queue_wait += rate_limit_wait + slot_wait
+                    usage.model_time += time.monotonic() - started_at
+            self.router.record_success(tier, time.monotonic() - started_at)
+            return response_text
+        
+        for index, tier in enumerate(tiers):
+            try:
+                if index == len(tiers) - 1:
+                    response_text = await self._with_retries(functools.partial(attempt, tier))
+                else:
+                    response_text = await attempt(tier)
+                break
+            except Exception as e:
+                if index == len(tiers) - 1 or not self._is_transient_error(e):
+                    raise
+                self._fall_back(tier, tiers[index + 1], e)
+        
+        self.rate_limiter.consume_tokens(self.token_budget.estimator.estimate(response_text))
+        return response_text
+    
+    async def _generate_stream(self, full_prompt: str, generation_config, tiers: List[str] = None,
+                               usage: UsageRecord = None) -> AsyncIterator[str]:
+        """توليد تدريجي مع الانتقال للفئة التالية أو إعادة المحاولة طالما لم يصل أي جزء بعد"""
+        prompt_tokens = self.token_budget.estimator.estimate(full_prompt)
+        response_tokens = 0
+        tiers = tiers or ["standard"]
+        
+        for index, tier in enumerate(tiers):
+            is_last_tier = index == len(tiers) - 1
+            for attempt in range(self.max_retries + 1 if is_last_tier else 1):
+                received_any = False
+                try:
+                    self.breaker.check()
+                    rate_limit_wait = await self.rate_limiter.acquire(prompt_tokens)
+                    if usage:
+                        usage.queue_wait += rate_limit_wait
+                    async for chunk_text in self._stream_once(full_prompt, generation_config, tier, usage):
+                        received_any = True
+                        response_tokens += self.token_budget.estimator.estimate(chunk_text)
+                        yield chunk_text
+                    self.rate_limiter.consume_tokens(response_tokens)
+                    return
+                except Exception as e:
+                    if received_any:
+                        raise
+                    if not is_last_tier and self._is_transient_error(e):
+                        self._fall_back(tier, tiers[index + 1], e)
+                        break
+                    if not self._should_retry(e, attempt):
+                        raise
+                    await self._retry_sleep(e, attempt)
+    
+    async def _stream_once(self, full_prompt: str, generation_config, tier: str = "standard",
+                           usage: UsageRecord = None) -> AsyncIterator[str]:
+        """تنفيذ طلب توليد تدريجي في مجمع الخيوط وتمرير الأجزاء إلى حلقة الأحداث"""
+        async with self._request_slot() as slot_wait:
+            probe = self.breaker.begin()
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            stop_event = threading.Event()
+            end_of_stream = object()
+            started_at = time.monotonic()
+            outcome: Dict[str, Any] = {}
+            
+            def produce():
+                model_started_at = time.monotonic()
+                try:
+                    for chunk_text in self.backend.generate_stream(tier, full_prompt, generation_config):
+                        if stop_event.is_set():
+                            outcome["stopped"] = True
+                            break
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk_text)
+                    loop.call_soon_threadsafe(queue.put_nowait, end_of_stream)
+                except Exception as e:
+                    outcome["error"] = e
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+                finally:
+                    outcome["model_time"] = time.monotonic() - model_started_at
+            
+            producer = loop.run_in_executor(self._executor, produce)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is end_of_stream:
+                        break
+                    if isinstance(item, Exception):
+                        if self._is_transient_error(item):
+                            self.router.record_failure(tier, time.monotonic() - started_at)
+                        raise item
+                    yield item
+                self.router.record_success(tier, time.monotonic() - started_at)
+            finally:
+                # إيقاف المنتج إذا توقف المستهلك مبكراً
+                stop_event.set()
+                await asyncio.shield(producer)
+                # المنتج لا ينتظر المستهلك، فزمنه هو زمن النموذج وحده بدون وقت عرض الأجزاء
+                if outcome.get("stopped"):
+                    self.breaker.abandon(probe)
+                else:
+                    self.breaker.finish(probe, outcome.get("model_time", 0.0), outcome.get("error"))
+                if usage:
+                    usage.model_calls += 1
+                    usage.queue_wait += slot_wait
+                    usage.model_time += time.monotonic() - started_at
+    
+    def _fall_back(self, tier: str, next_tier: str, error: Exception):
+        """تسجيل الانتقال من فئة فشلت أو تأخرت إلى الفئة التالية في السلسلة"""
+        self.router.record_fallback(tier)
+        logging.warning(f"فشل طلب Gemini على الفئة {tier} ({error!r})، الانتقال إلى الفئة {next_tier}")
+    
+    async def _with_retries(self, operation):
+        """تنفيذ عملية مع إعادة المحاولة بتأخير أسي عشوائي للأخطاء المؤقتة"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await operation()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await self._retry_sleep(e, attempt)
+    
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """هل يجب إعادة المحاولة بعد هذا الخطأ"""
+        return attempt < self.max_retries and self._is_transient_error(error)
+    
+    async def _retry_sleep(self, error: Exception, attempt: int):
+        """الانتظار قبل إعادة المحاولة (تأخير أسي مع تشويش عشوائي لتفادي تزامن المحاولات)"""
+        delay = min(config.GEMINI_RETRY_MAX_DELAY, config.GEMINI_RETRY_BASE_DELAY * (2 ** attempt))
+        delay *= random.uniform(0.5, 1.0)
+        self.retry_count += 1
+        logging.warning(f"خطأ مؤقت من Gemini ({error})، إعادة المحاولة {attempt + 1} بعد {delay:.1f} ثانية")
+        await asyncio.sleep(delay)
+    
+    def _is_transient_error(self, error: Exception) -> bool:
+        """التحقق مما إذا كان الخطأ مؤقتاً (تجاوز الحصة أو خطأ في الخادم أو انقطاع الاتصال)"""
+        if isinstance(error, google_exceptions.GoogleAPICallError):
+            return error.code in self.TRANSIENT_STATUS_CODES
+        return isinstance(error, (google_exceptions.RetryError, asyncio.TimeoutError, TimeoutError, ConnectionError))
+    
+    def get_queue_status(self) -> Dict[str, Any]:
+        """الحصول على حالة طابور الطلبات"""
+        return {
+            "max_concurrent_requests": self.max_concurrent_requests,
+            "active_requests": self._active_requests,
+            "queued_requests": self._queued_requests,
+            "rate_limit_queue": self.rate_limiter.queue_depth,
+            "retries": self.retry_count,
+            "rate_limiter": self.rate_limiter.get_status(),
+            "backend": self.backend.name,
+            "coalescing": self.single_flight.get_stats(),
+            "circuit_breaker": self.breaker.get_status(),
+            "usage": self.usage_tracker.get_stats(),
+            "model_tiers": self.router.get_stats()
+        }
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات التخزين المؤقت"""
+        if not self.cache:
+            stats = {"enabled": False}
+        else:
+            stats = {"enabled": True, **self.cache.get_stats()}
+        if self.semantic_cache:
+            stats["semantic"] = self.semantic_cache.get_stats()
+        return stats
     
     async def analyze_text(self, text: str, analysis_type: str = "general") -> Dict[str, Any]:
         """تحليل النص باستخدام Gemini"""
@@ -61,14 +541,29 @@ class GeminiClient:
             }
             
             prompt = analysis_prompts.get(analysis_type, analysis_prompts["general"])
-            full_prompt = f"{prompt}\n\nالنص:\n{text}\n\nالتحليل:"
             
-            response = await self.generate_response(full_prompt)
+            # المستندات الكبيرة تُحلل على أجزاء ثم تُدمج النتائج، وما يتجاوز الميزانية يُؤخذ منه عينة
+            chunks = self.chunker.split(text)
+            chunks, dropped = self.token_budget.sample_chunks(chunks, self.token_budget.limit_for("analyze_text"))
+            budget_report = self._record_budget("analyze_text", dropped)
+            if len(chunks) > 1:
+                response = await self._map_reduce(
+                    chunks,
+                    method="analyze_text",
+                    map_prompt=f"{prompt}\n\nهذا الجزء {{index}} من {{total}} من مستند أكبر.\n\nالنص:\n{{chunk}}\n\nالتحليل:",
+                    reduce_prompt="قم بدمج التحليلات الجزئية التالية لأجزاء من نفس المستند في تحليل واحد متكامل "
+                                  "دون تكرار، مع الحفاظ على النقاط الرئيسية والرؤى المهمة:\n\n{partials}\n\nالتحليل المتكامل:"
+                )
+            else:
+                full_prompt = f"{prompt}\n\nالنص:\n{text}\n\nالتحليل:"
+                response = await self.generate_response(full_prompt, method="analyze_text")
             
             return {
                 "analysis_type": analysis_type,
                 "original_text": text,
                 "analysis_result": response,
+                "chunks": len(chunks),
+                "input_budget": budget_report,
                 "status": "success"
             }
             
@@ -84,6 +579,19 @@ class GeminiClient:
     async def summarize_content(self, content: str, max_length: int = 500) -> str:
         """تلخيص المحتوى"""
         try:
+            chunks = self.chunker.split(content)
+            chunks, dropped = self.token_budget.sample_chunks(chunks, self.token_budget.limit_for("summarize_content"))
+            self._record_budget("summarize_content", dropped)
+            if len(chunks) > 1:
+                response = await self._map_reduce(
+                    chunks,
+                    method="summarize_content",
+                    map_prompt="قم بتلخيص الجزء {index} من {total} من المحتوى التالي في نقاط مختصرة:\n\n{chunk}\n\nالملخص:",
+                    reduce_prompt=f"قم بدمج الملخصات الجزئية التالية في ملخص واحد من {max_length} كلمة أو أقل:"
+                                  "\n\n{partials}\n\nالملخص:"
+                )
+                return response[:max_length]
+            
             prompt = f"""
             قم بتلخيص المحتوى التالي في {max_length} كلمة أو أقل:
             
@@ -93,13 +601,73 @@ class GeminiClient:
             الملخص:
             """
             
-            response = await self.generate_response(prompt)
+            response = await self.generate_response(prompt, method="summarize_content")
             return response[:max_length]
             
         except Exception as e:
             logging.error(f"خطأ في تلخيص المحتوى: {e}")
             return f"خطأ في التلخيص: {str(e)}"
     
+    async def _map_reduce(self, chunks: List[str], map_prompt: str, reduce_prompt: str,
+                          method: str = "generate_response") -> str:
+        """تحليل الأجزاء بالتوازي ضمن حد التزامن ثم دمج النتائج الجزئية على مراحل حتى نتيجة واحدة"""
+        semaphore = asyncio.Semaphore(config.GEMINI_CHUNK_CONCURRENCY)
+        
+        async def run(prompt: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return await self._complete(self._build_prompt(prompt), method=method)
+                except Exception as e:
+                    logging.warning(f"خطأ في معالجة جزء من المستند: {e}")
+                    return None
+        
+        # مرحلة التحليل (map)
+        total = len(chunks)
+        partials = await asyncio.gather(*[
+            run(map_prompt.format(index=i, total=total, chunk=chunk))
+            for i, chunk in enumerate(chunks, 1)
+        ])
+        partials = [partial for partial in partials if partial]
+        if not partials:
+            raise RuntimeError("فشل تحليل جميع أجزاء المستند")
+        
+        # مرحلة الدمج الهرمي (reduce)
+        fanin = max(2, config.GEMINI_REDUCE_FANIN)
+        while len(partials) > 1:
+            groups = [partials[i:i + fanin] for i in range(0, len(partials), fanin)]
+            if len(groups) > 1 and len(groups[-1]) == 1:
+                groups[-2].extend(groups.pop())
+            reduced = await asyncio.gather(*[
+                run(reduce_prompt.format(partials="\n\n---\n\n".join(group)))
+                for group in groups
+            ])
+            # عند فشل الدمج يُحتفظ بالنتائج الجزئية الأولى للمجموعة بدلاً من فقدانها
+            partials = [result or group[0] for result, group in zip(reduced, groups)]
+        
+        return partials[0]
+    
+    async def update_conversation_summary(self, current_summary: str, new_messages: str) -> Optional[str]:
+        """دمج رسائل جديدة في ملخص المحادثة الجاري، ويرجع None عند الفشل"""
+        try:
+            prompt = f"""
+            حدّث ملخص المحادثة التالي بإضافة الرسائل الجديدة إليه.
+            احتفظ بالحقائق والطلبات والقرارات المهمة فقط، واكتب الملخص في فقرة مختصرة.
+            
+            الملخص الحالي:
+            {current_summary or "لا يوجد"}
+            
+            الرسائل الجديدة:
+            {new_messages}
+            
+            الملخص المحدث:
+            """
+            
+            return await self._complete(self._build_prompt(prompt), method="update_conversation_summary")
+            
+        except Exception as e:
+            logging.error(f"خطأ في تحديث ملخص المحادثة: {e}")
+            return None
+    
     async def generate_file_content(self, file_type: str, content_description: str, format_specs: Dict = None) -> str:
         """إنشاء محتوى ملف جديد"""
         try:
@@ -107,6 +675,10 @@ class GeminiClient:
             if format_specs:
                 format_instructions = f"\nمتطلبات التنسيق: {json.dumps(format_specs, ensure_ascii=False)}"
             
+            content_description, dropped = self.token_budget.fit_text(
+                content_description, self.token_budget.limit_for("generate_file_content"))
+            self._record_budget("generate_file_content", dropped)
+            
             prompt = f"""
             قم بإنشاء محتوى لملف {file_type} بناءً على الوصف التالي:
             
@@ -116,7 +688,7 @@ class GeminiClient:
             المحتوى:
             """
             
-            response = await self.generate_response(prompt)
+            response = await self.generate_response(prompt, method="generate_file_content")
             return response
             
         except Exception as e:
@@ -126,12 +698,24 @@ class GeminiClient:
     async def process_search_results(self, query: str, search_results: List[Dict]) -> Dict[str, Any]:
         """معالجة نتائج البحث وتحليلها"""
         try:
-            # تجميع نتائج البحث
-            results_text = ""
-            for i, result in enumerate(search_results[:5], 1):  # أول 5 نتائج فقط
-                results_text += f"{i}. {result.get('title', 'بدون عنوان')}\n"
-                results_text += f"   {result.get('snippet', 'بدون وصف')}\n"
-                results_text += f"   الرابط: {result.get('link', 'بدون رابط')}\n\n"
+            # تجميع نتائج البحث ضمن ميزانية الرموز (أول 5 نتائج فقط)
+            def render_result(item, max_chars: int) -> str:
+                i, result = item
+                # محتوى الصفحة المحملة إن وجد، وإلا المقتطف من محرك البحث
+                snippet = result.get('content') or result.get('snippet', 'بدون وصف')
+                if max_chars and len(snippet) > max_chars:
+                    snippet = snippet[:max_chars] + "..."
+                return (f"{i}. {result.get('title', 'بدون عنوان')}\n"
+                        f"   {snippet}\n"
+                        f"   الرابط: {result.get('link', 'بدون رابط')}\n\n")
+            
+            rendered_results, dropped = self.token_budget.fit_items(
+                list(enumerate(search_results[:5], 1)),
+                self.token_budget.limit_for("process_search_results"),
+                render_result
+            )
+            budget_report = self._record_budget("process_search_results", dropped)
+            results_text = "".join(rendered_results)
             
             prompt = f"""
             قم بتحليل نتائج البحث التالية والاستعلام "{query}":
@@ -144,17 +728,26 @@ class GeminiClient:
             2. تصنيف النتائج حسب الموضوع
             3. تحديد المصادر الأكثر موثوقية
             4. تقديم رؤى وتوصيات
-            
-            التحليل:
             """
             
-            analysis = await self.generate_response(prompt)
+            # التحليل والملخص في طلب واحد، والمسار القديم (طلبان) فقط عند فشل تحليل JSON
+            structured = await self._generate_structured(prompt, {
+                "analysis": (str, "التحليل الكامل وفق المطلوب أعلاه"),
+                "summary": (str, "ملخص للتحليل في 300 حرف أو أقل")
+            }, method="process_search_results")
+            if structured:
+                analysis = structured["analysis"]
+                summary = structured["summary"][:300]
+            else:
+                analysis = await self.generate_response(f"{prompt}\nالتحليل:", method="process_search_results")
+                summary = await self.summarize_content(analysis, 300)
             
             return {
                 "query": query,
                 "search_results": search_results,
                 "analysis": analysis,
-                "summary": await self.summarize_content(analysis, 300),
+                "summary": summary,
+                "input_budget": budget_report,
                 "status": "success"
             }
             
@@ -171,12 +764,15 @@ class GeminiClient:
     async def generate_code_analysis(self, code: str, language: str = "python") -> Dict[str, Any]:
         """تحليل الكود وتوليد تقرير شامل"""
         try:
+            code_text, dropped = self.token_budget.fit_text(code, self.token_budget.limit_for("generate_code_analysis"))
+            budget_report = self._record_budget("generate_code_analysis", dropped)
+            
             prompt = f"""
             قم بتحليل الكود التالي المكتوب بلغة {language}:
             
             الكود:
             ```{language}
-            {code}
+            {code_text}
             ```
             
             المطلوب:
@@ -185,17 +781,25 @@ class GeminiClient:
             3. اقتراح تحسينات
             4. تقييم جودة الكود
             5. اقتراح اختبارات
-            
-            التحليل:
             """
             
-            analysis = await self.generate_response(prompt)
+            structured = await self._generate_structured(prompt, {
+                "analysis": (str, "التحليل الكامل وفق المطلوب أعلاه"),
+                "summary": (str, "ملخص للتحليل في 200 حرف أو أقل")
+            }, method="generate_code_analysis")
+            if structured:
+                analysis = structured["analysis"]
+                summary = structured["summary"][:200]
+            else:
+                analysis = await self.generate_response(f"{prompt}\nالتحليل:", method="generate_code_analysis")
+                summary = await self.summarize_content(analysis, 200)
             
             return {
                 "code": code,
                 "language": language,
                 "analysis": analysis,
-                "summary": await self.summarize_content(analysis, 200),
+                "summary": summary,
+                "input_budget": budget_report,
                 "status": "success"
             }
             
@@ -213,11 +817,14 @@ class GeminiClient:
         """توليد خطة تنفيذ المهمة"""
         try:
             agents_text = "\n".join([f"- {agent}" for agent in available_agents])
+            description_text, dropped = self.token_budget.fit_text(
+                task_description, self.token_budget.limit_for("generate_task_plan"))
+            budget_report = self._record_budget("generate_task_plan", dropped)
             
             prompt = f"""
             قم بتخطيط تنفيذ المهمة التالية باستخدام الوكلاء المتاحة:
             
-            المهمة: {task_description}
+            المهمة: {description_text}
             
             الوكلاء المتاحة:
             {agents_text}
@@ -228,17 +835,30 @@ class GeminiClient:
             3. ترتيب الخطوات
             4. تقدير الوقت المطلوب
             5. تحديد المتطلبات والموارد
-            
-            الخطة:
             """
             
-            plan = await self.generate_response(prompt)
+            structured = await self._generate_structured(prompt, {
+                "plan": (str, "الخطة الكاملة كنص مقروء"),
+                "summary": (str, "ملخص للخطة في 250 حرفاً أو أقل"),
+                "steps": (list, 'قائمة الخطوات بالترتيب، كل خطوة كائن بالمفاتيح "step" (رقم) و"description" '
+                                'و"agent" (اسم الوكيل من القائمة) و"estimated_time" و"requirements" (قائمة نصوص)')
+            }, method="generate_task_plan", normalize=self._normalize_plan)
+            if structured:
+                steps = structured["steps"]
+                plan = structured["plan"]
+                summary = structured["summary"][:250]
+            else:
+                plan = await self.generate_response(f"{prompt}\nالخطة:", method="generate_task_plan")
+                summary = await self.summarize_content(plan, 250)
+                steps = []
             
             return {
                 "task_description": task_description,
                 "available_agents": available_agents,
                 "execution_plan": plan,
-                "summary": await self.summarize_content(plan, 250),
+                "steps": steps,
+                "summary": summary,
+                "input_budget": budget_report,
                 "status": "success"
             }
             
@@ -252,29 +872,231 @@ class GeminiClient:
                 "status": "error"
             }
     
+    async def _generate_structured(self, prompt: str, fields: Dict[str, Tuple[type, str]],
+                                   method: str = "generate_response",
+                                   normalize: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]] = None
+                                   ) -> Optional[Dict[str, Any]]:
+        """طلب رد بصيغة JSON والتحقق من الحقول المطلوبة، ويرجع None إذا تعذر تحليل الرد
+        
+        normalize يوحد حقول الرد ويرجع None إذا لم يبق منها ما يُستخدم، فيُعامل الرد كغير صالح.
+        """
+        fields_text = "\n".join(f'- "{name}": {description}' for name, (_, description) in fields.items())
+        structured_prompt = (f"{prompt}\n\nأعد الإجابة ككائن JSON صالح فقط بدون أي نص خارجه، "
+                             f"بالمفاتيح التالية:\n{fields_text}")
+        full_prompt = self._build_prompt(structured_prompt)
+        
+        response_text = await self._complete(full_prompt, method=method)
+        data = self._parse_json_response(response_text)
+        
+        valid = data is not None and all(
+            isinstance(data.get(name), expected_type) and data.get(name)
+            for name, (expected_type, _) in fields.items()
+        )
+        if valid and normalize:
+            data = normalize(data)
+            valid = data is not None
+        if not valid:
+            logging.warning("تعذر تحليل الرد المنظم، سيتم استخدام المسار التقليدي")
+            # حذف الرد غير الصالح من التخزين المؤقت حتى لا يتكرر الفشل
+            if self.cache:
+                self.cache.invalidate(self.cache.make_key(full_prompt, self.generation_config))
+            return None
+        
+        return data
+    
+    @staticmethod
+    def _parse_json_response(response_text: str) -> Optional[Dict[str, Any]]:
+        """استخراج كائن JSON من رد النموذج (مع تجاهل أسوار الكود أو النص المحيط)"""
+        start = response_text.find("{")
+        end = response_text.rfind("}")
+        if start == -1 or end <= start:
+            return None
+        try:
+            data = json.loads(response_text[start:end + 1])
+        except (ValueError, TypeError):
+            return None
+        return data if isinstance(data, dict) else None
+    
+    @classmethod
+    def _normalize_plan(cls, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """توحيد خطوات الخطة المنظمة، والخطة بدون خطوات صالحة لا تُقبل"""
+        steps = cls._normalize_plan_steps(data["steps"])
+        return {**data, "steps": steps} if steps else None
+    
+    @staticmethod
+    def _normalize_plan_steps(steps: List[Any]) -> List[Dict[str, Any]]:
+        """التحقق من خطوات الخطة وتوحيد أنواع حقولها"""
+        normalized = []
+        for index, step in enumerate(steps, 1):
+            if not isinstance(step, dict) or not isinstance(step.get("description"), str) or not step["description"].strip():
+                continue
+            requirements = step.get("requirements", [])
+            if not isinstance(requirements, list):
+                requirements = [requirements]
+            try:
+                step_number = int(step.get("step", index))
+            except (ValueError, TypeError):
+                step_number = index
+            normalized.append({
+                "step": step_number,
+                "description": step["description"].strip(),
+                "agent": str(step.get("agent") or ""),
+                "estimated_time": str(step.get("estimated_time") or ""),
+                "requirements": [str(item) for item in requirements if item]
+            })
+        return normalized
+    
     async def translate_text(self, text: str, target_language: str, source_language: str = "auto") -> str:
         """ترجمة النص"""
         try:
-            prompt = f"""
-            قم بترجمة النص التالي من {source_language} إلى {target_language}:
-            
-            النص الأصلي:
-            {text}
-            
-            الترجمة:
-            """
-            
-            response = await self.generate_response(prompt)
-            return response
-            
+            return await self._translate_text(text, target_language, source_language)
+        except Exception as e:
+            return self._translation_error(e)
+    
+    async def translate_segments(self, segments: List[str], target_language: str,
+                                 source_language: str = "auto") -> Union[List[str], ErrorResponse]:
+        """ترجمة قائمة نصوص بعدد قليل من الطلبات: تجميع النصوص في دفعات بحجم الميزانية كـ JSON مرقم،
+        وتنفيذ الدفعات بالتوازي، وحفظ ترجمة كل نص على حدة في التخزين المؤقت
+        
+        عند الفشل ترجع ErrorResponse واحدة بدلاً من القائمة، فلا تظهر رسالة خطأ مكان ترجمة أي نص.
+        """
+        try:
+            return await self._translate_segments(segments, target_language, source_language)
+        except Exception as e:
+            return self._translation_error(e)
+    
+    def _translation_error(self, error: Exception) -> ErrorResponse:
+        """رسالة الخطأ للمستخدم عند فشل الترجمة، بنفس رسائل generate_response"""
+        if isinstance(error, CircuitOpenError):
+            return self._circuit_open_response(error)
+        logging.error(f"خطأ في الترجمة: {error}")
+        if self._is_transient_error(error):
+            return ErrorResponse("عذراً، الخدمة مشغولة حالياً. يرجى المحاولة بعد قليل.")
+        return ErrorResponse(f"خطأ في الترجمة: {str(error)}")
+    
+    async def _translate_text(self, text: str, target_language: str, source_language: str) -> str:
+        """ترجمة نص واحد، وترفع الاستثناءات بدلاً من إرجاع رسالة خطأ"""
+        # النص الأكبر من الميزانية يُترجم فقرةً فقرة على دفعات بدلاً من حذف جزء منه
+        limit = self.token_budget.limit_for("translate_text")
+        if self.token_budget.estimator.estimate(text) > limit:
+            paragraphs = text.split("\n\n")
+            if len(paragraphs) == 1:
+                chunker = TextChunker(max_chunk_chars=self.token_budget.estimator.chars_for_tokens(text, limit))
+                paragraphs = chunker.split(text)
+            translations = await self._translate_segments(paragraphs, target_language, source_language)
+            return "\n\n".join(translations)
+        
+        prompt = f"""
+        قم بترجمة النص التالي من {source_language} إلى {target_language}:
+        
+        النص الأصلي:
+        {text}
+        
+        الترجمة:
+        """
+        
+        return await self._complete(self._build_prompt(prompt), method="translate_text")
+    
+    async def _translate_segments(self, segments: List[str], target_language: str,
+                                  source_language: str) -> List[str]:
+        """تنفيذ translate_segments، وترفع الاستثناءات فتفشل الترجمة كاملة بدلاً من إدراج رسالة خطأ مكان نص"""
+        estimator = self.token_budget.estimator
+        translations: Dict[str, str] = {}
+        
+        def segment_key(segment: str) -> str:
+            return ResponseCache.make_key(segment, {"translate": [source_language, target_language]})
+        
+        # النصوص الفارغة والمكررة والمترجمة سابقاً لا تُرسل
+        pending = []
+        for segment in dict.fromkeys(segments):
+            if not segment.strip():
+                translations[segment] = segment
+                continue
+            cached = await self.cache.get_async(segment_key(segment)) if self.cache else None
+            if cached is not None:
+                translations[segment] = cached
+            else:
+                pending.append(segment)
+        
+        # تجميع النصوص في دفعات، والنص الأكبر من الدفعة يُترجم وحده
+        batches: List[List[str]] = []
+        single: List[str] = []
+        batch_tokens = 0
+        for segment in pending:
+            tokens = estimator.estimate(segment)
+            if tokens > config.GEMINI_TRANSLATE_BATCH_TOKENS:
+                single.append(segment)
+                continue
+            if (not batches or batch_tokens + tokens > config.GEMINI_TRANSLATE_BATCH_TOKENS
+                    or len(batches[-1]) >= config.GEMINI_TRANSLATE_BATCH_SEGMENTS):
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append(segment)
+            batch_tokens += tokens
+        
+        semaphore = asyncio.Semaphore(config.GEMINI_TRANSLATE_CONCURRENCY)
+        
+        # الترجمات الناجحة فقط تصل إلى هنا لذلك لا تُخزن رسائل الخطأ
+        def store(segment: str, translation: str):
+            translations[segment] = translation
+            if self.cache:
+                self.cache.set(segment_key(segment), translation)
+        
+        async def translate_batch(batch: List[str]):
+            async with semaphore:
+                results = await self._translate_batch(batch, target_language, source_language)
+            for segment, translation in zip(batch, results):
+                if translation is None:
+                    # النص الذي لم يرد في الرد يُترجم وحده
+                    async with semaphore:
+                        translation = await self._translate_text(segment, target_language, source_language)
+                store(segment, translation)
+        
+        async def translate_single(segment: str):
+            store(segment, await self._translate_text(segment, target_language, source_language))
+        
+        # فشل أي نص يُفشل الترجمة كاملة، فتُلغى بقية الدفعات بدلاً من انتظار نتائج لن تُستخدم
+        tasks = [asyncio.ensure_future(translate_batch(batch)) for batch in batches]
+        tasks += [asyncio.ensure_future(translate_single(segment)) for segment in single]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        return [translations[segment] for segment in segments]
+    
+    async def _translate_batch(self, batch: List[str], target_language: str,
+                               source_language: str) -> List[Optional[str]]:
+        """ترجمة دفعة نصوص في طلب واحد، ويرجع None للنصوص المفقودة من الرد"""
+        numbered = json.dumps({str(i): segment for i, segment in enumerate(batch, 1)}, ensure_ascii=False)
+        prompt = (f"ترجم قيم كائن JSON التالي من {source_language} إلى {target_language}. "
+                  f"أعد كائن JSON صالحاً فقط بنفس المفاتيح، وقيمة كل مفتاح هي ترجمة النص المقابل له كاملاً، "
+                  f"مع الحفاظ على فواصل الأسطر والتنسيق:\n\n{numbered}")
+        full_prompt = self._build_prompt(prompt)
+        
+        try:
+            data = self._parse_json_response(await self._complete(full_prompt, method="translate_text")) or {}
         except Exception as e:
-            logging.error(f"خطأ في الترجمة: {e}")
-            return f"خطأ في الترجمة: {str(e)}"
+            # الخدمة متوقفة أو مشغولة: ترجمة كل نص وحده تضاعف الطلبات الفاشلة لذلك تفشل الدفعة كاملة
+            if isinstance(e, CircuitOpenError) or self._is_transient_error(e):
+                raise
+            logging.warning(f"خطأ في ترجمة دفعة من {len(batch)} نص: {e}")
+            data = {}
+        
+        results = [data.get(str(i)) if isinstance(data.get(str(i)), str) else None for i in range(1, len(batch) + 1)]
+        if None in results and self.cache:
+            # الرد الناقص لا يُعاد استخدامه من التخزين المؤقت
+            self.cache.invalidate(self.cache.make_key(full_prompt, self.generation_config))
+        return results
     
     async def generate_report(self, data: Dict[str, Any], report_type: str = "general") -> str:
         """توليد تقرير من البيانات"""
         try:
-            data_summary = json.dumps(data, ensure_ascii=False, indent=2)
+            # JSON مضغوط بدلاً من المنسق، مع أخذ عينات من القوائم الطويلة عند تجاوز الميزانية
+            data_summary, dropped = self.token_budget.compact_data(data, self.token_budget.limit_for("generate_report"))
+            self._record_budget("generate_report", dropped)
             
             prompt = f"""
             قم بإنشاء تقرير {report_type} بناءً على البيانات التالية:
@@ -292,7 +1114,7 @@ class GeminiClient:
             التقرير:
             """
             
-            report = await self.generate_response(prompt)
+            report = await self.generate_response(prompt, method="generate_report")
             return report
             
         except Exception as e:
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+واجهات نماذج اللغة خلف GeminiClient: Gemini الحقيقي، وبديل محلي لاختبارات الحمل، وتسجيل الردود وإعادة تشغيلها
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Any, Iterator
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from response_cache import ResponseCache
+import config
+
+class LLMBackend:
+    """الواجهة الأساسية: دوال متزامنة يستدعيها GeminiClient من مجمع الخيوط"""
+    
+    name = "base"
+    
+    def generate(self, tier: str, prompt: str, generation_config: Any = None) -> str:
+        """توليد الرد كاملاً"""
+        raise NotImplementedError
+    
+    def generate_stream(self, tier: str, prompt: str, generation_config: Any = None) -> Iterator[str]:
+        """توليد الرد على أجزاء"""
+        yield self.generate(tier, prompt, generation_config)
+    
+    def embed(self, text: str) -> List[float]:
+        """تضمين النص في متجه"""
+        raise NotImplementedError(f"الواجهة {self.name} لا تدعم التضمين")
+
+class GeminiBackend(LLMBackend):
+    """نماذج Gemini الحقيقية، نموذج لكل فئة"""
+    
+    name = "gemini"
+    
+    def __init__(self, api_key: str = config.GEMINI_API_KEY, model_tiers: Dict[str, str] = None):
+        genai.configure(api_key=api_key)
+        model_tiers = model_tiers or config.GEMINI_MODEL_TIERS
+        self.models = {tier: genai.GenerativeModel(name) for tier, name in model_tiers.items()}
+    
+    def generate(self, tier: str, prompt: str, generation_config: Any = None) -> str:
+        response = self.models[tier].generate_content(prompt, generation_config=generation_config)
+        return response.text
+    
+    def generate_stream(self, tier: str, prompt: str, generation_config: Any = None) -> Iterator[str]:
+        response = self.models[tier].generate_content(prompt, generation_config=generation_config, stream=True)
+        for chunk in response:
+            yield chunk.text
+    
+    def embed(self, text: str) -> List[float]:
+        result = genai.embed_content(model=config.GEMINI_EMBEDDING_MODEL, content=text,
+                                     task_type="semantic_similarity")
+        return result["embedding"]
+
+class StubBackend(LLMBackend):
+    """بديل محلي بدون شبكة بزمن استجابة ونسبة أخطاء وحجم رد قابلة للضبط، لقياس أداء البوت نفسه"""
+    
+    name = "stub"
+    
+    def __init__(self, latency_mean: float = config.LLM_STUB_LATENCY_MEAN,
+                 latency_stddev: float = config.LLM_STUB_LATENCY_STDDEV,
+                 error_rate: float = config.LLM_STUB_ERROR_RATE,
+                 response_chars: int = config.LLM_STUB_RESPONSE_CHARS,
+                 stream_chunks: int = 8, seed: int = config.LLM_STUB_SEED,
+                 tier_latency_factors: Dict[str, float] = None):
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.error_rate = error_rate
+        self.response_chars = response_chars
+        self.stream_chunks = stream_chunks
+        self.tier_latency_factors = tier_latency_factors or {"light": 0.5, "standard": 1.0, "heavy": 2.0}
+        
+        # المولد العشوائي مشترك بين الخيوط لذلك يُحمى بقفل حتى تتكرر النتائج مع نفس البذرة
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+    
+    def _sample(self, tier: str):
+        """سحب زمن الاستجابة (توزيع لوغاريتمي طبيعي) وحالة الخطأ وطول الرد"""
+        with self._lock:
+            self.calls += 1
+            mean = self.latency_mean * self.tier_latency_factors.get(tier, 1.0)
+            if mean > 0 and self.latency_stddev > 0:
+                sigma2 = math.log(1 + (self.latency_stddev / mean) ** 2)
+                latency = self._random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+            else:
+                latency = mean
+            failed = self._random.random() < self.error_rate
+            size = max(1, int(self._random.gauss(self.response_chars, self.response_chars * 0.25)))
+        return latency, failed, size
+    
+    def _response_text(self, prompt: str, size: int) -> str:
+        """نص رد ثابت للرسالة نفسها بالطول المطلوب"""
+        seed_text = f"[stub] {prompt[-80:].strip()} "
+        return (seed_text * (size // len(seed_text) + 1))[:size]
+    
+    def generate(self, tier: str, prompt: str, generation_config: Any = None) -> str:
+        latency, failed, size = self._sample(tier)
+        time.sleep(latency)
+        if failed:
+            raise google_exceptions.ServiceUnavailable("stub backend: simulated failure")
+        return self._response_text(prompt, size)
+    
+    def generate_stream(self, tier: str, prompt: str, generation_config: Any = None) -> Iterator[str]:
+        latency, failed, size = self._sample(tier)
+        if failed:
+            time.sleep(latency)
+            raise google_exceptions.ServiceUnavailable("stub backend: simulated failure")
+        
+        text = self._response_text(prompt, size)
+        step = max(1, len(text) // self.stream_chunks)
+        for start in range(0, len(text), step):
+            time.sleep(latency / self.stream_chunks)
+            yield text[start:start + step]
+    
+    def embed(self, text: str) -> List[float]:
+        from semantic_cache import HashingEmbedder
+        return HashingEmbedder()(text).tolist()
+
+class RecordReplayBackend(LLMBackend):
+    """تسجيل ردود واجهة أخرى في ملف JSONL (record) أو تقديم الردود المسجلة بدون شبكة (replay)"""
+    
+    name = "replay"
+    
+    def __init__(self, path: str = config.LLM_RECORDING_PATH, inner: LLMBackend = None,
+                 replay_latency: float = 0.0):
+        self.path = path
+        self.inner = inner
+        self.replay_latency = replay_latency
+        self.recordings: Dict[str, str] = {}
+        self.stats = {"replayed": 0, "recorded": 0, "missing": 0}
+        self._lock = threading.Lock()
+        self._load()
+    
+    @property
+    def recording(self) -> bool:
+        """وضع التسجيل عند وجود واجهة داخلية"""
+        return self.inner is not None
+    
+    def _load(self):
+        """تحميل الردود المسجلة سابقاً"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.recordings[entry["key"]] = entry["response"]
+                except (ValueError, KeyError):
+                    continue
+        logging.info(f"تم تحميل {len(self.recordings)} رد مسجل من {self.path}")
+    
+    def _record(self, key: str, prompt: str, response: str):
+        """إضافة رد إلى ملف التسجيل"""
+        with self._lock:
+            self.recordings[key] = response
+            self.stats["recorded"] += 1
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "prompt": prompt, "response": response}, ensure_ascii=False) + "\n")
+    
+    def _replay(self, key: str) -> str:
+        """تقديم رد مسجل، والرسالة غير المسجلة خطأ حتى لا يمر الاختبار بصمت"""
+        if key not in self.recordings:
+            self.stats["missing"] += 1
+            raise KeyError(f"لا يوجد رد مسجل لهذه الرسالة ({key[:12]})")
+        self.stats["replayed"] += 1
+        if self.replay_latency:
+            time.sleep(self.replay_latency)
+        return self.recordings[key]
+    
+    def generate(self, tier: str, prompt: str, generation_config: Any = None) -> str:
+        key = ResponseCache.make_key(prompt, generation_config)
+        if not self.recording:
+            return self._replay(key)
+        response = self.inner.generate(tier, prompt, generation_config)
+        self._record(key, prompt, response)
+        return response
+    
+    def generate_stream(self, tier: str, prompt: str, generation_config: Any = None) -> Iterator[str]:
+        key = ResponseCache.make_key(prompt, generation_config)
+        if not self.recording:
+            yield self._replay(key)
+            return
+        parts = []
+        for chunk in self.inner.generate_stream(tier, prompt, generation_config):
+            parts.append(chunk)
+            yield chunk
+        self._record(key, prompt, "".join(parts))
+    
+    def embed(self, text: str) -> List[float]:
+        if self.inner is not None:
+            return self.inner.embed(text)
+        from semantic_cache import HashingEmbedder
+        return HashingEmbedder()(text).tolist()
+
+def create_backend(name: str = config.LLM_BACKEND) -> LLMBackend:
+    """إنشاء الواجهة المحددة في الإعدادات (gemini أو stub أو record أو replay)"""
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "stub":
+        return StubBackend()
+    if name == "record":
+        return RecordReplayBackend(inner=GeminiBackend())
+    if name == "replay":
+        return RecordReplayBackend()
+    raise ValueError(f"واجهة نموذج غير معروفة: {name}")
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+اختيار فئة النموذج حسب نوع المهمة وحجم المدخلات وأولوية المستخدم مع سلسلة بدائل عند البطء أو الأخطاء
+"""
+
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional
+import config
+
+class TierStats:
+    """إحصائيات زمن الاستجابة والأخطاء لفئة نموذج واحدة"""
+    
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.consecutive_failures = 0
+        self.unavailable_until = 0.0
+    
+    def percentile(self, percent: float) -> float:
+        """حساب نسبة مئوية من أزمنة الاستجابة الأخيرة"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+class ModelRouter:
+    """سياسة توجيه الطلبات إلى فئات النماذج (خفيف، قياسي، ثقيل)"""
+    
+    TIER_ORDER = ["light", "standard", "heavy"]
+    
+    def __init__(self, method_tiers: Dict[str, str] = None, fallbacks: Dict[str, List[str]] = None,
+                 light_max_tokens: int = config.GEMINI_LIGHT_MAX_TOKENS,
+                 heavy_min_tokens: int = config.GEMINI_HEAVY_MIN_TOKENS,
+                 failure_threshold: int = config.GEMINI_TIER_FAILURE_THRESHOLD,
+                 cooldown: float = config.GEMINI_TIER_COOLDOWN):
+        self.method_tiers = method_tiers if method_tiers is not None else config.GEMINI_METHOD_TIERS
+        self.fallbacks = fallbacks if fallbacks is not None else config.GEMINI_TIER_FALLBACKS
+        self.light_max_tokens = light_max_tokens
+        self.heavy_min_tokens = heavy_min_tokens
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.stats: Dict[str, TierStats] = {tier: TierStats() for tier in self.TIER_ORDER}
+    
+    def select_tier(self, method: str, input_tokens: int, priority: Optional[str] = None) -> str:
+        """اختيار الفئة المناسبة: الفئة الافتراضية للدالة ثم تعديلها حسب الحجم والأولوية"""
+        level = self.TIER_ORDER.index(self.method_tiers.get(method, "standard"))
+        
+        # المدخلات الكبيرة لا تناسب النموذج الخفيف، والكبيرة جداً تحتاج فئة أعلى
+        if input_tokens > self.light_max_tokens:
+            level = max(level, 1)
+        if input_tokens > self.heavy_min_tokens:
+            level += 1
+        
+        if priority == "high":
+            level += 1
+        elif priority == "low":
+            level -= 1
+        
+        return self.TIER_ORDER[max(0, min(level, len(self.TIER_ORDER) - 1))]
+    
+    def route(self, method: str, input_tokens: int, priority: Optional[str] = None) -> List[str]:
+        """سلسلة الفئات التي تُجرب بالترتيب، الفئات المتعطلة مؤقتاً تُنقل إلى آخر السلسلة"""
+        tier = self.select_tier(method, input_tokens, priority)
+        chain = [tier] + [fallback for fallback in self.fallbacks.get(tier, []) if fallback != tier]
+        
+        now = time.monotonic()
+        available = [tier for tier in chain if self.stats[tier].unavailable_until <= now]
+        unavailable = [tier for tier in chain if self.stats[tier].unavailable_until > now]
+        return available + unavailable
+    
+    def record_success(self, tier: str, latency: float):
+        """تسجيل طلب ناجح"""
+        stats = self.stats[tier]
+        stats.calls += 1
+        stats.latencies.append(latency)
+        stats.consecutive_failures = 0
+        stats.unavailable_until = 0.0
+    
+    def record_failure(self, tier: str, latency: float):
+        """تسجيل طلب فاشل أو بطيء وإيقاف الفئة مؤقتاً بعد عدد من الأخطاء المتتالية"""
+        stats = self.stats[tier]
+        stats.calls += 1
+        stats.errors += 1
+        stats.consecutive_failures += 1
+        if stats.consecutive_failures >= self.failure_threshold:
+            stats.unavailable_until = time.monotonic() + self.cooldown
+    
+    def record_fallback(self, tier: str):
+        """تسجيل انتقال طلب من هذه الفئة إلى الفئة التالية"""
+        self.stats[tier].fallbacks += 1
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """الحصول على زمن الاستجابة والأخطاء لكل فئة"""
+        now = time.monotonic()
+        return {
+            tier: {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "fallbacks": stats.fallbacks,
+                "p50_latency": round(stats.percentile(50), 3),
+                "p95_latency": round(stats.percentile(95), 3),
+                "available": stats.unavailable_until <= now
+            }
+            for tier, stats in self.stats.items()
+        }
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+تحميل صفحات نتائج البحث واستخراج نصها الرئيسي
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import asyncio
+import hashlib
+import logging
+import ipaddress
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any
+from urllib.parse import urlparse, urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+import config
+
+# عناصر لا تحتوي على نص المقال
+NOISE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe", "svg", "button"]
+
+# عناصر النص التي تُجمع من الحاوية الرئيسية
+TEXT_TAGS = ["h1", "h2", "h3", "h4", "p", "li", "pre", "blockquote", "td"]
+
+class BlockedURLError(Exception):
+    """رابط يشير إلى عنوان داخلي أو محجوز فلا يُحمل"""
+    pass
+
+def check_public_url(url: str, allow_private: bool = False):
+    """التأكد من أن الرابط http أو https ومضيفه يُحل إلى عناوين عامة فقط، وإلا BlockedURLError
+    
+    روابط نتائج البحث والتحويلات يتحكم بها أصحاب المواقع، فلا يُسمح لها بالوصول إلى الشبكة الداخلية للخادم.
+    allow_private يكتفي بفحص نوع الرابط، للاختبارات على خادم محلي أو الشبكات الخاصة.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise BlockedURLError(f"رابط غير مدعوم: {url}")
+    if allow_private:
+        return
+    
+    try:
+        addresses = socket.getaddrinfo(parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80),
+                                       proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise BlockedURLError(f"تعذر حل اسم المضيف {parsed.hostname}: {e}")
+    
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split("%", 1)[0])
+        # العناوين المحولة مثل ::ffff:127.0.0.1 تُفحص بصيغتها الأصلية
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved or ip.is_multicast
+                or ip.is_unspecified):
+            raise BlockedURLError(f"المضيف {parsed.hostname} يشير إلى عنوان غير عام {ip}")
+
+def extract_main_text(html: str, max_chars: int = config.PAGE_FETCH_MAX_TEXT_CHARS) -> Dict[str, str]:
+    """استخراج العنوان والنص الرئيسي من صفحة HTML"""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    
+    # الحاوية الرئيسية: article ثم main ثم الصفحة كاملة
+    container = soup.find("article") or soup.find("main") or soup.body or soup
+    blocks = [element.get_text(" ", strip=True) for element in container.find_all(TEXT_TAGS)]
+    blocks = [block for block in blocks if len(block) > 1]
+    text = "\n".join(blocks) if blocks else container.get_text("\n", strip=True)
+    text = re.sub(r"[ \t]+", " ", text)
+    
+    return {"title": title, "text": text[:max_chars]}
+
+class PageFetcher:
+    """تحميل عدة صفحات بالتوازي عبر جلسة HTTP مشتركة مع حد لكل مضيف وحد للحجم ومهلة لكل طلب"""
+    
+    def __init__(self, cache_folder: Optional[str] = config.PAGE_CACHE_FOLDER, cache_ttl: int = config.PAGE_CACHE_TTL,
+                 max_concurrent: int = config.PAGE_FETCH_MAX_CONCURRENT, per_host: int = config.PAGE_FETCH_PER_HOST,
+                 max_bytes: int = config.PAGE_FETCH_MAX_BYTES, timeout: float = config.PAGE_FETCH_TIMEOUT,
+                 max_cache_files: int = config.PAGE_CACHE_MAX_FILES,
+                 allow_private_hosts: bool = config.PAGE_FETCH_ALLOW_PRIVATE_HOSTS):
+        self.cache_folder = cache_folder
+        self.cache_ttl = cache_ttl
+        self.max_cache_files = max_cache_files
+        self.allow_private_hosts = allow_private_hosts
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        
+        # جلسة واحدة تعيد استخدام الاتصالات، بحجم مجمع يساوي عدد الطلبات المتزامنة
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrent, pool_maxsize=max_concurrent)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": config.PAGE_FETCH_USER_AGENT})
+        
+        # التحميل في مجمع خيوط، وتحليل HTML في مجمع منفصل حتى لا ينتظر التحليل خلف التحميل
+        self._download_executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="page-fetch")
+        self._parse_executor = ThreadPoolExecutor(max_workers=config.PAGE_PARSE_WORKERS, thread_name_prefix="page-parse")
+        # حد الطلبات لكل مضيف، ويُحذف عند انتهاء آخر طلب له حتى لا يكبر القاموس مع كل موقع جديد
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}
+        self.stats = {"fetched": 0, "cache_hits": 0, "errors": 0, "skipped": 0, "blocked": 0, "bytes": 0}
+        
+        # تقليم مجلد الصفحات بشكل دوري بدلاً من كل عملية كتابة، والكتابة من عدة خيوط تحليل
+        self._writes_since_prune = 0
+        self._prune_lock = threading.Lock()
+        
+        if self.cache_folder:
+            os.makedirs(self.cache_folder, exist_ok=True)
+    
+    def _cache_path(self, url: str) -> str:
+        """مسار ملف التخزين المؤقت لرابط"""
+        return os.path.join(self.cache_folder, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+    
+    def _read_cache(self, url: str) -> Optional[Dict[str, Any]]:
+        """قراءة صفحة محفوظة لم تنته صلاحيتها"""
+        if not self.cache_folder:
+            return None
+        path = self._cache_path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self.cache_ttl:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"خطأ في قراءة الصفحة المحفوظة {url}: {e}")
+            return None
+    
+    def _write_cache(self, url: str, page: Dict[str, Any]):
+        """حفظ الصفحة المستخرجة"""
+        if not self.cache_folder:
+            return
+        try:
+            # الكتابة في ملف مؤقت ثم إعادة التسمية حتى لا يقرأ طلب آخر ملفاً ناقصاً
+            path = self._cache_path(url)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(page, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logging.warning(f"خطأ في حفظ الصفحة {url}: {e}")
+            return
+        
+        with self._prune_lock:
+            self._writes_since_prune += 1
+            if self._writes_since_prune < 100:
+                return
+            self._writes_since_prune = 0
+        self.prune_cache()
+    
+    def prune_cache(self):
+        """حذف الصفحات المنتهية والأقدم الزائدة عن الحد من مجلد التخزين المؤقت"""
+        if not self.cache_folder:
+            return
+        try:
+            now = time.time()
+            entries = []
+            with os.scandir(self.cache_folder) as scanner:
+                for entry in scanner:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        # حُذف أو استُبدل أثناء القراءة
+                        pass
+            
+            entries.sort(reverse=True)
+            for index, (modified_at, path) in enumerate(entries):
+                if index >= self.max_cache_files or now - modified_at > self.cache_ttl:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+        except Exception as e:
+            logging.warning(f"خطأ في تقليم الصفحات المحفوظة: {e}")
+    
+    def _download(self, url: str) -> Optional[str]:
+        """تحميل صفحة HTML بحد أقصى للحجم، يُنفذ في مجمع الخيوط"""
+        # التحويلات تُتبع يدوياً حتى يُتحقق من عنوان كل تحويل قبل طلبه
+        for _ in range(config.PAGE_FETCH_MAX_REDIRECTS + 1):
+            check_public_url(url, self.allow_private_hosts)
+            response = self.session.get(url, timeout=self.timeout, stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                break
+            url = urljoin(url, response.headers["Location"])
+            response.close()
+        else:
+            raise requests.TooManyRedirects(f"تجاوز عدد التحويلات {config.PAGE_FETCH_MAX_REDIRECTS}")
+        
+        with response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if "html" not in content_type and "text/plain" not in content_type:
+                return None
+            
+            # قراءة الجسم على أجزاء والتوقف عند الحد بدلاً من تحميل الملفات الكبيرة كاملة
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=16384):
+                body.extend(chunk)
+                if len(body) >= self.max_bytes:
+                    del body[self.max_bytes:]
+                    break
+            
+            self.stats["bytes"] += len(body)
+            encoding = response.encoding if "charset" in content_type.lower() else None
+            return bytes(body).decode(encoding or response.apparent_encoding or "utf-8", errors="replace")
+    
+    def _parse(self, url: str, html: str) -> Dict[str, Any]:
+        """استخراج النص وحفظه، يُنفذ في مجمع التحليل"""
+        page = {"url": url, **extract_main_text(html), "fetched_at": time.time()}
+        self._write_cache(url, page)
+        return page
+    
+    async def fetch_page(self, url: str) -> Optional[Dict[str, Any]]:
+        """تحميل صفحة واستخراج نصها، ويرجع None عند الفشل"""
+        host = urlparse(url).netloc.lower()
+        if not host or not url.lower().startswith(("http://", "https://")):
+            self.stats["skipped"] += 1
+            return None
+        
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(self._parse_executor, self._read_cache, url)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        
+        semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with semaphore:
+                html = await asyncio.wait_for(
+                    loop.run_in_executor(self._download_executor, functools.partial(self._download, url)),
+                    # المهلة تشمل قراءة الجسم كاملاً وليس فقط الاتصال
+                    timeout=self.timeout * 2
+                )
+            if html is None:
+                self.stats["skipped"] += 1
+                return None
+            
+            page = await loop.run_in_executor(self._parse_executor, self._parse, url, html)
+            self.stats["fetched"] += 1
+            return page
+        
+        except BlockedURLError as e:
+            self.stats["blocked"] += 1
+            logging.warning(f"تم رفض تحميل الصفحة {url}: {e}")
+            return None
+        
+        except Exception as e:
+            self.stats["errors"] += 1
+            logging.warning(f"تعذر تحميل الصفحة {url}: {e}")
+            return None
+        
+        finally:
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_users[host]
+                del self._host_semaphores[host]
+    
+    async def fetch_pages(self, urls: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """تحميل عدة صفحات بالتوازي"""
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        pages = await asyncio.gather(*[self.fetch_page(url) for url in unique_urls])
+        return dict(zip(unique_urls, pages))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات التحميل"""
+        return {**self.stats, "hosts": len(self._host_semaphores)}
+    
+    def close(self):
+        """إغلاق الجلسة والمجمعات"""
+        self.session.close()
+        self._download_executor.shutdown(wait=False)
+        self._parse_executor.shutdown(wait=False)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+محدد معدل الطلبات بخوارزمية دلو الرموز
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Dict, Any, Optional
+
+class TokenBucket:
+    """دلو رموز يمتلئ بمعدل ثابت في الدقيقة"""
+    
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+    
+    def _refill(self):
+        """إضافة الرموز المتراكمة منذ آخر تحديث"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+    
+    def time_until(self, amount: float) -> float:
+        """الوقت بالثواني حتى يتوفر المقدار المطلوب (صفر إذا كان متوفراً الآن)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        if self.rate_per_second <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.rate_per_second
+    
+    def consume(self, amount: float):
+        """سحب مقدار من الدلو (قد يصبح الرصيد سالباً عند احتساب الاستهلاك الفعلي لاحقاً)"""
+        self._refill()
+        self.tokens -= amount
+    
+    def get_status(self) -> Dict[str, float]:
+        """الحصول على حالة الدلو"""
+        self._refill()
+        return {
+            "available": round(self.tokens, 2),
+            "capacity": self.capacity,
+            "rate_per_minute": self.rate_per_second * 60
+        }
+
+class RateLimiter:
+    """محدد معدل بحدين: عدد الطلبات وعدد الرموز في الدقيقة، مع طابور انتظار بترتيب الوصول"""
+    
+    def __init__(self, requests_per_minute: float, tokens_per_minute: Optional[float] = None):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        
+        # القفل في asyncio يخدم المنتظرين بترتيب وصولهم
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+        self.total_acquired = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+    
+    async def acquire(self, tokens: int = 0) -> float:
+        """انتظار الدور حتى يتوفر طلب واحد والرموز المطلوبة، ويرجع مدة الانتظار"""
+        started_at = time.monotonic()
+        self._waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    wait_time = self.request_bucket.time_until(1)
+                    if self.token_bucket and tokens:
+                        wait_time = max(wait_time, self.token_bucket.time_until(tokens))
+                    if wait_time <= 0:
+                        break
+                    await asyncio.sleep(wait_time)
+                
+                self.request_bucket.consume(1)
+                if self.token_bucket and tokens:
+                    self.token_bucket.consume(tokens)
+        finally:
+            self._waiting -= 1
+        
+        waited = time.monotonic() - started_at
+        self.total_acquired += 1
+        self.total_wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        return waited
+    
+    def consume_tokens(self, tokens: int):
+        """احتساب رموز إضافية بعد انتهاء الطلب (مثل رموز الرد)"""
+        if self.token_bucket and tokens:
+            self.token_bucket.consume(tokens)
+    
+    @property
+    def queue_depth(self) -> int:
+        """عدد الطلبات المنتظرة حالياً"""
+        return self._waiting
+    
+    def get_status(self) -> Dict[str, Any]:
+        """الحصول على حالة المحدد"""
+        return {
+            "queue_depth": self._waiting,
+            "requests": self.request_bucket.get_status(),
+            "tokens": self.token_bucket.get_status() if self.token_bucket else None,
+            "total_acquired": self.total_acquired,
+            "average_wait": self.total_wait_time / self.total_acquired if self.total_acquired else 0.0,
+            "max_wait": self.max_wait_time
+        }
+
+class SchedulerTimeoutError(Exception):
+    """انتظار الدور في جدولة البحث سيتجاوز المهلة"""
+    
+    def __init__(self, expected_wait: float):
+        super().__init__(f"البحث متأخر بسبب حد المعدل، الانتظار المتوقع {expected_wait:.0f} ثانية")
+        self.expected_wait = expected_wait
+
+class SearchScheduler:
+    """جدولة طلبات محرك البحث حتى لا يحظرنا: دلو رموز مع حد أدنى للفاصل بين الطلبات،
+    وأولوية للطلبات التفاعلية على طلبات الخلفية، وتراجع متزايد عند رفض الخادم بسبب المعدل"""
+    
+    PRIORITIES = {"interactive": 0, "background": 1}
+    
+    def __init__(self, requests_per_minute: float, min_interval: float, backoff_base: float, backoff_max: float):
+        self.bucket = TokenBucket(requests_per_minute, capacity=max(1.0, requests_per_minute / 10))
+        self.min_interval = min_interval
+        self.interval = min_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        
+        # المنتظرون مرتبون بالأولوية ثم بترتيب الوصول، والأول فقط يحق له الإرسال
+        self._waiters = []
+        self._counter = itertools.count()
+        self._condition = asyncio.Condition()
+        self._last_request_at = 0.0
+        self._backoff_until = 0.0
+        self._consecutive_limits = 0
+        
+        self.rate_limited = 0
+        self.wait_stats = {name: {"acquired": 0, "total_wait": 0.0, "max_wait": 0.0} for name in self.PRIORITIES}
+    
+    def _time_until_ready(self) -> float:
+        """الوقت حتى يُسمح بالطلب التالي: رصيد الدلو والفاصل الأدنى وفترة التراجع"""
+        now = time.monotonic()
+        return max(self.bucket.time_until(1), self._last_request_at + self.interval - now, self._backoff_until - now)
+    
+    def expected_wait(self, priority: str = "interactive") -> float:
+        """تقدير انتظار طلب جديد: الوقت حتى الطلب التالي وفاصل لكل منتظر يسبقه في الطابور"""
+        rank = self.PRIORITIES.get(priority, 0)
+        ahead = sum(1 for waiter_rank, _ in self._waiters if waiter_rank <= rank)
+        return max(0.0, self._time_until_ready()) + ahead * self.interval
+    
+    async def acquire(self, priority: str = "interactive", timeout: Optional[float] = None) -> float:
+        """انتظار الدور لإرسال طلب، ويرجع مدة الانتظار
+        
+        مع timeout ترفع SchedulerTimeoutError فوراً إذا كان الانتظار المتوقع أطول منها أو عند انتهائها.
+        """
+        if timeout is not None:
+            expected_wait = self.expected_wait(priority)
+            if expected_wait > timeout:
+                raise SchedulerTimeoutError(expected_wait)
+            try:
+                return await asyncio.wait_for(self.acquire(priority), timeout)
+            except asyncio.TimeoutError:
+                raise SchedulerTimeoutError(self.expected_wait(priority)) from None
+        
+        started_at = time.monotonic()
+        entry = (self.PRIORITIES.get(priority, 0), next(self._counter))
+        
+        async with self._condition:
+            heapq.heappush(self._waiters, entry)
+            # طلب تفاعلي جديد قد يتقدم على طلب خلفية ينتظر
+            self._condition.notify_all()
+            try:
+                while True:
+                    if self._waiters[0] == entry:
+                        wait_time = self._time_until_ready()
+                        if wait_time <= 0:
+                            break
+                        try:
+                            await asyncio.wait_for(self._condition.wait(), timeout=wait_time)
+                        except asyncio.TimeoutError:
+                            pass
+                    else:
+                        await self._condition.wait()
+            except BaseException:
+                # المنتظر الملغى يخرج من الطابور حتى لا يحجز الدور
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+                raise
+            
+            heapq.heappop(self._waiters)
+            self.bucket.consume(1)
+            self._last_request_at = time.monotonic()
+            self._condition.notify_all()
+        
+        waited = time.monotonic() - started_at
+        stats = self.wait_stats.get(priority, self.wait_stats["interactive"])
+        stats["acquired"] += 1
+        stats["total_wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+        return waited
+    
+    def try_acquire(self, failover: bool = False) -> bool:
+        """حجز طلب إضافي فوراً بدون انتظار، ويرجع False إذا كان هناك منتظرون أو نفد الرصيد أو أثناء التراجع
+        
+        للطلبات المكررة إلى نقطة وصول أخرى لذلك لا يُطبق عليها الفاصل الأدنى بين الطلبات.
+        failover للانتقال إلى نقطة أخرى بعد فشل الأساسية: يُحجز دائماً ويُخصم من الرصيد ولو صار سالباً
+        فتتأخر الطلبات التالية بقدره.
+        """
+        if failover:
+            self.bucket.consume(1)
+            return True
+        if self._waiters or self.bucket.time_until(1) > 0 or time.monotonic() < self._backoff_until:
+            return False
+        self.bucket.consume(1)
+        return True
+    
+    def record_success(self):
+        """نجاح الطلب يعيد الفاصل تدريجياً إلى حده الأدنى"""
+        self._consecutive_limits = 0
+        self.interval = max(self.min_interval, self.interval * 0.8)
+    
+    def record_rate_limited(self):
+        """رفض الطلب بسبب المعدل: إيقاف الإرسال لفترة تتضاعف مع كل رفض متتالٍ ومضاعفة الفاصل"""
+        self.rate_limited += 1
+        self._consecutive_limits += 1
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (self._consecutive_limits - 1))
+        # تفاوت عشوائي حتى لا تعود كل الطلبات المؤجلة في نفس اللحظة
+        backoff *= random.uniform(0.8, 1.2)
+        self._backoff_until = max(self._backoff_until, time.monotonic() + backoff)
+        self.interval = min(self.backoff_max, self.interval * 2)
+        logging.warning(f"تم رفض البحث بسبب المعدل، إيقاف الطلبات لمدة {backoff:.1f} ثانية")
+    
+    @property
+    def queue_depth(self) -> int:
+        """عدد الطلبات المنتظرة حالياً"""
+        return len(self._waiters)
+    
+    def get_status(self) -> Dict[str, Any]:
+        """الحصول على حالة الجدولة وأزمنة الانتظار لكل أولوية"""
+        return {
+            "queue_depth": len(self._waiters),
+            "interval": round(self.interval, 2),
+            "backoff_remaining": round(max(0.0, self._backoff_until - time.monotonic()), 1),
+            "rate_limited": self.rate_limited,
+            "requests": self.bucket.get_status(),
+            "wait": {
+                name: {
+                    "acquired": stats["acquired"],
+                    "average_wait": stats["total_wait"] / stats["acquired"] if stats["acquired"] else 0.0,
+                    "max_wait": stats["max_wait"]
+                }
+                for name, stats in self.wait_stats.items()
+            }
+        }
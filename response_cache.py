@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+ذاكرة التخزين المؤقت لردود نماذج الذكاء الاصطناعي
+"""
+
+import sqlite3
+import hashlib
+import json
+import logging
+import time
+import asyncio
+import dataclasses
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Any, Tuple
+import config
+
+class ResponseCache:
+    """ذاكرة مؤقتة بطبقتين: LRU في الذاكرة وطبقة SQLite اختيارية تبقى بعد إعادة التشغيل"""
+    
+    def __init__(self, max_entries: int = config.GEMINI_CACHE_MAX_ENTRIES, ttl: int = config.GEMINI_CACHE_TTL,
+                 db_path: Optional[str] = config.GEMINI_CACHE_DB_PATH,
+                 max_db_entries: int = config.GEMINI_CACHE_DB_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        
+        # المفتاح -> (الرد، وقت انتهاء الصلاحية)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._writes_since_prune = 0
+        
+        # عمليات SQLite في خيط واحد خارج حلقة الأحداث، فتُنفذ بترتيب طلبها
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+        
+        if self.db_path:
+            self._init_db()
+    
+    def _init_db(self):
+        """إنشاء جدول التخزين المؤقت"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        response TEXT,
+                        created_at REAL,
+                        expires_at REAL,
+                        last_access REAL
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache (last_access)')
+                conn.commit()
+        except Exception as e:
+            logging.error(f"خطأ في تهيئة جدول التخزين المؤقت، سيتم الاكتفاء بالذاكرة: {e}")
+            self.db_path = None
+    
+    @staticmethod
+    def make_key(prompt: str, generation_config: Any = None) -> str:
+        """توليد مفتاح من الرسالة الكاملة بعد توحيد المسافات مع إعدادات التوليد"""
+        normalized_prompt = " ".join(prompt.split())
+        
+        if generation_config is None:
+            config_data = {}
+        elif isinstance(generation_config, dict):
+            config_data = generation_config
+        elif dataclasses.is_dataclass(generation_config):
+            config_data = dataclasses.asdict(generation_config)
+        else:
+            config_data = getattr(generation_config, "__dict__", str(generation_config))
+        
+        payload = json.dumps({"prompt": normalized_prompt, "config": config_data},
+                             ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        """الطبقة الأولى: الذاكرة"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+            self.stats["expirations"] += 1
+        return None
+    
+    def _get_db(self, key: str, now: float) -> Tuple[Optional[str], float, bool]:
+        """الطبقة الثانية: SQLite، ويرجع (الرد، وقت انتهاء الصلاحية، هل كان منتهياً)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT response, expires_at FROM response_cache WHERE cache_key = ?', (key,))
+                row = cursor.fetchone()
+                if row:
+                    value, expires_at = row
+                    if expires_at > now:
+                        cursor.execute('UPDATE response_cache SET last_access = ? WHERE cache_key = ?', (now, key))
+                        conn.commit()
+                        return value, expires_at, False
+                    cursor.execute('DELETE FROM response_cache WHERE cache_key = ?', (key,))
+                    conn.commit()
+                    return None, 0.0, True
+        except Exception as e:
+            logging.warning(f"خطأ في قراءة التخزين المؤقت: {e}")
+        return None, 0.0, False
+    
+    def _record_db_result(self, key: str, value: Optional[str], expires_at: float, expired: bool) -> Optional[str]:
+        """نقل الرد الموجود في SQLite إلى الذاكرة وتحديث الإحصائيات"""
+        if value is not None:
+            self._set_memory(key, value, expires_at)
+            self.stats["disk_hits"] += 1
+            return value
+        if expired:
+            self.stats["expirations"] += 1
+        self.stats["misses"] += 1
+        return None
+    
+    def get(self, key: str) -> Optional[str]:
+        """البحث عن رد مخزن"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+        if not self.db_path:
+            self.stats["misses"] += 1
+            return None
+        return self._record_db_result(key, *self._get_db(key, now))
+    
+    async def get_async(self, key: str) -> Optional[str]:
+        """مثل get، لكن قراءة SQLite تُنفذ في خيط التخزين المؤقت حتى لا تعطل حلقة الأحداث"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+        if not self.db_path:
+            self.stats["misses"] += 1
+            return None
+        loop = asyncio.get_running_loop()
+        return self._record_db_result(key, *await loop.run_in_executor(self._db_executor, self._get_db, key, now))
+    
+    def set(self, key: str, value: str, ttl: int = None):
+        """تخزين رد جديد، والكتابة في SQLite تتم في الخلفية"""
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        self._set_memory(key, value, expires_at)
+        
+        if self.db_path:
+            self._db_executor.submit(self._set_db, key, value, now, expires_at)
+    
+    def _set_db(self, key: str, value: str, now: float, expires_at: float):
+        """كتابة الرد في SQLite، تُنفذ في خيط التخزين المؤقت"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO response_cache (cache_key, response, created_at, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (key, value, now, expires_at, now))
+                conn.commit()
+            
+            # تقليم الجدول بشكل دوري بدلاً من كل عملية كتابة
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 100:
+                self._writes_since_prune = 0
+                self._prune_db()
+        except Exception as e:
+            logging.warning(f"خطأ في الكتابة في التخزين المؤقت: {e}")
+    
+    def _set_memory(self, key: str, value: str, expires_at: float):
+        """إضافة عنصر للذاكرة مع إخراج الأقدم استخداماً عند امتلائها"""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def _prune_db(self):
+        """حذف العناصر المنتهية والزائدة عن الحد من جدول SQLite"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+                cursor.execute('''
+                    DELETE FROM response_cache WHERE cache_key IN (
+                        SELECT cache_key FROM response_cache
+                        ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_db_entries,))
+                conn.commit()
+        except Exception as e:
+            logging.warning(f"خطأ في تقليم التخزين المؤقت: {e}")
+    
+    def invalidate(self, key: str):
+        """حذف عنصر من الطبقتين، والحذف من SQLite يتم في الخلفية"""
+        self._memory.pop(key, None)
+        if self.db_path:
+            self._db_executor.submit(self._execute_db, 'DELETE FROM response_cache WHERE cache_key = ?', (key,))
+    
+    def clear(self):
+        """مسح التخزين المؤقت بالكامل"""
+        self._memory.clear()
+        if self.db_path:
+            self._db_executor.submit(self._execute_db, 'DELETE FROM response_cache')
+    
+    def _execute_db(self, statement: str, params: Tuple = ()):
+        """تنفيذ أمر حذف في SQLite، يُنفذ في خيط التخزين المؤقت"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(statement, params)
+                conn.commit()
+        except Exception as e:
+            logging.warning(f"خطأ في حذف عناصر من التخزين المؤقت: {e}")
+    
+    def flush(self):
+        """انتظار انتهاء عمليات SQLite المعلقة"""
+        self._db_executor.submit(lambda: None).result()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات التخزين المؤقت"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "persistent": bool(self.db_path)
+        }
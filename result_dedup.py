@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+إزالة النتائج المكررة: توحيد الروابط وكشف النصوص شبه المتطابقة بـ MinHash
+"""
+
+import zlib
+import numpy as np
+from typing import Dict, List, Optional, Any, Callable
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from search_ranker import Tokenizer
+import config
+
+# معاملات التتبع التي لا تغير محتوى الصفحة
+TRACKING_PARAMETERS = {
+    "fbclid", "gclid", "dclid", "yclid", "msclkid", "igshid", "mc_cid", "mc_eid", "ocid", "cmpid",
+    "ref", "ref_src", "ref_url", "referrer", "spm", "si", "_ga", "_gl", "smid"
+}
+
+# بادئات المضيف التي تشير لنفس الموقع
+HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+
+def canonicalize_url(url: str) -> str:
+    """توحيد الرابط: أحرف صغيرة للمضيف وحذف www والمنفذ الافتراضي والجزء بعد # ومعاملات التتبع
+    وترتيب بقية المعاملات وحذف الشرطة المائلة الأخيرة"""
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMETERS and not key.lower().startswith("utm_"))
+    path = parts.path.rstrip("/") or "/"
+    
+    # http و https لنفس الصفحة رابط واحد
+    return urlunsplit(("https" if scheme in ("http", "https") else scheme, host, path, urlencode(query), ""))
+
+class ResultDeduplicator:
+    """حذف النتائج المكررة مع الإبقاء على أول ظهور (الأعلى ترتيباً)
+    
+    النتيجتان مكررتان إذا تطابق رابطاهما بعد التوحيد، أو إذا تجاوز تشابه جاكار المقدر
+    لمقاطع كلمات العنوان والمقتطف الحد (نسخ الأخبار المعاد نشرها في مواقع مختلفة).
+    """
+    
+    # عدد أولي لدوال التجزئة (a * x + b) mod p
+    PRIME = (1 << 61) - 1
+    
+    def __init__(self, num_perm: int = config.SEARCH_DEDUP_NUM_PERM, shingle_size: int = config.SEARCH_DEDUP_SHINGLE_SIZE,
+                 threshold: float = config.SEARCH_DEDUP_THRESHOLD, tokenizer: Tokenizer = None):
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.tokenizer = tokenizer or Tokenizer()
+        
+        # بذرة ثابتة حتى تكون التواقيع متطابقة بين مرات التشغيل
+        rng = np.random.RandomState(config.SEARCH_DEDUP_SEED)
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+        self.stats = {"url_duplicates": 0, "near_duplicates": 0}
+    
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """توقيع MinHash لمقاطع الكلمات المتتالية في النص، ويرجع None للنص الفارغ"""
+        tokens = self.tokenizer(text)
+        if not tokens:
+            return None
+        size = min(self.shingle_size, len(tokens))
+        shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        
+        # crc32 أقل من 2^32 والمعاملات أقل من 2^31 فلا يتجاوز الناتج حدود uint64
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((np.outer(hashes, self._a) + self._b) % np.uint64(self.PRIME)).min(axis=0)
+    
+    def make_filter(self, near_duplicates: bool = True) -> Callable[[Dict[str, Any]], bool]:
+        """دالة تقبل النتيجة إذا لم تكن نسخة من نتيجة قبلتها سابقاً، للنتائج التي تصل تباعاً"""
+        seen_urls = set()
+        signatures: List[np.ndarray] = []
+        
+        def accept(result: Dict[str, Any]) -> bool:
+            url = canonicalize_url(result.get("link", ""))
+            if url and url in seen_urls:
+                self.stats["url_duplicates"] += 1
+                return False
+            
+            if near_duplicates:
+                signature = self.signature(f"{result.get('title', '')} {result.get('snippet', '')}")
+                if signature is not None:
+                    # نسبة الدوال المتطابقة في التوقيعين تقدير لتشابه جاكار
+                    if signatures and (np.vstack(signatures) == signature).mean(axis=1).max() >= self.threshold:
+                        self.stats["near_duplicates"] += 1
+                        return False
+                    signatures.append(signature)
+            
+            if url:
+                seen_urls.add(url)
+            return True
+        
+        return accept
+    
+    def deduplicate(self, results: List[Dict[str, Any]], near_duplicates: bool = True) -> List[Dict[str, Any]]:
+        """إرجاع النتائج بدون المكررات مع الحفاظ على ترتيبها"""
+        accept = self.make_filter(near_duplicates)
+        return [result for result in results if accept(result)]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """الحصول على إحصائيات الإزالة"""
+        return dict(self.stats)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+واجهات محركات البحث خلف WebSearcher: DuckDuckGo بنقاط وصوله المختلفة، وبديل محلي للاختبارات
+"""
+
+import bisect
+import math
+import random
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Any, Iterator
+from duckduckgo_search import DDGS
+import config
+
+class LatencyHistogram:
+    """مدرج تكراري لأزمنة الاستجابة بحدود لوغاريتمية: ذاكرة ثابتة مهما زاد عدد الطلبات"""
+    
+    def __init__(self, min_latency: float = 0.01, max_latency: float = 120.0, growth: float = 1.25):
+        self.bounds = []
+        bound = min_latency
+        while bound < max_latency:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(max_latency)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, latency: float):
+        """تسجيل زمن طلب"""
+        self.counts[bisect.bisect_left(self.bounds, latency)] += 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+    
+    def percentile(self, percent: float) -> Optional[float]:
+        """الحد الأعلى للفئة التي يقع فيها المئين المطلوب، وNone قبل أول طلب"""
+        if not self.count:
+            return None
+        target = math.ceil(self.count * percent / 100)
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """ملخص المدرج"""
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": round(self.percentile(50) or 0.0, 3),
+            "p95": round(self.percentile(95) or 0.0, 3),
+            "p99": round(self.percentile(99) or 0.0, 3),
+            "max": round(self.max, 3)
+        }
+
+class SearchBackend:
+    """الواجهة الأساسية: دوال متزامنة يستدعيها WebSearcher من مجمع الخيوط وترجع نتائج بصيغة DuckDuckGo"""
+    
+    name = "base"
+    search_types = ("web", "news", "images", "videos")
+    
+    def supports(self, search_type: str) -> bool:
+        """هل تدعم الواجهة نوع البحث"""
+        return search_type in self.search_types
+    
+    def open_results(self, query: str, max_results: int, search_type: str,
+                     timelimit: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """مولد النتائج، وقد يطلب الصفحات التالية أثناء القراءة"""
+        raise NotImplementedError
+    
+    def search(self, query: str, max_results: int, search_type: str,
+               timelimit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """النتائج كاملة"""
+        return list(self.open_results(query, max_results, search_type, timelimit))
+
+class DuckDuckGoBackend(SearchBackend):
+    """DuckDuckGo عبر نقطة وصول محددة: api تدعم كل الأنواع، وhtml وlite لنتائج الويب فقط"""
+    
+    def __init__(self, endpoint: str = "api"):
+        self.endpoint = endpoint
+        self.name = "ddg" if endpoint == "api" else f"ddg_{endpoint}"
+        if endpoint != "api":
+            self.search_types = ("web",)
+    
+    def open_results(self, query: str, max_results: int, search_type: str,
+                     timelimit: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        # جلسة curl_cffi داخل DDGS غير آمنة بين الخيوط وتُعدل ترويسة Referer مع كل طلب،
+        # لذلك لكل بحث نسخة خاصة تُغلق عند انتهاء قراءة المولد أو إغلاقه
+        with DDGS() as ddgs:
+            # الأخبار والفيديو تقبل آخر يوم أو أسبوع أو شهر فقط
+            if search_type == "news":
+                search_results = ddgs.news(query, timelimit=timelimit if timelimit != "y" else None,
+                                           max_results=max_results)
+            elif search_type == "images":
+                search_results = ddgs.images(query, max_results=max_results)
+            elif search_type == "videos":
+                search_results = ddgs.videos(query, timelimit=timelimit if timelimit != "y" else None,
+                                             max_results=max_results)
+            else:
+                search_results = ddgs.text(query, timelimit=timelimit, backend=self.endpoint, max_results=max_results)
+            
+            yield from search_results or []
+
+class FakeSearchBackend(SearchBackend):
+    """بديل محلي بدون شبكة بزمن استجابة ونسبة أخطاء قابلة للضبط، ونتائج ثابتة لكل استعلام"""
+    
+    name = "fake"
+    
+    def __init__(self, latency_mean: float = config.SEARCH_FAKE_LATENCY_MEAN,
+                 latency_stddev: float = config.SEARCH_FAKE_LATENCY_STDDEV,
+                 error_rate: float = config.SEARCH_FAKE_ERROR_RATE, seed: int = config.SEARCH_FAKE_SEED,
+                 name: str = "fake"):
+        self.name = name
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.error_rate = error_rate
+        
+        # المولد العشوائي مشترك بين الخيوط لذلك يُحمى بقفل حتى تتكرر النتائج مع نفس البذرة
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+    
+    def _sample(self):
+        """سحب زمن الاستجابة (توزيع لوغاريتمي طبيعي) وحالة الخطأ"""
+        with self._lock:
+            self.calls += 1
+            if self.latency_mean > 0 and self.latency_stddev > 0:
+                sigma2 = math.log(1 + (self.latency_stddev / self.latency_mean) ** 2)
+                latency = self._random.lognormvariate(math.log(self.latency_mean) - sigma2 / 2, math.sqrt(sigma2))
+            else:
+                latency = self.latency_mean
+            failed = self._random.random() < self.error_rate
+        return latency, failed
+    
+    def open_results(self, query: str, max_results: int, search_type: str,
+                     timelimit: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        latency, failed = self._sample()
+        time.sleep(latency)
+        if failed:
+            raise RuntimeError(f"fake backend {self.name}: simulated failure")
+        
+        # معرف ثابت للاستعلام حتى تتطابق النتائج بين الواجهات والتشغيلات
+        query_id = zlib.crc32(query.encode("utf-8"))
+        now = time.time()
+        for index in range(max_results or 10):
+            result = {
+                "title": f"{query} - نتيجة {index + 1}",
+                "body": f"مقتطف تجريبي رقم {index + 1} عن {query} ({query_id})",
+                "source": "fake.example"
+            }
+            if search_type == "web":
+                result["href"] = f"https://fake.example/{query_id}/{index}"
+            else:
+                result["url"] = f"https://fake.example/{search_type}/{query_id}/{index}"
+                result["date"] = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(now - index * 3600))
+            yield result
+
+def create_search_backend(name: str) -> SearchBackend:
+    """إنشاء واجهة بحث بالاسم (ddg أو ddg_html أو ddg_lite أو fake)"""
+    if name == "ddg":
+        return DuckDuckGoBackend("api")
+    if name in ("ddg_html", "ddg_lite"):
+        return DuckDuckGoBackend(name.split("_", 1)[1])
+    if name == "fake":
+        return FakeSearchBackend()
+    raise ValueError(f"واجهة بحث غير معروفة: {name}")
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+ذاكرة مؤقتة لنتائج البحث: طبقة في الذاكرة فوق جدول search_cache في قاعدة البيانات
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+import config
+
+class SearchCache:
+    """ذاكرة نتائج البحث بمدة صلاحية لكل نوع بحث
+    
+    النتيجة الأحدث من مدة الصلاحية طازجة، والأقدم منها تُعرض مع تحديثها في الخلفية
+    طالما لم تتجاوز فترة السماح، وبعدها لا تُستخدم إلا عندما يكون البحث متوقفاً.
+    """
+    
+    def __init__(self, database_manager=None, ttls: Dict[str, int] = None,
+                 stale_ratio: float = config.SEARCH_CACHE_STALE_RATIO,
+                 max_entries: int = config.SEARCH_CACHE_MAX_ENTRIES,
+                 retention_ratio: float = config.SEARCH_CACHE_DB_RETENTION_RATIO,
+                 max_db_entries: int = config.SEARCH_CACHE_DB_MAX_ENTRIES):
+        self.database_manager = database_manager
+        self.ttls = ttls or config.SEARCH_CACHE_TTLS
+        self.stale_ratio = stale_ratio
+        self.max_entries = max_entries
+        self.retention_ratio = retention_ratio
+        self.max_db_entries = max_db_entries
+        self._writes_since_prune = 0
+        
+        # المفتاح -> (النتائج، وقت التخزين)
+        self._memory: "OrderedDict[str, Tuple[List[Dict[str, Any]], float]]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "stale_hits": 0, "misses": 0}
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """توحيد الاستعلام: أحرف صغيرة ومسافات مفردة"""
+        return " ".join(query.lower().split())
+    
+    @classmethod
+    def make_key(cls, query: str, search_type: str, max_results: int, timelimit: Optional[str] = None) -> str:
+        """مفتاح البحث من الاستعلام الموحد ونوع البحث وعدد النتائج وحد الفترة"""
+        return f"{search_type}:{max_results}:{timelimit or ''}:{cls.normalize_query(query)}"
+    
+    def ttl_for(self, search_type: str) -> int:
+        """مدة صلاحية نوع البحث"""
+        return self.ttls.get(search_type, self.ttls.get("web", 3600))
+    
+    def get(self, query: str, search_type: str, max_results: int, timelimit: Optional[str] = None,
+            allow_expired: bool = False) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """البحث عن نتائج محفوظة، ويرجع (النتائج، طازجة) أو None
+        
+        allow_expired يقبل النتائج مهما كان عمرها، ويُستخدم عندما يتعذر البحث الفعلي.
+        """
+        key = self.make_key(query, search_type, max_results, timelimit)
+        ttl = self.ttl_for(search_type)
+        max_age = None if allow_expired else ttl * (1 + self.stale_ratio)
+        
+        # الطبقة الأولى: الذاكرة
+        entry = self._memory.get(key)
+        if entry is not None:
+            results, stored_at = entry
+            age = time.time() - stored_at
+            if max_age is None or age <= max_age:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._hit(results, age <= ttl)
+        
+        # الطبقة الثانية: جدول search_cache، ويصلح أي بحث محفوظ بعدد نتائج أكبر أو مساوٍ
+        if self.database_manager:
+            for search in self.database_manager.get_cached_searches(
+                    self.normalize_query(query), search_type, max_age=max_age):
+                metadata = search["metadata"]
+                if (metadata.get("max_results", 0) >= max_results and metadata.get("timelimit") == timelimit
+                        and search["results"]):
+                    results = search["results"][:max_results]
+                    self._set_memory(key, results, time.time() - search["age"])
+                    self.stats["db_hits"] += 1
+                    return self._hit(results, search["age"] <= ttl)
+        
+        self.stats["misses"] += 1
+        return None
+    
+    def _hit(self, results: List[Dict[str, Any]], fresh: bool) -> Tuple[List[Dict[str, Any]], bool]:
+        """تسجيل إصابة قديمة في الإحصائيات"""
+        if not fresh:
+            self.stats["stale_hits"] += 1
+        return results, fresh
+    
+    def set(self, query: str, search_type: str, max_results: int, results: List[Dict[str, Any]],
+            timelimit: Optional[str] = None):
+        """حفظ نتائج بحث ناجح في الذاكرة وفي جدول search_cache (وليس في سجل بحث المستخدمين)"""
+        if not results:
+            return
+        
+        key = self.make_key(query, search_type, max_results, timelimit)
+        self._set_memory(key, results, time.time())
+        
+        if self.database_manager:
+            self.database_manager.set_cached_search(
+                key, self.normalize_query(query), search_type, results,
+                metadata={"max_results": max_results, "timelimit": timelimit}
+            )
+            
+            # تقليم الجدول بشكل دوري بدلاً من كل عملية كتابة
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 100:
+                self._writes_since_prune = 0
+                self.prune()
+    
+    def prune(self) -> int:
+        """حذف نتائج البحث التي تجاوزت مدة الاحتفاظ أو الحد الأقصى من قاعدة البيانات"""
+        if not self.database_manager:
+            return 0
+        max_ages = {search_type: ttl * self.retention_ratio for search_type, ttl in self.ttls.items()}
+        max_ages.setdefault("web", self.ttl_for("web") * self.retention_ratio)
+        return self.database_manager.prune_search_cache(max_ages, self.max_db_entries)
+    
+    def _set_memory(self, key: str, results: List[Dict[str, Any]], stored_at: float):
+        """إضافة عنصر للذاكرة مع إخراج الأقدم استخداماً عند امتلائها"""
+        self._memory[key] = (results, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def clear(self):
+        """مسح طبقة الذاكرة"""
+        self._memory.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات الذاكرة"""
+        lookups = self.stats["memory_hits"] + self.stats["db_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._memory),
+            "hit_rate": round((lookups - self.stats["misses"]) / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+ترتيب نتائج البحث محلياً بخوارزمية BM25 مع تعزيز اختياري حسب موثوقية النطاق
+"""
+
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Any
+from urllib.parse import urlparse
+import config
+
+class Tokenizer:
+    """تقسيم النص العربي والإنجليزي إلى كلمات موحدة مع حذف الكلمات الشائعة وتجذيع خفيف"""
+    
+    DIACRITICS = re.compile(r'[\u064B-\u0652\u0640]')
+    NORMALIZATION = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ة": "ه", "ى": "ي", "ؤ": "و", "ئ": "ي"})
+    WORD_PATTERN = re.compile(r'\w+')
+    ARABIC_LETTERS = re.compile(r'[\u0621-\u064A]')
+    
+    # السوابق واللواحق مرتبة من الأطول حتى تُحذف أطول سابقة مطابقة
+    ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+    ARABIC_SUFFIXES = ("ات", "ون", "ين", "ان", "ها", "هم", "يه", "ه")
+    
+    STOPWORDS = {
+        "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "was", "be", "by",
+        "at", "as", "from", "that", "this", "it", "its", "how", "what", "which",
+        "في", "من", "علي", "الي", "عن", "مع", "هذا", "هذه", "ذلك", "التي", "الذي", "او", "ثم", "كان", "ما",
+        "هو", "هي", "كيف", "ماذا", "هل", "بين", "كل", "بعد", "قبل", "عند"
+    }
+    
+    def normalize(self, text: str) -> str:
+        """توحيد أشكال الأحرف العربية وحذف التشكيل وتحويل اللاتينية لأحرف صغيرة"""
+        return self.DIACRITICS.sub("", text.lower()).translate(self.NORMALIZATION)
+    
+    def stem(self, word: str) -> str:
+        """تجذيع خفيف: حذف أداة التعريف وحروف العطف واللواحق الشائعة في العربية وصيغ الجمع في الإنجليزية"""
+        if self.ARABIC_LETTERS.match(word):
+            for prefix in self.ARABIC_PREFIXES:
+                if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+                    word = word[len(prefix):]
+                    break
+            for suffix in self.ARABIC_SUFFIXES:
+                if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                    return word[:-len(suffix)]
+            return word
+        
+        if len(word) > 4 and word.endswith("ies"):
+            return word[:-3] + "y"
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            return word[:-1]
+        return word
+    
+    def __call__(self, text: str) -> List[str]:
+        """تحويل النص إلى قائمة كلمات"""
+        return [self.stem(word) for word in self.WORD_PATTERN.findall(self.normalize(text or ""))
+                if word not in self.STOPWORDS]
+
+class SearchRanker:
+    """ترتيب النتائج حسب صلتها بالاستعلام بـ BM25 محسوباً على مجموعة النتائج نفسها
+    
+    الحقول تُوزن (العنوان أهم من المقتطف) بجمع تكرار الكلمة في كل حقل مضروباً في وزنه،
+    ثم تُضرب الدرجة في معامل موثوقية نطاق الرابط إن وُجد.
+    """
+    
+    def __init__(self, k1: float = config.SEARCH_BM25_K1, b: float = config.SEARCH_BM25_B,
+                 field_weights: Dict[str, float] = None, tokenizer: Tokenizer = None):
+        self.k1 = k1
+        self.b = b
+        self.field_weights = field_weights or config.SEARCH_FIELD_WEIGHTS
+        self.tokenizer = tokenizer or Tokenizer()
+    
+    def _term_frequencies(self, result: Dict[str, Any]) -> Counter:
+        """تكرار الكلمات الموزون في حقول النتيجة"""
+        frequencies = Counter()
+        for field, weight in self.field_weights.items():
+            for token in self.tokenizer(result.get(field, "")):
+                frequencies[token] += weight
+        return frequencies
+    
+    @staticmethod
+    def domain_boost(link: str, boosts: Dict[str, float]) -> float:
+        """معامل النطاق: ".edu" يطابق أي نطاق فرعي منه مثل ksu.edu.sa، و"arxiv.org" يطابق النطاق ونطاقاته الفرعية"""
+        if not boosts or not link:
+            return 1.0
+        host = f".{urlparse(link).netloc.lower().split(':')[0]}."
+        return max((boost for domain, boost in boosts.items() if f".{domain.strip('.')}." in host), default=1.0)
+    
+    def score(self, query: str, results: List[Dict[str, Any]], boosts: Dict[str, float] = None) -> List[float]:
+        """درجة BM25 لكل نتيجة"""
+        query_terms = set(self.tokenizer(query))
+        if not results or not query_terms:
+            return [0.0] * len(results)
+        
+        documents = [self._term_frequencies(result) for result in results]
+        lengths = [sum(document.values()) for document in documents]
+        average_length = (sum(lengths) / len(lengths)) or 1.0
+        count = len(documents)
+        
+        # ندرة الكلمة في مجموعة النتائج
+        idf = {}
+        for term in query_terms:
+            frequency = sum(1 for document in documents if term in document)
+            idf[term] = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+        
+        scores = []
+        for result, document, length in zip(results, documents, lengths):
+            normalizer = self.k1 * (1 - self.b + self.b * length / average_length)
+            score = sum(idf[term] * document[term] * (self.k1 + 1) / (document[term] + normalizer)
+                        for term in query_terms if term in document)
+            scores.append(score * self.domain_boost(result.get("link", ""), boosts))
+        return scores
+    
+    def rank(self, query: str, results: List[Dict[str, Any]], top_n: Optional[int] = None,
+             boosts: Dict[str, float] = None, score_field: str = "relevance_score") -> List[Dict[str, Any]]:
+        """ترتيب النتائج تنازلياً مع حذف غير المرتبطة بالاستعلام، وإضافة الدرجة لكل نتيجة"""
+        scored = [(score, index) for index, score in enumerate(self.score(query, results, boosts)) if score > 0]
+        # الترتيب مستقر: عند التساوي يبقى ترتيب محرك البحث
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        
+        ranked = []
+        for score, index in scored[:top_n]:
+            results[index][score_field] = round(score, 3)
+            ranked.append(results[index])
+        return ranked
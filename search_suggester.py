@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+اقتراحات البحث من الاستعلامات السابقة: شجرة بادئات مضغوطة بأوزان التكرار والحداثة
+"""
+
+import math
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from search_cache import SearchCache
+import config
+
+class _Node:
+    """عقدة في الشجرة: الحافة الداخلة إليها تحمل سلسلة أحرف كاملة وليس حرفاً واحداً"""
+    
+    __slots__ = ("label", "children", "score", "top")
+    
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.children: Dict[str, "_Node"] = {}
+        # وزن الاستعلام المنتهي عند هذه العقدة (صفر إذا لم ينته عندها استعلام)
+        self.score = 0.0
+        # أفضل الاستعلامات في هذا الفرع محسوبة مسبقاً: [(الوزن، الاستعلام)] تنازلياً
+        self.top: List[Tuple[float, str]] = []
+
+class SearchSuggester:
+    """إكمال الاستعلامات من سجل بحث المستخدمين في جدول searches
+    
+    لكل مستخدم شجرة خاصة حتى لا تظهر استعلامات مستخدم لغيره. وزن الاستعلام مجموع exp(λ·(t - t0)) لكل مرة بحث فيها، فيزيد بالتكرار ويرجح البحث الأحدث
+    (بحث اليوم يساوي ضعف بحث قبل نصف عمر). الأوزان لا تنقص أبداً لذلك تكفي قائمة أفضل
+    الاستعلامات في كل عقدة وتحديثها على المسار عند كل إضافة، والإكمال مجرد نزول للبادئة.
+    """
+    
+    def __init__(self, database_manager=None, half_life: float = config.SEARCH_SUGGEST_HALF_LIFE,
+                 top_k: int = config.SEARCH_SUGGEST_TOP_K):
+        self.top_k = top_k
+        self.decay = math.log(2) / half_life
+        self.epoch = time.time()
+        self.roots: Dict[Optional[int], _Node] = {}
+        self.queries = 0
+        
+        if database_manager:
+            self.load(database_manager)
+            # الاستعلامات الجديدة تُضاف فور تسجيلها في الجدول
+            database_manager.add_search_listener(
+                lambda user_id, query, created_at: self.add(query, created_at, user_id))
+    
+    def load(self, database_manager):
+        """تحميل الاستعلامات السابقة من قاعدة البيانات"""
+        started_at = time.monotonic()
+        rows = database_manager.get_search_queries(limit=config.SEARCH_SUGGEST_MAX_LOAD)
+        for user_id, query, created_at in rows:
+            self.add(query, created_at, user_id)
+        logging.info(f"تم تحميل {len(rows)} استعلاماً لاقتراحات البحث في {time.monotonic() - started_at:.2f} ثانية")
+    
+    def _weight(self, timestamp: Optional[float]) -> float:
+        """وزن بحث واحد حسب وقته"""
+        return math.exp(self.decay * ((timestamp or time.time()) - self.epoch))
+    
+    def add(self, query: str, timestamp: Optional[float] = None, user_id: Optional[int] = None):
+        """تسجيل بحث للمستخدم وتحديث أفضل الاستعلامات على مسار بادئاته"""
+        query = SearchCache.normalize_query(query or "")
+        if not query:
+            return
+        
+        node = self.roots.setdefault(user_id, _Node())
+        path = [node]
+        rest = query
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = _Node(rest)
+                node.children[rest[0]] = child
+                rest = ""
+            else:
+                common = 0
+                limit = min(len(child.label), len(rest))
+                while common < limit and child.label[common] == rest[common]:
+                    common += 1
+                if common < len(child.label):
+                    # تقسيم الحافة: عقدة وسيطة بالجزء المشترك لها نفس فرع العقدة الأصلية
+                    middle = _Node(child.label[:common])
+                    middle.top = list(child.top)
+                    child.label = child.label[common:]
+                    middle.children[child.label[0]] = child
+                    node.children[rest[0]] = middle
+                    child = middle
+                rest = rest[common:]
+            node = child
+            path.append(node)
+        
+        if node.score == 0:
+            self.queries += 1
+        node.score += self._weight(timestamp)
+        
+        for path_node in path:
+            self._update_top(path_node, query, node.score)
+    
+    def _update_top(self, node: _Node, query: str, score: float):
+        """إدخال الاستعلام بوزنه الجديد في قائمة أفضل الاستعلامات للعقدة"""
+        top = [entry for entry in node.top if entry[1] != query]
+        if len(top) >= self.top_k and score <= top[-1][0]:
+            return
+        top.append((score, query))
+        top.sort(key=lambda entry: -entry[0])
+        node.top = top[:self.top_k]
+    
+    def suggest(self, prefix: str, limit: int = 5, user_id: Optional[int] = None) -> List[str]:
+        """أفضل استعلامات المستخدم التي تبدأ بالبادئة"""
+        rest = SearchCache.normalize_query(prefix or "")
+        # المسافة الأخيرة جزء من البادئة (المستخدم أنهى كلمة)
+        if prefix and prefix[-1].isspace() and rest:
+            rest += " "
+        
+        node = self.roots.get(user_id)
+        if node is None:
+            return []
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return []
+            if child.label.startswith(rest):
+                node = child
+                break
+            if not rest.startswith(child.label):
+                return []
+            rest = rest[len(child.label):]
+            node = child
+        
+        return [query for _, query in node.top[:limit]]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """الحصول على إحصائيات الاقتراحات"""
+        return {"queries": self.queries, "users": len(self.roots)}
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+ذاكرة مؤقتة دلالية تعيد الرد المخزن للأسئلة المتقاربة في المعنى وليس المتطابقة حرفياً فقط
+"""
+
+import re
+import time
+import zlib
+import numpy as np
+from typing import Dict, Optional, Any, Callable
+import config
+
+# أدوات النفي التي تقلب معنى السؤال مع بقاء كلماته متشابهة
+NEGATION_WORDS = {
+    "not", "no", "never", "none", "nor", "without", "cannot", "neither",
+    "لا", "لم", "لن", "ليس", "ليست", "ليسوا", "لست", "غير", "بدون", "دون"
+}
+
+# الأرقام والعمليات الحسابية والكلمات (مع n't الإنجليزية) التي تُقارن حرفياً
+GUARD_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|[+\-*/×÷^%=<>]|[^\W\d_]+(?:'t)?")
+GUARD_OPERATORS = set("+-*/×÷^%=<>")
+
+# الأرقام الهندية والفارسية تُوحد مع اللاتينية
+DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+class HashingEmbedder:
+    """تضمين محلي سريع بدون نموذج: مقاطع أحرف من الكلمات تُوزع على متجه بدالة تجزئة"""
+    
+    # التشكيل والتطويل في العربية
+    DIACRITICS = re.compile(r'[\u064B-\u0652\u0640]')
+    NORMALIZATION = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ة": "ه", "ى": "ي", "ؤ": "و", "ئ": "ي"})
+    WORD_PATTERN = re.compile(r'\w+')
+    
+    def __init__(self, dimensions: int = 512, ngram_size: int = 3):
+        self.dimensions = dimensions
+        self.ngram_size = ngram_size
+    
+    def normalize(self, text: str) -> str:
+        """توحيد أشكال الأحرف العربية وحذف التشكيل وتحويل اللاتينية لأحرف صغيرة"""
+        return self.DIACRITICS.sub("", text.lower()).translate(self.NORMALIZATION)
+    
+    def __call__(self, text: str) -> np.ndarray:
+        """تحويل النص إلى متجه بطول ثابت"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in self.WORD_PATTERN.findall(self.normalize(text)):
+            padded = f"<{word}>"
+            # الكلمة كاملة مع مقاطعها حتى تتقارب الصيغ المختلفة لنفس الكلمة
+            features = [padded] + [padded[i:i + self.ngram_size] for i in range(max(1, len(padded) - self.ngram_size + 1))]
+            for feature in features:
+                # crc32 ثابتة بين مرات التشغيل بعكس hash() في بايثون
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                vector[bucket % self.dimensions] += 1.0 if bucket & 0x80000000 else -1.0
+        return vector
+
+class SemanticCache:
+    """فهرس متجهات NumPy بسعة ثابتة: البحث بجداء نقطي على مصفوفة واحدة وإخراج الأقل استخداماً عند الامتلاء
+    
+    التشابه وحده لا يكفي: "سكان مصر 2020" و"سكان مصر 2023" متقاربان جداً في أي تضمين، لذلك لا يُقبل
+    المدخل إلا إذا تطابقت أرقام السؤالين ورموز العمليات وأدوات النفي فيهما تماماً (guard).
+    """
+    
+    def __init__(self, embed: Callable[[str], Any] = None, threshold: float = config.GEMINI_SEMANTIC_CACHE_THRESHOLD,
+                 capacity: int = config.GEMINI_SEMANTIC_CACHE_MAX_ENTRIES, ttl: int = config.GEMINI_CACHE_TTL):
+        self.embed_function = embed or HashingEmbedder()
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        
+        # المصفوفة تُنشأ عند أول إضافة لأن طول المتجه يعتمد على دالة التضمين
+        self._vectors: Optional[np.ndarray] = None
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        self._guards = np.zeros(capacity, dtype=np.int64)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._last_access = np.zeros(capacity, dtype=np.float64)
+        self._responses = [None] * capacity
+        self._count = 0
+        
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    def embed(self, text: str) -> np.ndarray:
+        """تضمين النص في متجه بطول واحد حتى يكون الجداء النقطي هو تشابه جيب التمام"""
+        vector = np.asarray(self.embed_function(text), dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    @staticmethod
+    def guard(text: str) -> int:
+        """بصمة الأرقام ورموز العمليات وأدوات النفي في النص بترتيبها، والسؤالان لا يتطابقان إلا بنفس البصمة"""
+        tokens = []
+        for token in GUARD_PATTERN.findall((text or "").lower().translate(DIGITS)):
+            if token.endswith("n't"):
+                tokens.append("not")
+            elif token[0].isdigit() or token in GUARD_OPERATORS or token in NEGATION_WORDS:
+                tokens.append(token)
+        return zlib.crc32(" ".join(tokens).encode("utf-8"))
+    
+    @staticmethod
+    def scope_id(scope: str) -> int:
+        """معرف رقمي للنطاق (مثل تعليمات النظام) حتى لا تختلط ردود سياقات مختلفة"""
+        return zlib.crc32((scope or "").encode("utf-8"))
+    
+    def _search(self, vector: np.ndarray, scope: str, guard: int = 0):
+        """إيجاد أقرب مدخل صالح في نفس النطاق وبنفس البصمة، ويرجع موقعه ودرجة التشابه"""
+        if self._count == 0 or self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            return None, 0.0
+        
+        similarities = self._vectors[:self._count] @ vector
+        valid = ((self._scopes[:self._count] == self.scope_id(scope)) & (self._guards[:self._count] == guard)
+                 & (self._expires_at[:self._count] > time.time()))
+        if not valid.any():
+            return None, 0.0
+        
+        similarities = np.where(valid, similarities, -1.0)
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+    
+    def get(self, vector: np.ndarray, scope: str = "", threshold: float = None, guard: int = 0) -> Optional[str]:
+        """البحث عن رد لسؤال قريب بدرجة تشابه لا تقل عن الحد (threshold لتجاوز الحد الافتراضي)
+        وبنفس بصمة guard()"""
+        index, similarity = self._search(vector, scope, guard)
+        if index is None or similarity < (self.threshold if threshold is None else threshold):
+            self.stats["misses"] += 1
+            return None
+        
+        self._last_access[index] = time.time()
+        self.stats["hits"] += 1
+        return self._responses[index]
+    
+    def set(self, vector: np.ndarray, response: str, scope: str = "", guard: int = 0):
+        """تخزين رد، والسؤال شبه المطابق لمدخل موجود يستبدله بدلاً من إضافة مدخل جديد"""
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            self._count = 0
+        
+        index, similarity = self._search(vector, scope, guard)
+        if index is None or similarity < 0.999:
+            if self._count < self.capacity:
+                index = self._count
+                self._count += 1
+            else:
+                # إعادة استخدام المدخل المنتهي أو الأقل استخداماً
+                index = int(np.argmin(np.where(self._expires_at > time.time(), self._last_access, -1.0)))
+                self.stats["evictions"] += 1
+        
+        now = time.time()
+        self._vectors[index] = vector
+        self._scopes[index] = self.scope_id(scope)
+        self._guards[index] = guard
+        self._expires_at[index] = now + self.ttl
+        self._last_access[index] = now
+        self._responses[index] = response
+    
+    def clear(self):
+        """مسح جميع المدخلات"""
+        self._count = 0
+        self._responses = [None] * self.capacity
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات الذاكرة الدلالية"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": self._count,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+إدارة جلسات المحادثة لكل مستخدم مع تلخيص الرسائل القديمة تدريجياً
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+import config
+
+class ConversationSession:
+    """جلسة محادثة مستخدم واحد"""
+    
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.summary = ""
+        self.turns: List[Dict[str, str]] = []
+        self.created_at = time.time()
+        self.last_activity = time.time()
+        self.compactions = 0
+        self.lock = asyncio.Lock()
+    
+    def touch(self):
+        """تحديث آخر نشاط"""
+        self.last_activity = time.time()
+
+class SessionManager:
+    """مخزن جلسات المحادثة مع إخراج الجلسات الخاملة وتلخيص السياق عند تجاوز حد الرموز"""
+    
+    ROLE_LABELS = {"user": "المستخدم", "assistant": "المساعد"}
+    
+    def __init__(self, gemini_client, timeout: int = config.SESSION_TIMEOUT,
+                 max_sessions: int = config.SESSION_MAX_ACTIVE,
+                 max_context_tokens: int = config.SESSION_MAX_CONTEXT_TOKENS,
+                 keep_recent_turns: int = config.SESSION_KEEP_RECENT_TURNS):
+        self.gemini_client = gemini_client
+        self.estimator = gemini_client.token_budget.estimator
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.max_context_tokens = max_context_tokens
+        self.keep_recent_turns = keep_recent_turns
+        
+        # ترتيب الجلسات من الأقدم نشاطاً إلى الأحدث
+        self.sessions: "OrderedDict[int, ConversationSession]" = OrderedDict()
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "compactions": 0}
+    
+    def get_session(self, user_id: int) -> ConversationSession:
+        """الحصول على جلسة المستخدم أو إنشاء جلسة جديدة"""
+        self._expire_idle()
+        
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = ConversationSession(user_id)
+            self.sessions[user_id] = session
+            self.stats["created"] += 1
+            
+            # إخراج الجلسات الأقل استخداماً عند تجاوز الحد
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.stats["evicted"] += 1
+        
+        session.touch()
+        self.sessions.move_to_end(user_id)
+        return session
+    
+    def _expire_idle(self):
+        """حذف الجلسات التي تجاوزت مدة الخمول (الأقدم أولاً، لذلك يتوقف عند أول جلسة نشطة)"""
+        deadline = time.time() - self.timeout
+        while self.sessions:
+            user_id, session = next(iter(self.sessions.items()))
+            if session.last_activity >= deadline:
+                break
+            self.sessions.popitem(last=False)
+            self.stats["expired"] += 1
+    
+    def build_context(self, user_id: int) -> Optional[str]:
+        """بناء سياق المحادثة: الملخص الجاري ثم آخر الرسائل"""
+        session = self.get_session(user_id)
+        if not session.summary and not session.turns:
+            return None
+        
+        parts = []
+        if session.summary:
+            parts.append(f"ملخص المحادثة السابقة:\n{session.summary}")
+        if session.turns:
+            parts.append("آخر الرسائل:\n" + self._format_turns(session.turns))
+        return "\n\n".join(parts)
+    
+    async def add_exchange(self, user_id: int, user_message: str, assistant_message: str):
+        """إضافة رسالة المستخدم والرد إلى الجلسة وتلخيص الرسائل القديمة عند الحاجة"""
+        session = self.get_session(user_id)
+        session.turns.append({"role": "user", "text": user_message})
+        session.turns.append({"role": "assistant", "text": assistant_message})
+        
+        if self._context_tokens(session) > self.max_context_tokens:
+            await self._compact(session)
+    
+    async def _compact(self, session: ConversationSession):
+        """دمج الرسائل الأقدم في الملخص الجاري مع إبقاء آخر الرسائل كما هي"""
+        async with session.lock:
+            keep = self.keep_recent_turns * 2
+            if len(session.turns) <= keep:
+                return
+            
+            old_turns = session.turns[:-keep] if keep else session.turns[:]
+            summary = await self.gemini_client.update_conversation_summary(
+                session.summary, self._format_turns(old_turns)
+            )
+            if summary is None:
+                # عند الفشل تبقى الرسائل كما هي وتُعاد المحاولة مع الرسالة التالية
+                logging.warning(f"تعذر تلخيص جلسة المستخدم {session.user_id}")
+                return
+            
+            session.summary = summary
+            session.turns = session.turns[len(old_turns):]
+            session.compactions += 1
+            self.stats["compactions"] += 1
+    
+    def _context_tokens(self, session: ConversationSession) -> int:
+        """تقدير عدد رموز سياق الجلسة"""
+        return self.estimator.estimate(session.summary) + sum(
+            self.estimator.estimate(turn["text"]) for turn in session.turns
+        )
+    
+    def _format_turns(self, turns: List[Dict[str, str]]) -> str:
+        """تنسيق الرسائل كنص"""
+        return "\n".join(f"{self.ROLE_LABELS.get(turn['role'], turn['role'])}: {turn['text']}" for turn in turns)
+    
+    def clear_session(self, user_id: int):
+        """حذف جلسة المستخدم"""
+        self.sessions.pop(user_id, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات الجلسات"""
+        return {**self.stats, "active_sessions": len(self.sessions)}
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+دمج الطلبات المتطابقة المتزامنة في طلب واحد (single-flight)
+"""
+
+import asyncio
+from typing import Dict, Any, Callable, Awaitable
+
+class SingleFlight:
+    """يشارك نتيجة طلب واحد بين كل المستدعين بنفس المفتاح طالما الطلب قيد التنفيذ"""
+    
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.stats = {"executed": 0, "shared": 0}
+    
+    async def do(self, key: str, operation: Callable[[], Awaitable[Any]]) -> Any:
+        """تنفيذ العملية أو انتظار نسخة قيد التنفيذ بنفس المفتاح"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["shared"] += 1
+        else:
+            # العملية تعمل في مهمة مستقلة حتى لا يؤدي إلغاء أول مستدعٍ إلى إلغائها لبقية المنتظرين
+            task = asyncio.ensure_future(operation())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.stats["executed"] += 1
+        
+        return await asyncio.shield(task)
+    
+    def is_running(self, key: str) -> bool:
+        """هل يوجد طلب قيد التنفيذ بهذا المفتاح"""
+        return key in self._in_flight
+    
+    @property
+    def in_flight(self) -> int:
+        """عدد الطلبات المختلفة قيد التنفيذ"""
+        return len(self._in_flight)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """الحصول على إحصائيات الدمج"""
+        return {**self.stats, "in_flight": len(self._in_flight)}
@@ -6,20 +6,24 @@
 import logging
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters, ContextTypes
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
 import os
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import json
+import time
 import uuid
 from datetime import datetime
 
 from config import *
 from database import DatabaseManager
-from gemini_client import GeminiClient
+from gemini_client import GeminiClient, ErrorResponse
 from agents_manager import AgentsManager
 from file_processor import FileProcessor
+from session_manager import SessionManager
+from usage_tracker import current_user_id
 
 # إعداد التسجيل
 logging.basicConfig(
@@ -36,11 +40,15 @@ class TelegramBot:
     
     def __init__(self):
         """تهيئة البوت"""
-        self.application = Application.builder().token(TELEGRAM_TOKEN).build()
+        # معالجة التحديثات بشكل متزامن حتى لا ينتظر المستخدمون بعضهم البعض
+        self.application = (Application.builder().token(TELEGRAM_TOKEN).concurrent_updates(True)
+                            .post_init(self._post_init).post_shutdown(self._post_shutdown).build())
+        self._usage_flush_task = None
         self.database_manager = DatabaseManager()
         self.gemini_client = GeminiClient()
         self.agents_manager = AgentsManager(self.database_manager, self.gemini_client)
         self.file_processor = FileProcessor()
+        self.session_manager = SessionManager(self.gemini_client)
         
         # إعداد المعالجات
         self._setup_handlers()
@@ -49,6 +57,9 @@ class TelegramBot:
     
     def _setup_handlers(self):
         """إعداد معالجات الأحداث"""
+        # تحديد المستخدم قبل بقية المعالجات حتى يُنسب له استهلاك Gemini
+        self.application.add_handler(TypeHandler(Update, self._set_current_user), group=-1)
+        
         # الأوامر الأساسية
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
@@ -68,6 +79,11 @@ class TelegramBot:
         # معالجة الأزرار
         self.application.add_handler(CallbackQueryHandler(self.handle_button_click))
     
+    async def _set_current_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """ضبط المستخدم الحالي لمحاسبة الاستهلاك"""
+        if update.effective_user:
+            current_user_id.set(update.effective_user.id)
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالجة أمر البداية"""
         try:
@@ -190,8 +206,13 @@ class TelegramBot:
             return
         
         try:
+            # /stats [عدد الساعات] [معرف المستخدم]
+            hours = int(context.args[0]) if context.args else 24
+            usage_user_id = int(context.args[1]) if len(context.args or []) > 1 else None
+            
             stats = self.database_manager.get_statistics()
             system_status = self.agents_manager.get_system_status()
+            usage_stats = await self._format_usage_stats(hours, usage_user_id)
             
             stats_message = f"""
 📊 <b>إحصائيات النظام</b>
@@ -207,15 +228,55 @@ class TelegramBot:
 • الوكلاء النشطة: {system_status.get('active_agents', 0)}
 • الوكلاء المشغولة: {system_status.get('busy_agents', 0)}
 
+🔌 <b>الخدمات:</b>
+{self._format_circuit_breakers(system_status)}
+
+{usage_stats}
+
 🏥 <b>صحة النظام:</b> {system_status.get('system_health', 'unknown')}
             """
             
             await update.message.reply_text(stats_message, parse_mode=ParseMode.HTML)
             
+        except ValueError:
+            await update.message.reply_text("الاستخدام: /stats [عدد الساعات] [معرف المستخدم]")
         except Exception as e:
             logging.error(f"خطأ في عرض الإحصائيات: {e}")
             await update.message.reply_text("عذراً، حدث خطأ في عرض الإحصائيات.")
     
+    def _format_circuit_breakers(self, system_status: Dict[str, Any]) -> str:
+        """تنسيق حالة قواطع الدائرة لرسالة الإحصائيات"""
+        state_labels = {"closed": "✅ تعمل", "half_open": "🟡 قيد الاختبار", "open": "🔴 متوقفة مؤقتاً"}
+        lines = []
+        for name, breaker in system_status.get('circuit_breakers', {}).items():
+            line = f"• {name}: {state_labels.get(breaker['state'], breaker['state'])}"
+            if breaker['state'] == "open":
+                line += f" (إعادة المحاولة بعد {breaker['retry_after']:.0f} ث)"
+            lines.append(line)
+        return "\n".join(lines) or "• غير متوفرة"
+    
+    async def _format_usage_stats(self, hours: int, user_id: Optional[int] = None) -> str:
+        """تنسيق استهلاك Gemini خلال آخر عدد من الساعات لرسالة الإحصائيات"""
+        usage = await self.gemini_client.usage_tracker.get_summary(since=time.time() - hours * 3600, user_id=user_id)
+        title = f"🧠 <b>استهلاك Gemini (آخر {hours} ساعة{f' - المستخدم {user_id}' if user_id else ''}):</b>"
+        if not usage['calls']:
+            return f"{title}\n• لا توجد طلبات"
+        
+        lines = [
+            title,
+            f"• الطلبات: {usage['calls']} (من التخزين المؤقت: {usage['cache_hits'] / usage['calls']:.0%}، أخطاء: {usage['errors']})",
+            f"• الرموز: {usage['prompt_tokens']:,} إدخال / {usage['response_tokens']:,} إخراج",
+            f"• متوسط الانتظار في الطابور: {usage['avg_queue_wait']:.2f} ث"
+        ]
+        for row in usage['by_method'][:3]:
+            lines.append(f"• {row['name']}: {row['calls']} طلب، {(row['prompt_tokens'] or 0) + (row['response_tokens'] or 0):,} رمز، "
+                         f"زمن النموذج {row['avg_model_time'] or 0:.2f} ث")
+        if not user_id:
+            top_users = "، ".join(f"{row['name'] or 'النظام'} ({(row['prompt_tokens'] or 0) + (row['response_tokens'] or 0):,})"
+                                  for row in usage['by_user'][:3])
+            lines.append(f"• أعلى المستخدمين استهلاكاً: {top_users}")
+        return "\n".join(lines)
+    
     async def users_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """عرض المستخدمين"""
         user_id = update.effective_user.id
@@ -385,18 +446,61 @@ class TelegramBot:
     async def _handle_general_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str, processing_msg):
         """معالجة الطلبات العامة"""
         try:
-            # استخدام Gemini للرد العام
-            response = await self.gemini_client.generate_response(
+            user_id = update.effective_user.id
+            
+            # استخدام Gemini للرد العام مع سياق المحادثة وعرض الرد تدريجياً
+            response_stream = self.gemini_client.generate_response_stream(
                 message_text,
+                context=self.session_manager.build_context(user_id),
+                priority="high" if user_id == ADMIN_USER_ID else None,
                 system_prompt="أنت مساعد ذكي مفيد. أجب باللغة العربية بطريقة ودية ومفيدة."
             )
+            response = await self._stream_to_message(processing_msg, response_stream, "💡 ردي:\n\n")
             
             await processing_msg.edit_text(f"💡 <b>ردي:</b>\n\n{response}", parse_mode=ParseMode.HTML)
             
+            # حفظ التبادل في الجلسة بعد عرض الرد حتى لا يتأخر المستخدم بسبب التلخيص،
+            # ورسائل الخطأ لا تُحفظ حتى لا تصبح جزءاً من سياق المحادثة وملخصها
+            if response.strip() and not isinstance(response, ErrorResponse):
+                await self.session_manager.add_exchange(user_id, message_text, response)
+            
         except Exception as e:
             logging.error(f"خطأ في معالجة الطلب العام: {e}")
             await processing_msg.edit_text("عذراً، حدث خطأ في معالجة طلبك.")
     
+    async def _stream_to_message(self, processing_msg, text_stream, prefix: str = "") -> str:
+        """
+        تعديل رسالة المعالجة تدريجياً أثناء وصول الرد مع تجميع التعديلات لاحترام حدود تيليجرام
+        
+        يُستخدم للطلبات العامة فقط؛ طلبات البحث والتلخيص والتحليل والإنشاء والمستندات تمر عبر
+        agents_manager الذي يعيد نتيجة منظمة (ملخص ونتائج وإحصائيات وملفات) لا تُعرض إلا بعد اكتمالها
+        """
+        loop = asyncio.get_running_loop()
+        text = ""
+        last_sent_length = 0
+        next_edit_at = 0.0
+        max_length = TELEGRAM_MESSAGE_LIMIT - len(prefix) - 2
+        
+        async for text in text_stream:
+            now = loop.time()
+            
+            # التعديلات التي تصل قبل انتهاء الفترة تُدمج في التعديل التالي
+            if now < next_edit_at or len(text) - last_sent_length < TELEGRAM_STREAM_MIN_CHARS:
+                continue
+            
+            try:
+                # النص الجزئي يُرسل بدون تنسيق لأن الوسوم قد تكون غير مكتملة
+                await processing_msg.edit_text(f"{prefix}{text[:max_length]} ▌")
+                last_sent_length = len(text)
+                next_edit_at = now + TELEGRAM_STREAM_EDIT_INTERVAL
+            except RetryAfter as e:
+                next_edit_at = now + e.retry_after
+            except BadRequest as e:
+                logging.debug(f"تم تجاهل تعديل الرسالة: {e}")
+                next_edit_at = now + TELEGRAM_STREAM_EDIT_INTERVAL
+        
+        return text
+    
     async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالجة الملفات المرسلة"""
         try:
@@ -682,6 +786,7 @@ class TelegramBot:
         try:
             stats = self.database_manager.get_statistics()
             system_status = self.agents_manager.get_system_status()
+            usage_stats = await self._format_usage_stats(24)
             
             stats_message = f"""
 📊 <b>إحصائيات النظام</b>
@@ -697,6 +802,11 @@ class TelegramBot:
 • الوكلاء النشطة: {system_status.get('active_agents', 0)}
 • الوكلاء المشغولة: {system_status.get('busy_agents', 0)}
 
+🔌 <b>الخدمات:</b>
+{self._format_circuit_breakers(system_status)}
+
+{usage_stats}
+
 🏥 <b>صحة النظام:</b> {system_status.get('system_health', 'unknown')}
             """
             
@@ -729,6 +839,15 @@ class TelegramBot:
         """عرض أمان الأدمن"""
         await query.edit_message_text("🔒 <b>أمان النظام</b>\n\nسيتم إضافة هذه الوظيفة قريباً.", parse_mode=ParseMode.HTML)
     
+    async def _post_init(self, application: Application):
+        """بدء كتابة سجلات الاستهلاك دورياً حتى لا تبقى معلقة في الذاكرة عندما يكون البوت خاملاً"""
+        self._usage_flush_task = asyncio.ensure_future(self.gemini_client.usage_tracker.run_periodic_flush())
+    
+    async def _post_shutdown(self, application: Application):
+        """إيقاف المهام الدورية عند إغلاق التطبيق"""
+        if self._usage_flush_task:
+            self._usage_flush_task.cancel()
+    
     def run(self):
         """تشغيل البوت"""
         try:
@@ -736,6 +855,9 @@ class TelegramBot:
             self.application.run_polling()
         except Exception as e:
             logging.error(f"خطأ في تشغيل البوت: {e}")
+        finally:
+            # كتابة سجلات الاستهلاك المتبقية قبل الإغلاق
+            self.gemini_client.usage_tracker.close()
 
 if __name__ == "__main__":
     # إنشاء وتشغيل البوت
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+اختبارات تحميل الصفحات على خادم HTTP محلي: حد الحجم والمهلة ونوع المحتوى والتخزين المؤقت على القرص
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_fetcher import PageFetcher
+
+MAX_BYTES = 4096
+TIMEOUT = 0.5
+
+class PageHandler(BaseHTTPRequestHandler):
+    """صفحات الاختبار، ويُحسب عدد الطلبات لكل مسار"""
+    
+    hits = {}
+    
+    def do_GET(self):
+        PageHandler.hits[self.path] = PageHandler.hits.get(self.path, 0) + 1
+        if self.path == "/slow":
+            time.sleep(TIMEOUT * 3)
+        
+        if self.path == "/file.pdf":
+            body, content_type = b"%PDF-1.4 binary", "application/pdf"
+        elif self.path == "/big":
+            body, content_type = b"<html><body><p>" + b"x" * (MAX_BYTES * 4) + b"</p></body></html>", "text/html"
+        else:
+            body = "<html><head><title>صفحة</title></head><body><article><p>نص المقال</p></article></body></html>"
+            body, content_type = body.encode("utf-8"), "text/html; charset=utf-8"
+        
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def log_message(self, format, *args):
+        pass
+
+class PageFetcherTest(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+    
+    def setUp(self):
+        PageHandler.hits.clear()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.fetcher = PageFetcher(cache_folder=self.cache_dir.name, max_bytes=MAX_BYTES, timeout=TIMEOUT,
+                                   allow_private_hosts=True)
+    
+    def tearDown(self):
+        self.fetcher.close()
+        self.cache_dir.cleanup()
+    
+    def fetch(self, path: str):
+        return asyncio.run(self.fetcher.fetch_page(self.base_url + path))
+    
+    def test_extracts_main_text(self):
+        page = self.fetch("/article")
+        self.assertEqual(page["title"], "صفحة")
+        self.assertEqual(page["text"], "نص المقال")
+    
+    def test_body_is_cut_at_max_bytes(self):
+        page = self.fetch("/big")
+        self.assertIsNotNone(page)
+        self.assertLessEqual(self.fetcher.stats["bytes"], MAX_BYTES)
+        self.assertLess(len(page["text"]), MAX_BYTES)
+    
+    def test_slow_page_times_out(self):
+        started_at = time.monotonic()
+        self.assertIsNone(self.fetch("/slow"))
+        self.assertEqual(self.fetcher.stats["errors"], 1)
+        self.assertLess(time.monotonic() - started_at, TIMEOUT * 2.5)
+    
+    def test_non_html_is_skipped(self):
+        self.assertIsNone(self.fetch("/file.pdf"))
+        self.assertEqual(self.fetcher.stats["skipped"], 1)
+        self.assertEqual(self.fetcher.stats["errors"], 0)
+    
+    def test_second_fetch_is_served_from_disk(self):
+        first = self.fetch("/cached")
+        # نسخة جديدة بنفس المجلد حتى لا تأتي النتيجة من غير القرص
+        fetcher = PageFetcher(cache_folder=self.cache_dir.name, allow_private_hosts=True)
+        try:
+            second = asyncio.run(fetcher.fetch_page(self.base_url + "/cached"))
+        finally:
+            fetcher.close()
+        self.assertEqual(second, first)
+        self.assertEqual(fetcher.stats["cache_hits"], 1)
+        self.assertEqual(PageHandler.hits["/cached"], 1)
+    
+    def test_expired_and_excess_cache_files_are_deleted(self):
+        self.fetch("/old")
+        path = self.fetcher._cache_path(self.base_url + "/old")
+        expired_at = time.time() - self.fetcher.cache_ttl - 1
+        os.utime(path, (expired_at, expired_at))
+        self.assertIsNone(self.fetcher._read_cache(self.base_url + "/old"))
+        self.assertFalse(os.path.exists(path))
+        
+        self.fetcher.max_cache_files = 2
+        for index in range(4):
+            self.fetcher._write_cache(f"{self.base_url}/{index}", {"text": str(index)})
+        self.fetcher.prune_cache()
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 2)
+    
+    def test_private_hosts_are_blocked_by_default(self):
+        fetcher = PageFetcher(cache_folder=None)
+        try:
+            self.assertIsNone(asyncio.run(fetcher.fetch_page(self.base_url + "/article")))
+        finally:
+            fetcher.close()
+        self.assertEqual(fetcher.stats["blocked"], 1)
+        self.assertNotIn("/article", PageHandler.hits)
+
+if __name__ == "__main__":
+    unittest.main()
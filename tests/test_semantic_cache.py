@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+اختبارات الذاكرة المؤقتة الدلالية: أسئلة متقاربة في التضمين لكن إجاباتها مختلفة
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache, HashingEmbedder
+
+# أزواج تتجاوز حد التشابه بالتضمين المحلي ومع ذلك لا يجوز أن يجيب أحدها عن الآخر
+COUNTER_EXAMPLES = [
+    ("population of Egypt in 2020", "population of Egypt in 2023"),
+    ("top 10 programming languages", "top 5 programming languages"),
+    ("Is it safe to take ibuprofen with alcohol?", "Is it not safe to take ibuprofen with alcohol?"),
+    ("what is 2+3", "what is 2+2"),
+    ("12×13", "12×14"),
+    ("هل يجوز السفر بدون تأشيرة", "هل يجوز السفر بتأشيرة"),
+]
+
+class SemanticCacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.cache = SemanticCache(HashingEmbedder(), threshold=0.8, ttl=3600)
+    
+    def store(self, question: str, answer: str):
+        self.cache.set(self.cache.embed(question), answer, guard=self.cache.guard(question))
+    
+    def lookup(self, question: str, threshold: float = None):
+        return self.cache.get(self.cache.embed(question), threshold=threshold, guard=self.cache.guard(question))
+    
+    def test_counter_examples_are_misses(self):
+        for cached_question, question in COUNTER_EXAMPLES:
+            with self.subTest(question=question):
+                self.store(cached_question, cached_question)
+                self.assertIsNone(self.lookup(question))
+                # حتى بحد تشابه منخفض لا تطابق الأسئلة المختلفة في الأرقام أو الكيانات
+                self.assertIsNone(self.lookup(question, threshold=0.5))
+    
+    def test_same_question_is_a_hit(self):
+        self.store("population of Egypt in 2020", "answer")
+        self.assertEqual(self.lookup("Population of Egypt in 2020?"), "answer")
+    
+    def test_guard_normalizes_digits_and_contractions(self):
+        self.assertEqual(SemanticCache.guard("سكان مصر ٢٠٢٠"), SemanticCache.guard("population 2020"))
+        self.assertEqual(SemanticCache.guard("isn't it safe"), SemanticCache.guard("is it not safe"))
+        self.assertNotEqual(SemanticCache.guard("is it safe"), SemanticCache.guard("is it not safe"))
+
+if __name__ == "__main__":
+    unittest.main()
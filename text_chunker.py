@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+تقسيم النصوص الكبيرة إلى أجزاء على حدود الصفحات والأوراق والفقرات
+"""
+
+import re
+from typing import List
+import config
+
+class TextChunker:
+    """مقسم النصوص الكبيرة لتحليلها على أجزاء"""
+    
+    # العناوين التي يضيفها FileProcessor قبل كل صفحة PDF أو ورقة Excel أو قسم الجداول
+    SECTION_MARKER = re.compile(r'^--- .+ ---$', re.MULTILINE)
+    
+    def __init__(self, max_chunk_chars: int = config.GEMINI_CHUNK_SIZE):
+        self.max_chunk_chars = max_chunk_chars
+    
+    def needs_chunking(self, text: str) -> bool:
+        """التحقق مما إذا كان النص أكبر من حجم الجزء الواحد"""
+        return len(text) > self.max_chunk_chars
+    
+    def split(self, text: str) -> List[str]:
+        """تقسيم النص إلى أجزاء لا يتجاوز كل منها الحد الأقصى"""
+        if not self.needs_chunking(text):
+            return [text]
+        
+        units = []
+        for section in self._split_sections(text):
+            units.extend(self._split_unit(section, ["\n\n", "\n", ". "]))
+        
+        # تجميع الوحدات الصغيرة في أجزاء بأكبر حجم ممكن
+        chunks = []
+        current = ""
+        for unit in units:
+            if current and len(current) + len(unit) + 2 > self.max_chunk_chars:
+                chunks.append(current)
+                current = unit
+            else:
+                current = f"{current}\n\n{unit}" if current else unit
+        if current:
+            chunks.append(current)
+        
+        return chunks
+    
+    def _split_sections(self, text: str) -> List[str]:
+        """تقسيم النص عند عناوين الأقسام مع إبقاء كل عنوان مع محتواه"""
+        boundaries = [match.start() for match in self.SECTION_MARKER.finditer(text)]
+        if not boundaries or boundaries[0] != 0:
+            boundaries.insert(0, 0)
+        boundaries.append(len(text))
+        
+        sections = []
+        for start, end in zip(boundaries, boundaries[1:]):
+            section = text[start:end].strip()
+            if section:
+                sections.append(section)
+        return sections
+    
+    def _split_unit(self, text: str, separators: List[str]) -> List[str]:
+        """تقسيم وحدة أكبر من الحد على فواصل تدريجية (فقرة، سطر، جملة) ثم حسب عدد الأحرف"""
+        if len(text) <= self.max_chunk_chars:
+            return [text]
+        
+        if not separators:
+            return [text[i:i + self.max_chunk_chars] for i in range(0, len(text), self.max_chunk_chars)]
+        
+        separator = separators[0]
+        parts = [part for part in text.split(separator) if part.strip()]
+        if len(parts) <= 1:
+            return self._split_unit(text, separators[1:])
+        
+        units = []
+        for part in parts:
+            units.extend(self._split_unit(part.strip(), separators[1:]))
+        return units
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+تقدير عدد الرموز وضبط حجم المدخلات المرسلة لنماذج الذكاء الاصطناعي
+"""
+
+import json
+import math
+from typing import Dict, List, Any, Tuple, Callable
+import config
+
+class TokenEstimator:
+    """مقدر محلي سريع لعدد الرموز بدون استدعاء الخادم"""
+    
+    def __init__(self, ascii_chars_per_token: float = 4.0, other_chars_per_token: float = 2.5):
+        self.ascii_chars_per_token = ascii_chars_per_token
+        self.other_chars_per_token = other_chars_per_token
+    
+    def estimate(self, text: str) -> int:
+        """تقدير عدد الرموز في النص"""
+        if not text:
+            return 0
+        
+        # الأحرف اللاتينية تأخذ بايتاً واحداً في UTF-8 والعربية بايتين،
+        # لذلك يمكن حساب عدد كل نوع من الطولين دون المرور على الأحرف في بايثون
+        char_count = len(text)
+        byte_count = len(text.encode("utf-8"))
+        other_chars = min(char_count, byte_count - char_count)
+        ascii_chars = char_count - other_chars
+        
+        return math.ceil(ascii_chars / self.ascii_chars_per_token + other_chars / self.other_chars_per_token)
+    
+    def chars_for_tokens(self, text: str, tokens: int) -> int:
+        """تقدير عدد الأحرف من النص التي تعادل عدداً معيناً من الرموز"""
+        total_tokens = self.estimate(text)
+        if total_tokens <= tokens:
+            return len(text)
+        return max(0, int(len(text) * tokens / total_tokens))
+
+class TokenBudget:
+    """سياسة ميزانية الرموز لكل دالة: تقليم أو أخذ عينات أو ضغط المدخلات لتناسب الحد"""
+    
+    TRIM_MARKER = "\n\n[... تم حذف جزء من المحتوى ...]\n\n"
+    
+    def __init__(self, estimator: TokenEstimator = None, budgets: Dict[str, int] = None,
+                 default_budget: int = config.GEMINI_MAX_INPUT_TOKENS):
+        self.estimator = estimator or TokenEstimator()
+        self.budgets = budgets if budgets is not None else config.GEMINI_INPUT_BUDGETS
+        self.default_budget = default_budget
+    
+    def limit_for(self, method: str) -> int:
+        """الحد الأقصى لرموز الإدخال لدالة معينة"""
+        return self.budgets.get(method, self.default_budget)
+    
+    def fit_text(self, text: str, max_tokens: int, head_ratio: float = 0.7) -> Tuple[str, int]:
+        """تقليم النص من المنتصف مع الإبقاء على البداية والنهاية، ويرجع النص وعدد الرموز المحذوفة"""
+        total_tokens = self.estimator.estimate(text)
+        if total_tokens <= max_tokens:
+            return text, 0
+        
+        keep_chars = self.estimator.chars_for_tokens(text, max_tokens)
+        head_chars = int(keep_chars * head_ratio)
+        tail_chars = keep_chars - head_chars
+        trimmed = text[:head_chars] + self.TRIM_MARKER + (text[-tail_chars:] if tail_chars else "")
+        
+        return trimmed, total_tokens - self.estimator.estimate(trimmed)
+    
+    def fit_items(self, items: List[Any], max_tokens: int, render: Callable[[Any, int], str],
+                  min_item_chars: int = 80) -> Tuple[List[str], int]:
+        """ملاءمة قائمة عناصر للميزانية: تقصير نص كل عنصر أولاً ثم حذف العناصر الأخيرة"""
+        rendered = [render(item, 0) for item in items]
+        total_tokens = sum(self.estimator.estimate(text) for text in rendered)
+        if total_tokens <= max_tokens or not items:
+            return rendered, 0
+        
+        # تقصير العناصر بالتساوي
+        per_item_chars = max(min_item_chars, self.estimator.chars_for_tokens(
+            "".join(rendered), max_tokens) // len(items))
+        rendered = [render(item, per_item_chars) for item in items]
+        
+        # حذف العناصر الأخيرة إذا بقي الحجم أكبر من الحد
+        kept = []
+        used_tokens = 0
+        for text in rendered:
+            tokens = self.estimator.estimate(text)
+            if kept and used_tokens + tokens > max_tokens:
+                break
+            kept.append(text)
+            used_tokens += tokens
+        
+        return kept, max(0, total_tokens - used_tokens)
+    
+    def sample_chunks(self, chunks: List[str], max_tokens: int) -> Tuple[List[str], int]:
+        """أخذ عينة موزعة بالتساوي من الأجزاء بحيث لا يتجاوز مجموعها الميزانية"""
+        sizes = [self.estimator.estimate(chunk) for chunk in chunks]
+        total_tokens = sum(sizes)
+        if total_tokens <= max_tokens or not chunks:
+            return chunks, 0
+        
+        average = total_tokens / len(chunks)
+        keep_count = max(1, min(len(chunks), int(max_tokens // max(average, 1))))
+        step = len(chunks) / keep_count
+        indexes = sorted({int(i * step) for i in range(keep_count)})
+        
+        sampled = [chunks[i] for i in indexes]
+        return sampled, total_tokens - sum(sizes[i] for i in indexes)
+    
+    def compact_data(self, data: Any, max_tokens: int, max_list_items: int = 50,
+                     max_string_chars: int = 2000) -> Tuple[str, int]:
+        """تحويل البيانات إلى JSON مضغوط مع أخذ عينات من القوائم الطويلة عند تجاوز الميزانية"""
+        full_text = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+        total_tokens = self.estimator.estimate(full_text)
+        if total_tokens <= max_tokens:
+            return full_text, 0
+        
+        # تقليص القوائم والنصوص تدريجياً حتى تناسب الميزانية
+        while max_list_items >= 2:
+            compacted = self._shrink(data, max_list_items, max_string_chars)
+            text = json.dumps(compacted, ensure_ascii=False, separators=(",", ":"), default=str)
+            tokens = self.estimator.estimate(text)
+            if tokens <= max_tokens:
+                return text, total_tokens - tokens
+            max_list_items //= 2
+            max_string_chars = max(100, max_string_chars // 2)
+        
+        text, _ = self.fit_text(text, max_tokens)
+        return text, total_tokens - self.estimator.estimate(text)
+    
+    def _shrink(self, value: Any, max_list_items: int, max_string_chars: int) -> Any:
+        """تقليص بنية البيانات: عينة من بداية ونهاية القوائم وتقصير النصوص الطويلة"""
+        if isinstance(value, dict):
+            return {key: self._shrink(item, max_list_items, max_string_chars) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            items = list(value)
+            if len(items) > max_list_items:
+                head = max_list_items // 2
+                tail = max_list_items - head
+                items = items[:head] + [f"... {len(items) - max_list_items} عنصر محذوف ..."] + items[-tail:]
+            return [self._shrink(item, max_list_items, max_string_chars) for item in items]
+        if isinstance(value, str) and len(value) > max_string_chars:
+            return value[:max_string_chars] + "..."
+        return value
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+محاسبة استهلاك Gemini لكل طلب: الدالة والمستخدم والرموز وزمن الانتظار وزمن النموذج
+"""
+
+import sqlite3
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Any
+import config
+
+# المستخدم الذي يُنفذ الطلب لصالحه، يُضبط عند استقبال التحديث وتنتقل قيمته لكل ما يستدعيه المعالج
+current_user_id: ContextVar[Optional[int]] = ContextVar("current_user_id", default=None)
+
+class UsageRecord:
+    """قياسات طلب واحد لـ GeminiClient"""
+    
+    def __init__(self, method: str, prompt_tokens: int = 0, user_id: Optional[int] = None):
+        self.method = method
+        self.user_id = user_id if user_id is not None else current_user_id.get()
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = 0
+        self.queue_wait = 0.0
+        self.model_time = 0.0
+        self.model_calls = 0
+        self.success = True
+        self.created_at = time.time()
+    
+    @property
+    def cache_hit(self) -> bool:
+        """الطلب خُدم بدون استدعاء النموذج (تخزين مؤقت أو طلب مطابق قيد التنفيذ)"""
+        return self.success and self.model_calls == 0
+
+class UsageTracker:
+    """تجميع الاستهلاك في الذاكرة وكتابته في SQLite على دفعات، وكل عمليات SQLite في خيط خاص بها"""
+    
+    FIELDS = ("calls", "cache_hits", "errors", "prompt_tokens", "response_tokens", "queue_wait", "model_time")
+    
+    def __init__(self, db_path: Optional[str] = config.DATABASE_PATH, batch_size: int = config.USAGE_FLUSH_BATCH_SIZE,
+                 flush_interval: float = config.USAGE_FLUSH_INTERVAL, max_users: int = config.USAGE_MAX_TRACKED_USERS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_users = max_users
+        
+        self._pending: List[UsageRecord] = []
+        # خيط واحد خارج حلقة الأحداث، فتُنفذ الكتابة والاستعلامات بترتيب طلبها
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="usage-tracker")
+        self._last_flush = time.monotonic()
+        self.totals_by_method: Dict[str, Dict[str, float]] = {}
+        # بترتيب آخر نشاط حتى يُحذف الأقدم عند تجاوز الحد
+        self.totals_by_user: "OrderedDict[Optional[int], Dict[str, float]]" = OrderedDict()
+        
+        if self.db_path:
+            self._init_db()
+    
+    def _init_db(self):
+        """إنشاء جدول الاستهلاك"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS gemini_usage (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        created_at REAL,
+                        user_id INTEGER,
+                        method TEXT,
+                        prompt_tokens INTEGER,
+                        response_tokens INTEGER,
+                        queue_wait REAL,
+                        model_time REAL,
+                        cache_hit INTEGER,
+                        success INTEGER
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_gemini_usage_time ON gemini_usage (created_at)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_gemini_usage_user ON gemini_usage (user_id, created_at)')
+                conn.commit()
+        except Exception as e:
+            logging.error(f"خطأ في تهيئة جدول الاستهلاك، سيتم الاكتفاء بالذاكرة: {e}")
+            self.db_path = None
+    
+    def record(self, usage: UsageRecord):
+        """إضافة قياسات طلب منتهٍ إلى المجاميع وإلى دفعة الكتابة"""
+        user_totals = self.totals_by_user.setdefault(usage.user_id, dict.fromkeys(self.FIELDS, 0))
+        self.totals_by_user.move_to_end(usage.user_id)
+        if len(self.totals_by_user) > self.max_users:
+            self.totals_by_user.popitem(last=False)
+        
+        for totals in (self.totals_by_method.setdefault(usage.method, dict.fromkeys(self.FIELDS, 0)), user_totals):
+            totals["calls"] += 1
+            totals["cache_hits"] += int(usage.cache_hit)
+            totals["errors"] += int(not usage.success)
+            totals["prompt_tokens"] += usage.prompt_tokens
+            totals["response_tokens"] += usage.response_tokens
+            totals["queue_wait"] += usage.queue_wait
+            totals["model_time"] += usage.model_time
+        
+        if self.db_path:
+            self._pending.append(usage)
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+    
+    def flush(self) -> Optional[Future]:
+        """إرسال الدفعة المعلقة للكتابة في قاعدة البيانات، ويرجع Future لمن يحتاج انتظارها"""
+        self._last_flush = time.monotonic()
+        if not self._pending or not self.db_path:
+            return None
+        
+        batch, self._pending = self._pending, []
+        return self._db_executor.submit(self._write_batch, batch)
+    
+    def _write_batch(self, batch: List[UsageRecord]):
+        """كتابة دفعة في SQLite، تُنفذ في خيط المحاسبة"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany('''
+                    INSERT INTO gemini_usage (created_at, user_id, method, prompt_tokens, response_tokens,
+                                              queue_wait, model_time, cache_hit, success)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(usage.created_at, usage.user_id, usage.method, usage.prompt_tokens, usage.response_tokens,
+                       usage.queue_wait, usage.model_time, int(usage.cache_hit), int(usage.success))
+                      for usage in batch])
+                conn.commit()
+        except Exception as e:
+            logging.error(f"خطأ في كتابة سجلات الاستهلاك: {e}")
+    
+    async def run_periodic_flush(self):
+        """كتابة الدفعة المعلقة كل flush_interval حتى إذا توقفت الطلبات، وتعمل حتى إلغاء المهمة"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+    
+    async def query(self, group_by: str = "method", user_id: Optional[int] = None, method: Optional[str] = None,
+                    since: Optional[float] = None, until: Optional[float] = None,
+                    limit: int = 20) -> List[Dict[str, Any]]:
+        """تجميع الاستهلاك حسب الدالة أو المستخدم مع تصفية اختيارية بالمستخدم والدالة والفترة الزمنية"""
+        if group_by not in ("method", "user_id"):
+            raise ValueError(f"لا يمكن التجميع حسب {group_by}")
+        if not self.db_path:
+            return []
+        
+        # السجلات المعلقة تُرسل أولاً للكتابة، والخيط الواحد ينفذها قبل الاستعلام
+        self.flush()
+        
+        conditions = []
+        params: List[Any] = []
+        for column, operator, value in (("user_id", "=", user_id), ("method", "=", method),
+                                        ("created_at", ">=", since), ("created_at", "<", until)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, self._query, group_by, where, params + [limit])
+    
+    def _query(self, group_by: str, where: str, params: List[Any]) -> List[Dict[str, Any]]:
+        """تنفيذ استعلام التجميع، يُنفذ في خيط المحاسبة"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {group_by} AS name,
+                           COUNT(*) AS calls,
+                           SUM(cache_hit) AS cache_hits,
+                           SUM(1 - success) AS errors,
+                           SUM(prompt_tokens) AS prompt_tokens,
+                           SUM(response_tokens) AS response_tokens,
+                           AVG(queue_wait) AS avg_queue_wait,
+                           AVG(CASE WHEN cache_hit = 0 THEN model_time END) AS avg_model_time
+                    FROM gemini_usage {where}
+                    GROUP BY {group_by}
+                    ORDER BY SUM(prompt_tokens) + SUM(response_tokens) DESC
+                    LIMIT ?
+                ''', params)
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logging.error(f"خطأ في استعلام الاستهلاك: {e}")
+            return []
+    
+    async def get_summary(self, since: Optional[float] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """ملخص الاستهلاك في فترة: المجاميع مع أكثر الدوال والمستخدمين استهلاكاً"""
+        by_method = await self.query("method", user_id=user_id, since=since)
+        calls = sum(row["calls"] for row in by_method)
+        return {
+            "calls": calls,
+            "cache_hits": sum(row["cache_hits"] or 0 for row in by_method),
+            "errors": sum(row["errors"] or 0 for row in by_method),
+            "prompt_tokens": sum(row["prompt_tokens"] or 0 for row in by_method),
+            "response_tokens": sum(row["response_tokens"] or 0 for row in by_method),
+            "avg_queue_wait": sum((row["avg_queue_wait"] or 0) * row["calls"] for row in by_method) / calls if calls else 0.0,
+            "by_method": by_method,
+            "by_user": await self.query("user_id", user_id=user_id, since=since, limit=5)
+        }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """المجاميع في الذاكرة منذ بدء التشغيل"""
+        return {
+            "by_method": {method: dict(totals) for method, totals in self.totals_by_method.items()},
+            "users": len(self.totals_by_user),
+            "pending_records": len(self._pending)
+        }
+    
+    def close(self):
+        """كتابة السجلات المعلقة وانتظار انتهاء عمليات SQLite قبل الإغلاق"""
+        self.flush()
+        self._db_executor.shutdown(wait=True)
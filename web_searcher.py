@@ -5,69 +5,454 @@
 
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any
-from duckduckgo_search import DDGS
+import copy
+import functools
+import itertools
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, AsyncIterator, Iterator
+from single_flight import SingleFlight
+from search_cache import SearchCache
+from search_suggester import SearchSuggester
+from page_fetcher import PageFetcher
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from rate_limiter import SearchScheduler, SchedulerTimeoutError
+from usage_tracker import current_user_id
+from search_ranker import SearchRanker
+from result_dedup import ResultDeduplicator
+from search_backends import LatencyHistogram, create_search_backend
 import config
 
+# أولوية طلبات البحث في المهمة الحالية: "interactive" لطلبات المستخدمين و"background" لتحديث النتائج المحفوظة
+search_priority: ContextVar[str] = ContextVar("search_priority", default="interactive")
+
+def is_rate_limited(error: Exception) -> bool:
+    """هل الخطأ رفض من DuckDuckGo بسبب كثرة الطلبات؛ المكتبة ترفع استثناءً عاماً رسالته تنتهي بـ Ratelimit"""
+    return "ratelimit" in f"{type(error).__name__} {error}".lower()
+
+# حدود الفترة في DuckDuckGo وعدد الأيام التي يغطيها كل منها
+TIMELIMIT_DAYS = [("d", 1), ("w", 7), ("m", 31)]
+
+# التواريخ النسبية مثل "3 hours ago"
+RELATIVE_DATE = re.compile(r'(\d+)\s*(minute|min|hour|day|week)s?\s+ago', re.IGNORECASE)
+RELATIVE_UNITS = {"minute": 60, "min": 60, "hour": 3600, "day": 86400, "week": 604800}
+
+def close_quietly(generator: Iterator):
+    """إغلاق مولد النتائج، ويُترك لجامع المهملات إذا كان لا يزال يُقرأ في خيط آخر بعد انتهاء المهلة"""
+    try:
+        generator.close()
+    except ValueError:
+        pass
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """تحليل تاريخ النتيجة (ISO أو RFC 2822 أو ثوانٍ أو تاريخ نسبي بالإنجليزية) إلى ثوانٍ منذ 1970"""
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    
+    text = str(value).strip()
+    if text.isdigit():
+        return float(text)
+    
+    match = RELATIVE_DATE.search(text)
+    if match:
+        return time.time() - int(match.group(1)) * RELATIVE_UNITS[match.group(2).lower()]
+    
+    for parse in (lambda t: datetime.fromisoformat(t.replace("Z", "+00:00")), parsedate_to_datetime):
+        try:
+            parsed = parse(text)
+        except (ValueError, TypeError):
+            continue
+        # التاريخ بدون منطقة زمنية يُعتبر بتوقيت UTC
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    
+    return None
+
+# مصطلحات تُضاف لاستعلام الترتيب في البحث الأكاديمي
+ACADEMIC_TERMS = "research study analysis paper journal academic university scientific methodology findings abstract"
+
 class WebSearcher:
     """باحث الويب الرئيسي"""
     
-    def __init__(self):
+    def __init__(self, database_manager=None):
         """تهيئة باحث الويب"""
         self.max_results = config.DUCKDUCKGO_MAX_RESULTS
         self.timeout = config.SEARCH_TIMEOUT
-        self.ddgs = DDGS()
+        
+        # الواجهة الأولى أساسية والبقية احتياطية يُكرر لها الطلب المتأخر، مع مدرج أزمنة استجابة لكل واجهة
+        self.backends = [create_search_backend(name) for name in config.SEARCH_BACKENDS]
+        self.backend = self.backends[0]
+        self.latencies = {backend.name: LatencyHistogram() for backend in self.backends}
+        self.backend_stats = {backend.name: {"calls": 0, "errors": 0, "wins": 0} for backend in self.backends}
+        self.hedge_stats = {"hedged": 0, "hedge_wins": 0, "skipped": 0, "failovers": 0}
+        
+        # مكتبة DuckDuckGo متزامنة لذلك تُنفذ طلباتها في مجمع خيوط بحد أقصى للطلبات المتزامنة
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.SEARCH_MAX_CONCURRENT,
+            thread_name_prefix="ddg"
+        )
+        self._semaphore = asyncio.Semaphore(config.SEARCH_MAX_CONCURRENT)
+        
+        # جدولة الطلبات لتفادي حظر المعدل، مع تقديم طلبات المستخدمين على طلبات الخلفية
+        self.scheduler = SearchScheduler(config.SEARCH_REQUESTS_PER_MINUTE, config.SEARCH_MIN_INTERVAL,
+                                         config.SEARCH_BACKOFF_BASE, config.SEARCH_BACKOFF_MAX)
+        
+        # دمج عمليات البحث المتطابقة المتزامنة
+        self.single_flight = SingleFlight()
+        
+        # التخزين المؤقت للنتائج، ويُعرض منه آخر نتائج محفوظة عندما يكون قاطع الدائرة مفتوحاً
+        self.search_cache = SearchCache(database_manager) if config.SEARCH_CACHE_ENABLED else None
+        self._background_tasks = set()
+        
+        # اقتراحات البحث من سجل بحث المستخدمين في جدول searches، ويُسجل فيه طلب المستخدم فقط
+        # وليس الاستعلامات الداخلية (الأكاديمي والمحلي والرائج) أو التحديث في الخلفية
+        self.database_manager = database_manager
+        self.suggester = SearchSuggester(database_manager)
+        self.breaker = CircuitBreaker("web_search", config.SEARCH_BREAKER_SLOW_CALL)
+        
+        # ترتيب النتائج محلياً بدون طلبات إضافية لـ Gemini
+        self.ranker = SearchRanker()
+        
+        # حذف الروابط المكررة والنسخ المعاد نشرها من النتائج
+        self.deduplicator = ResultDeduplicator(tokenizer=self.ranker.tokenizer)
+        
+        # تحميل صفحات أفضل النتائج لتحليل محتواها بدلاً من المقتطفات القصيرة فقط
+        self.page_fetcher = PageFetcher() if config.PAGE_FETCH_ENABLED else None
     
-    async def search_web(self, query: str, max_results: int = None, search_type: str = "web") -> List[Dict[str, Any]]:
-        """البحث في الويب"""
+    async def search_web(self, query: str, max_results: int = None, search_type: str = "web",
+                         timelimit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """البحث في الويب، وtimelimit يحصر النتائج في آخر يوم أو أسبوع أو شهر أو سنة ("d", "w", "m", "y")"""
         try:
             if max_results is None:
                 max_results = self.max_results
             
-            results = []
-            
-            # تحديد نوع البحث
-            if search_type == "web":
-                search_results = self.ddgs.text(query, max_results=max_results)
-            elif search_type == "news":
-                search_results = self.ddgs.news(query, max_results=max_results)
-            elif search_type == "images":
-                search_results = self.ddgs.images(query, max_results=max_results)
-            elif search_type == "videos":
-                search_results = self.ddgs.videos(query, max_results=max_results)
+            # البحث في التخزين المؤقت، والنتيجة القديمة تُعرض فوراً مع تحديثها في الخلفية
+            cached = self.search_cache.get(query, search_type, max_results, timelimit) if self.search_cache else None
+            if cached is not None:
+                results, fresh = cached
+                if not fresh:
+                    # مرجع المهمة يُحفظ حتى لا يحذفها جامع المهملات أثناء تنفيذها
+                    task = asyncio.ensure_future(self._revalidate(query, max_results, search_type, timelimit))
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
             else:
-                search_results = self.ddgs.text(query, max_results=max_results)
-            
-            # معالجة النتائج
-            for result in search_results:
-                processed_result = {
-                    "title": result.get("title", ""),
-                    "link": result.get("link", ""),
-                    "snippet": result.get("body", ""),
-                    "source": result.get("source", ""),
-                    "search_type": search_type
-                }
-                
-                # إضافة معلومات إضافية حسب نوع البحث
-                if search_type == "news":
-                    processed_result["date"] = result.get("date", "")
-                    processed_result["category"] = result.get("category", "")
-                elif search_type == "images":
-                    processed_result["image_url"] = result.get("image", "")
-                    processed_result["width"] = result.get("width", "")
-                    processed_result["height"] = result.get("height", "")
-                elif search_type == "videos":
-                    processed_result["duration"] = result.get("duration", "")
-                    processed_result["thumbnail"] = result.get("thumbnail", "")
-                
-                results.append(processed_result)
+                results = await self._search_once(query, max_results, search_type, timelimit)
             
-            logging.info(f"تم العثور على {len(results)} نتيجة للبحث: {query}")
-            return results
+            # نسخة مستقلة لكل مستدعٍ لأن بعض الدوال تعدل النتائج
+            return copy.deepcopy(results)
+            
+        except (CircuitOpenError, SchedulerTimeoutError) as e:
+            logging.warning(f"تم رفض البحث فوراً: {e}")
+            return self._cached_fallback(query, search_type, max_results, timelimit)
             
         except Exception as e:
             logging.error(f"خطأ في البحث في الويب: {e}")
-            return []
+            # آخر نتائج محفوظة مهما كان عمرها أفضل من قائمة فارغة عند الحظر أو انقطاع الخدمة
+            return self._cached_fallback(query, search_type, max_results, timelimit)
+    
+    def _cached_fallback(self, query: str, search_type: str, max_results: int,
+                         timelimit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """آخر نتائج محفوظة للبحث عندما يتعذر تنفيذه"""
+        cached = self.search_cache.get(query, search_type, max_results, timelimit, allow_expired=True) \
+            if self.search_cache else None
+        return copy.deepcopy(cached[0]) if cached else []
+    
+    async def _search_once(self, query: str, max_results: int, search_type: str,
+                           timelimit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """تنفيذ البحث مع دمج عمليات البحث المتطابقة التي تصل أثناء تنفيذ بحث سابق"""
+        key = SearchCache.make_key(query, search_type, max_results, timelimit)
+        # الطلب يرث أولوية من بدأ البحث المشترك، لذلك ينضم طلب الخلفية لبحث المستخدم
+        # ولا ينضم طلب المستخدم لبحث الخلفية الذي قد ينتظر خلف بقية الطابور
+        priority = search_priority.get()
+        if priority != "interactive" and not self.single_flight.is_running(key):
+            key = f"{key}|{priority}"
+        return await self.single_flight.do(
+            key, lambda: self._guarded_search(query, max_results, search_type, timelimit)
+        )
+    
+    async def _wait_turn(self):
+        """انتظار الدور في الجدولة: القاطع يُفحص أولاً حتى لا ينتظر البحث ثم يُرفض،
+        وطلب المستخدم لا ينتظر أكثر من SEARCH_MAX_QUEUE_WAIT (ترفع SchedulerTimeoutError)"""
+        self.breaker.check()
+        priority = search_priority.get()
+        await self.scheduler.acquire(priority, config.SEARCH_MAX_QUEUE_WAIT if priority == "interactive" else None)
+    
+    async def _revalidate(self, query: str, max_results: int, search_type: str, timelimit: Optional[str] = None):
+        """تحديث نتيجة قديمة في الخلفية"""
+        search_priority.set("background")
+        try:
+            await self._search_once(query, max_results, search_type, timelimit)
+        except Exception as e:
+            logging.warning(f"تعذر تحديث نتائج البحث المحفوظة لـ {query}: {e}")
+    
+    async def _guarded_search(self, query: str, max_results: int, search_type: str,
+                              timelimit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """تنفيذ البحث ضمن قاطع الدائرة وحفظ النتيجة الناجحة، مع إعادة المحاولة بعد فترة التراجع عند حظر المعدل"""
+        for attempt in range(config.SEARCH_RATELIMIT_RETRIES + 1):
+            # الانتظار في الجدولة قبل القاطع حتى لا يُحسب وقت الانتظار بطئاً في الخدمة
+            await self._wait_turn()
+            try:
+                async with self.breaker.guard():
+                    results = await self._search_web(query, max_results, search_type, timelimit)
+                break
+            except Exception as e:
+                # الجدولة سُجلت عند كل واجهة في _run_backend
+                if not is_rate_limited(e):
+                    raise
+                if attempt >= config.SEARCH_RATELIMIT_RETRIES:
+                    raise
+        
+        if self.search_cache:
+            self.search_cache.set(query, search_type, max_results, results, timelimit)
+        return results
+    
+    @staticmethod
+    def _process_result(result: Dict[str, Any], search_type: str) -> Dict[str, Any]:
+        """تحويل نتيجة DuckDuckGo إلى الشكل الموحد"""
+        processed_result = {
+            "title": result.get("title", ""),
+            # نتائج الويب تضع الرابط في href والأخبار والفيديو في url
+            "link": result.get("href") or result.get("url") or result.get("link", ""),
+            "snippet": result.get("body", ""),
+            "source": result.get("source", ""),
+            "search_type": search_type
+        }
+        
+        # إضافة معلومات إضافية حسب نوع البحث
+        if search_type == "news":
+            processed_result["date"] = result.get("date", "")
+            processed_result["category"] = result.get("category", "")
+            # وقت النشر موحداً بالثواني منذ 1970 أو None إذا تعذر تحليله
+            processed_result["timestamp"] = parse_timestamp(processed_result["date"])
+        elif search_type == "images":
+            processed_result["image_url"] = result.get("image", "")
+            processed_result["width"] = result.get("width", "")
+            processed_result["height"] = result.get("height", "")
+        elif search_type == "videos":
+            processed_result["duration"] = result.get("duration", "")
+            processed_result["thumbnail"] = result.get("thumbnail", "")
+        
+        return processed_result
+    
+    def hedge_delay(self, backend_name: str) -> float:
+        """مدة انتظار الواجهة قبل تكرار الطلب لواجهة أخرى: المئين المحدد من أزمنة استجابتها بين حدين"""
+        histogram = self.latencies[backend_name]
+        if histogram.count < config.SEARCH_HEDGE_MIN_SAMPLES:
+            return config.SEARCH_HEDGE_INITIAL_DELAY
+        delay = histogram.percentile(config.SEARCH_HEDGE_PERCENTILE)
+        return min(config.SEARCH_HEDGE_MAX_DELAY, max(config.SEARCH_HEDGE_MIN_DELAY, delay))
+    
+    async def _run_backend(self, backend, query: str, max_results: int, search_type: str,
+                           timelimit: Optional[str] = None,
+                           started: Optional[asyncio.Event] = None) -> List[Dict[str, Any]]:
+        """طلب واجهة بحث واحدة في مجمع الخيوط مع تسجيل زمن استجابتها وإبلاغ الجدولة بنتيجتها
+        
+        started يُضبط عند حجز مكان في مجمع الخيوط، فلا يُحسب وقت الانتظار في الطابور من زمن الواجهة.
+        """
+        stats = self.backend_stats[backend.name]
+        stats["calls"] += 1
+        async with self._semaphore:
+            if started is not None:
+                started.set()
+            loop = asyncio.get_running_loop()
+            started_at = time.monotonic()
+            try:
+                # النتائج مولد يرسل الطلبات أثناء القراءة لذلك تُقرأ كاملة داخل الخيط
+                search_results = await asyncio.wait_for(
+                    loop.run_in_executor(
+                        self._executor,
+                        functools.partial(backend.search, query, max_results, search_type, timelimit)
+                    ),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                stats["errors"] += 1
+                # المهلة هي أبطأ الاستجابات فتُسجل بأقصى زمن حتى لا يتجاهلها المدرج
+                self.latencies[backend.name].record(self.timeout)
+                raise
+            except Exception as e:
+                stats["errors"] += 1
+                # حظر المعدل يُسجل في الجدولة ولو فازت واجهة أخرى حتى يستمر التراجع في التصاعد
+                if is_rate_limited(e):
+                    self.scheduler.record_rate_limited()
+                raise
+        self.latencies[backend.name].record(time.monotonic() - started_at)
+        # الجدولة تضبط معدل الواجهة الأساسية فلا يعيد نجاح غيرها الفاصل إلى حده الأدنى
+        if backend is self.backend:
+            self.scheduler.record_success()
+        return search_results
+    
+    async def _hedged_search(self, query: str, max_results: int, search_type: str,
+                             timelimit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """طلب الواجهة الأساسية، وإذا لم تجب خلال مدة الانتظار أو فشلت يُرسل نفس الطلب لواجهة احتياطية
+        وتُعتمد أول إجابة ناجحة"""
+        def start(backend, started=None):
+            task = asyncio.ensure_future(
+                self._run_backend(backend, query, max_results, search_type, timelimit, started)
+            )
+            # الطلب الخاسر يكمل في الخلفية حتى يُسجل زمنه، فلا تُهمل أبطأ الاستجابات في المدرج
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return task
+        
+        started = asyncio.Event()
+        primary_task = start(self.backend, started)
+        tasks = {primary_task: self.backend}
+        secondary = next((backend for backend in self.backends[1:] if backend.supports(search_type)), None)
+        
+        if config.SEARCH_HEDGE_ENABLED and secondary is not None:
+            # مدة الانتظار تبدأ بعد أن تحجز الأساسية مكانها في مجمع الخيوط لا أثناء انتظارها في الطابور
+            started_task = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait({primary_task, started_task}, return_when=asyncio.FIRST_COMPLETED)
+                await asyncio.wait_for(asyncio.shield(primary_task), timeout=self.hedge_delay(self.backend.name))
+            except asyncio.CancelledError:
+                primary_task.cancel()
+                raise
+            except Exception:
+                # المهلة أو فشل الواجهة الأساسية، والحالتان تُفحصان أدناه
+                pass
+            finally:
+                started_task.cancel()
+            
+            if primary_task.done() and primary_task.exception() is not None:
+                # فشل الأساسية انتقال إلى واجهة أخرى وليس تكراراً، فيُرسل بدون انتظار حتى أثناء التراجع
+                self.scheduler.try_acquire(failover=True)
+                self.hedge_stats["failovers"] += 1
+                tasks[start(secondary)] = secondary
+            elif not primary_task.done():
+                # الطلب الإضافي لا ينتظر دوره حتى لا يتأخر أكثر، ويُلغى إذا لم يسمح المعدل به الآن
+                # أو إذا كان مجمع الخيوط ممتلئاً فلا يزيد إلا طول الطابور
+                if not self._semaphore.locked() and self.scheduler.try_acquire():
+                    self.hedge_stats["hedged"] += 1
+                    tasks[start(secondary)] = secondary
+                else:
+                    self.hedge_stats["skipped"] += 1
+        
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.backend_stats[tasks[task].name]["wins"] += 1
+                        if task is not primary_task:
+                            self.hedge_stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+        except asyncio.CancelledError:
+            for task in pending:
+                task.cancel()
+            raise
+        raise error
+    
+    async def _search_web(self, query: str, max_results: int, search_type: str,
+                          timelimit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """تنفيذ البحث الفعلي عبر واجهات البحث"""
+        search_results = await self._hedged_search(query, max_results, search_type, timelimit)
+        
+        # معالجة النتائج
+        results = [self._process_result(result, search_type) for result in search_results]
+        
+        # صور وفيديوهات مختلفة قد تحمل نفس العنوان لذلك تُقارن روابطها فقط
+        results = self.deduplicator.deduplicate(results, near_duplicates=search_type in ("web", "news"))
+        
+        logging.info(f"تم العثور على {len(results)} نتيجة للبحث: {query}")
+        return results
+    
+    async def iter_results(self, query: str, search_type: str = "web",
+                           max_scanned: int = config.SEARCH_FETCH_BUDGET,
+                           timelimit: Optional[str] = None,
+                           use_cache: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """النتائج كمولد غير متزامن يطلب صفحات DuckDuckGo عند الحاجة فقط
+        
+        المستهلك يتوقف متى اكتفى فلا تُطلب الصفحات التالية، وmax_scanned حد أقصى لعدد النتائج المقروءة.
+        use_cache يقرأ الصفحة الأولى من التخزين المؤقت لنتائج البحث، وإلا يحفظها فيه بعد طلبها.
+        """
+        search_results = None
+        scanned = 0
+        accept = self.deduplicator.make_filter(near_duplicates=search_type in ("web", "news"))
+        loop = asyncio.get_running_loop()
+        
+        # الصفحة الأولى بنفس مفتاح search_web بعدد نتائج الصفحة، فيشتركان في التخزين المؤقت
+        cache_first_page = use_cache and self.search_cache is not None and max_scanned >= config.SEARCH_PAGE_SIZE
+        if cache_first_page:
+            cached = self.search_cache.get(query, search_type, config.SEARCH_PAGE_SIZE, timelimit)
+            if cached is not None:
+                cache_first_page = False
+                # المولد لا يُفتح إلا إذا احتاج المستهلك أكثر من الصفحة المحفوظة، ونتائجها المكررة تُرفض عندئذ
+                for result in copy.deepcopy(cached[0]):
+                    if accept(result):
+                        yield result
+        
+        try:
+            while scanned < max_scanned:
+                # قراءة دفعة من المولد في مجمع الخيوط، وقد تتطلب طلب صفحة جديدة
+                batch_size = min(config.SEARCH_PAGE_SIZE, max_scanned - scanned)
+                await self._wait_turn()
+                try:
+                    async with self.breaker.guard():
+                        async with self._semaphore:
+                            if search_results is None:
+                                search_results = await loop.run_in_executor(
+                                    self._executor, self.backend.open_results, query, max_scanned, search_type, timelimit
+                                )
+                            batch = await asyncio.wait_for(
+                                loop.run_in_executor(self._executor,
+                                                     lambda: list(itertools.islice(search_results, batch_size))),
+                                timeout=self.timeout
+                            )
+                    self.scheduler.record_success()
+                except Exception as e:
+                    if is_rate_limited(e):
+                        self.scheduler.record_rate_limited()
+                    raise
+                
+                processed_results = [self._process_result(result, search_type) for result in batch]
+                processed_results = [result for result in processed_results if accept(result)]
+                if cache_first_page:
+                    # الحفظ قبل تسليم النتائج لأن المستهلك قد يتوقف أثناءها أو يعدلها
+                    cache_first_page = False
+                    self.search_cache.set(query, search_type, config.SEARCH_PAGE_SIZE,
+                                          copy.deepcopy(processed_results), timelimit)
+                for processed_result in processed_results:
+                    yield processed_result
+                
+                scanned += len(batch)
+                if len(batch) < batch_size:
+                    # انتهت نتائج البحث
+                    break
+        finally:
+            # إغلاق المولد يغلق جلسة DuckDuckGo الخاصة به حتى إذا توقف المستهلك قبل نهاية النتائج
+            if search_results is not None:
+                loop.run_in_executor(self._executor, close_quietly, search_results)
+    
+    async def fetch_result_pages(self, results: List[Dict[str, Any]],
+                                 top_n: int = config.PAGE_FETCH_TOP_N) -> List[Dict[str, Any]]:
+        """إضافة النص الرئيسي لصفحات أول النتائج في الحقل content، والصفحات التي يتعذر تحميلها تبقى بدونه"""
+        if not self.page_fetcher:
+            return results
+        
+        # روابط الصور والفيديو تشير إلى ملفات أو صفحات مشغل بدون نص مقال فلا تُحمل
+        pageable = [result for result in results if result.get("search_type", "web") in ("web", "news")][:top_n]
+        try:
+            pages = await self.page_fetcher.fetch_pages([result.get("link", "") for result in pageable])
+            for result in pageable:
+                page = pages.get(result.get("link", ""))
+                if page and page["text"]:
+                    result["content"] = page["text"]
+        except Exception as e:
+            logging.error(f"خطأ في تحميل صفحات النتائج: {e}")
+        
+        return results
     
     async def search_multiple_sources(self, query: str, sources: List[str] = None) -> Dict[str, List[Dict]]:
         """البحث في مصادر متعددة"""
@@ -75,15 +460,18 @@ class WebSearcher:
             if sources is None:
                 sources = ["web", "news"]
             
-            all_results = {}
+            # البحث في جميع المصادر بالتوازي
+            responses = await asyncio.gather(
+                *[self.search_web(query, search_type=source) for source in sources],
+                return_exceptions=True
+            )
             
-            for source in sources:
-                try:
-                    results = await self.search_web(query, search_type=source)
-                    all_results[source] = results
-                except Exception as e:
-                    logging.warning(f"خطأ في البحث في المصدر {source}: {e}")
-                    all_results[source] = []
+            all_results = {}
+            for source, results in zip(sources, responses):
+                if isinstance(results, Exception):
+                    logging.warning(f"خطأ في البحث في المصدر {source}: {results}")
+                    results = []
+                all_results[source] = results
             
             return all_results
             
@@ -91,40 +479,67 @@ class WebSearcher:
             logging.error(f"خطأ في البحث في المصادر المتعددة: {e}")
             return {}
     
+    @staticmethod
+    def _matches_filters(result: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+        """التحقق من مطابقة النتيجة للفلاتر"""
+        # فلتر حسب الكلمات المفتاحية
+        if "keywords" in filters:
+            keywords = filters["keywords"]
+            if not any(keyword.lower() in result["title"].lower() or
+                       keyword.lower() in result["snippet"].lower()
+                       for keyword in keywords):
+                return False
+        
+        # فلتر حسب المصدر، ونتائج الويب بدون مصدر لذلك يُقارن الرابط أيضاً
+        if "sources" in filters:
+            sources = filters["sources"]
+            if not any(source.lower() in result["source"].lower() or source.lower() in result["link"].lower()
+                       for source in sources):
+                return False
+        
+        return True
+    
     async def search_with_filters(self, query: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """البحث مع تطبيق فلاتر"""
+        """البحث مع تطبيق فلاتر: keywords وsources وdate_range (عدد الأيام) وsearch_type وmax_results وmax_scanned"""
         try:
-            # تطبيق الفلاتر على النتائج
-            results = await self.search_web(query, max_results=self.max_results * 2)
-            
+            # تحديد عدد النتائج المطلوبة
+            max_results = filters.get("max_results", self.max_results)
+            search_type = filters.get("search_type", "web")
+            max_scanned = filters.get("max_scanned", config.SEARCH_FETCH_BUDGET)
+            
+            # حصر الفترة في DuckDuckGo بأصغر حد يشملها، ثم الفلترة الدقيقة بالتاريخ محلياً
+            days = filters.get("date_range")
+            timelimit = next((limit for limit, limit_days in TIMELIMIT_DAYS if days <= limit_days), None) \
+                if days else None
+            cutoff = time.time() - days * 86400 if days else None
+            
+            def accept(result: Dict[str, Any]) -> bool:
+                if cutoff is not None:
+                    timestamp = result.get("timestamp")
+                    # النتائج بدون تاريخ تُقبل فقط إذا حصر DuckDuckGo الفترة
+                    if (timestamp is None and not timelimit) or (timestamp is not None and timestamp < cutoff):
+                        return False
+                return self._matches_filters(result, filters)
+            
+            # تطبيق الفلاتر أثناء وصول النتائج والتوقف عند الاكتفاء أو انتهاء حد النتائج المقروءة،
+            # والصفحة الأولى من التخزين المؤقت إن وُجدت فلا تُطلب الصفحات التالية إلا عند الحاجة
             filtered_results = []
-            
-            for result in results:
-                # فلتر حسب الكلمات المفتاحية
-                if "keywords" in filters:
-                    keywords = filters["keywords"]
-                    if not any(keyword.lower() in result["title"].lower() or 
-                             keyword.lower() in result["snippet"].lower() 
-                             for keyword in keywords):
+            results = self.iter_results(query, search_type, max_scanned, timelimit, use_cache=True)
+            try:
+                async for result in results:
+                    if not accept(result):
                         continue
-                
-                # فلتر حسب المصدر
-                if "sources" in filters:
-                    sources = filters["sources"]
-                    if not any(source.lower() in result["source"].lower() 
-                             for source in sources):
-                        continue
-                
-                # فلتر حسب التاريخ (للبحث في الأخبار)
-                if "date_range" in filters and "date" in result:
-                    # تطبيق فلتر التاريخ إذا كان متاحاً
-                    pass
-                
-                filtered_results.append(result)
+                    filtered_results.append(result)
+                    if len(filtered_results) >= max_results:
+                        break
+            finally:
+                await results.aclose()
             
-            # تحديد عدد النتائج المطلوبة
-            max_results = filters.get("max_results", self.max_results)
-            return filtered_results[:max_results]
+            return filtered_results
+            
+        except CircuitOpenError as e:
+            logging.warning(f"تم رفض البحث فوراً: {e}")
+            return []
             
         except Exception as e:
             logging.error(f"خطأ في البحث مع الفلاتر: {e}")
@@ -143,22 +558,19 @@ class WebSearcher:
             queries = trending_queries.get(category, trending_queries["general"])
             all_results = []
             
-            for query in queries:
-                try:
-                    results = await self.search_web(query, max_results=3, search_type="news")
-                    all_results.extend(results)
-                except Exception as e:
-                    logging.warning(f"خطأ في البحث عن الموضوع الرائج {query}: {e}")
+            # تنفيذ الاستعلامات بالتوازي مع الحفاظ على ترتيبها في النتائج
+            responses = await asyncio.gather(
+                *[self.search_web(query, max_results=3, search_type="news") for query in queries],
+                return_exceptions=True
+            )
+            for query, results in zip(queries, responses):
+                if isinstance(results, Exception):
+                    logging.warning(f"خطأ في البحث عن الموضوع الرائج {query}: {results}")
                     continue
+                all_results.extend(results)
             
-            # إزالة التكرار
-            unique_results = []
-            seen_links = set()
-            
-            for result in all_results:
-                if result["link"] not in seen_links:
-                    unique_results.append(result)
-                    seen_links.add(result["link"])
+            # إزالة التكرار بين نتائج الاستعلامات المختلفة
+            unique_results = self.deduplicator.deduplicate(all_results)
             
             return unique_results[:self.max_results]
             
@@ -172,32 +584,12 @@ class WebSearcher:
             # إضافة كلمات مفتاحية أكاديمية
             academic_query = f"{query} research paper study analysis"
             
-            results = await self.search_web(academic_query, max_results=self.max_results)
-            
-            # فلترة النتائج الأكاديمية
-            academic_results = []
-            academic_keywords = [
-                "research", "study", "analysis", "paper", "journal", "academic",
-                "university", "institute", "scientific", "methodology", "findings",
-                "conclusion", "abstract", "introduction", "literature review"
-            ]
-            
-            for result in results:
-                title_lower = result["title"].lower()
-                snippet_lower = result["snippet"].lower()
-                
-                # حساب درجة الأكاديمية
-                academic_score = sum(1 for keyword in academic_keywords 
-                                   if keyword in title_lower or keyword in snippet_lower)
-                
-                if academic_score >= 2:  # على الأقل كلمتين أكاديميتين
-                    result["academic_score"] = academic_score
-                    academic_results.append(result)
+            # جلب نتائج أكثر من المطلوب ثم الإبقاء على الأفضل ترتيباً
+            results = await self.search_web(academic_query, max_results=self.max_results * config.SEARCH_RANK_OVERFETCH)
             
-            # ترتيب حسب الدرجة الأكاديمية
-            academic_results.sort(key=lambda x: x.get("academic_score", 0), reverse=True)
-            
-            return academic_results[:self.max_results]
+            # الترتيب بالصلة بالاستعلام وبالمصطلحات الأكاديمية، مع تعزيز النطاقات الأكاديمية
+            return self.ranker.rank(f"{query} {ACADEMIC_TERMS}", results, top_n=self.max_results,
+                                    boosts=config.SEARCH_ACADEMIC_DOMAINS, score_field="academic_score")
             
         except Exception as e:
             logging.error(f"خطأ في البحث الأكاديمي: {e}")
@@ -209,24 +601,20 @@ class WebSearcher:
             # إضافة الموقع للاستعلام
             local_query = f"{query} {location}"
             
-            results = await self.search_web(local_query, max_results=self.max_results)
+            results = await self.search_web(local_query, max_results=self.max_results * config.SEARCH_RANK_OVERFETCH)
             
-            # فلترة النتائج المحلية
+            # فلترة النتائج المحلية: يجب أن تذكر النتيجة الموقع في العنوان أو المقتطف أو المصدر
+            tokenizer = self.ranker.tokenizer
+            location_tokens = set(tokenizer(location))
             local_results = []
-            location_keywords = location.lower().split()
             
             for result in results:
-                title_lower = result["title"].lower()
-                snippet_lower = result["snippet"].lower()
-                source_lower = result["source"].lower()
-                
-                # التحقق من وجود كلمات الموقع
-                if any(loc in title_lower or loc in snippet_lower or loc in source_lower 
-                       for loc in location_keywords):
+                result_tokens = set(tokenizer(f"{result['title']} {result['snippet']} {result['source']}"))
+                if location_tokens & result_tokens:
                     result["local_relevance"] = True
                     local_results.append(result)
             
-            return local_results[:self.max_results]
+            return self.ranker.rank(local_query, local_results, top_n=self.max_results)
             
         except Exception as e:
             logging.error(f"خطأ في البحث المحلي: {e}")
@@ -235,23 +623,19 @@ class WebSearcher:
     async def search_recent(self, query: str, days: int = 7) -> List[Dict[str, Any]]:
         """البحث في المحتوى الحديث"""
         try:
-            # البحث في الأخبار للحصول على المحتوى الحديث
-            results = await self.search_web(query, max_results=self.max_results * 2, search_type="news")
+            # حصر الفترة في DuckDuckGo بأصغر حد يشملها، ثم الفلترة الدقيقة بالتاريخ محلياً
+            timelimit = next((limit for limit, limit_days in TIMELIMIT_DAYS if days <= limit_days), None)
+            results = await self.search_web(query, max_results=self.max_results * 2, search_type="news",
+                                            timelimit=timelimit)
             
-            # فلترة النتائج حسب التاريخ (إذا كان متاحاً)
-            recent_results = []
+            cutoff = time.time() - days * 86400
+            dated_results = [result for result in results if result.get("timestamp")]
+            recent_results = [result for result in dated_results if result["timestamp"] >= cutoff]
+            recent_results.sort(key=lambda result: result["timestamp"], reverse=True)
             
-            for result in results:
-                if "date" in result and result["date"]:
-                    # محاولة تحليل التاريخ
-                    try:
-                        # يمكن إضافة منطق أكثر تعقيداً لتحليل التواريخ
-                        recent_results.append(result)
-                    except:
-                        recent_results.append(result)
-                else:
-                    # إذا لم يكن هناك تاريخ، نعتبره حديثاً
-                    recent_results.append(result)
+            # النتائج بدون تاريخ تُقبل بعد المؤرخة فقط إذا حصر DuckDuckGo الفترة
+            if timelimit:
+                recent_results.extend(result for result in results if not result.get("timestamp"))
             
             return recent_results[:self.max_results]
             
@@ -259,21 +643,27 @@ class WebSearcher:
             logging.error(f"خطأ في البحث في المحتوى الحديث: {e}")
             return []
     
-    def get_search_suggestions(self, query: str) -> List[str]:
-        """الحصول على اقتراحات البحث"""
+    def get_backend_stats(self) -> Dict[str, Any]:
+        """إحصائيات واجهات البحث وأزمنة استجابتها والطلبات المكررة"""
+        return {
+            "backends": {
+                name: {**stats, "latency": self.latencies[name].to_dict()}
+                for name, stats in self.backend_stats.items()
+            },
+            "hedge_delay": round(self.hedge_delay(self.backend.name), 3),
+            "hedging": dict(self.hedge_stats)
+        }
+    
+    def record_search(self, query: str, search_type: str, results: List[Dict[str, Any]]):
+        """تسجيل بحث طلبه المستخدم بنصه كما كتبه في سجل البحث، ومنه تُبنى اقتراحاته"""
+        if not self.database_manager or not query:
+            return
+        self.database_manager.add_search(str(uuid.uuid4()), current_user_id.get(), query, results, search_type)
+    
+    def get_search_suggestions(self, query: str, limit: int = 5, user_id: Optional[int] = None) -> List[str]:
+        """الحصول على اقتراحات البحث: أكثر استعلامات المستخدم السابقة تكراراً وحداثة التي تبدأ بالنص المكتوب"""
         try:
-            # يمكن إضافة منطق لاقتراحات البحث
-            suggestions = []
-            
-            # إضافة اقتراحات بسيطة
-            if len(query) > 3:
-                suggestions.append(query + " 2024")
-                suggestions.append(query + " latest")
-                suggestions.append(query + " guide")
-                suggestions.append(query + " tutorial")
-                suggestions.append(query + " examples")
-            
-            return suggestions[:5]
+            return self.suggester.suggest(query, limit, user_id if user_id is not None else current_user_id.get())
             
         except Exception as e:
             logging.error(f"خطأ في الحصول على اقتراحات البحث: {e}")